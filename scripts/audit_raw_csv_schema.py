@@ -1,93 +1,84 @@
 #!/usr/bin/env python3
 """
 Audit raw Open Payments CSVs in S3 for:
-- Header column match against expected schema
+- Header column match against the program year's registered schema
+  (openpayments_schema.py)
 - Missing/extra columns
 - Bad-line signals (inconsistent column counts) using a sample of first N lines
 - CSV parsing errors (quote/newline issues) during sampling
 
+Objects are audited concurrently (--workers objects in flight) through one
+shared S3 client whose connection pool is sized to the workers.
+
+One request per object: size/ETag/LastModified come from the listing (the
+ranged GET's ContentRange is the fallback), and objects whose ETag is
+unchanged since the last run are taken from the audit cache (--cache) without
+any request at all.
+
+The head of each object is streamed into the CSV reader through ranged GETs
+that start small (--first-range-kb) and double until --sample-rows records
+have been parsed or --head-bytes is reached, so a typical object costs a few
+hundred KB rather than the full --head-bytes.
+
+--range-samples N also fetches N evenly spaced ranges (--range-sample-kb)
+from the rest of each object, resyncs each to the next record boundary and
+checks column counts there, catching mid-file damage (a bad merge, a
+truncated page) for a small fraction of the bytes of a full scan.
+
+--profile profiles every column of every object instead
+(openpayments_column_profile.py): null rate, HyperLogLog distinct estimate,
+min/max, numeric/date parse failure rates and max length, per file and merged
+per year (--profile-output), with files fanned out across processes.
+
+--full-scan streams every byte of every object instead
+(openpayments_csv_validate.py): record count, column-count mismatches,
+unbalanced quotes and encoding errors per file, with the record number and
+byte offset of each issue (--issues-output). Objects are scanned in parallel
+processes (--workers), each holding one chunk and one record in memory, so
+the whole lake can be validated on the runner overnight.
+
+Compressed objects (csv_<id>.csv.gz / .csv.zst, downloader --compress) are
+decompressed while they stream in the head, --full-scan and --profile modes;
+--head-bytes then caps compressed bytes and full-scan offsets are offsets in
+the plain CSV. --range-samples needs plain CSV (a mid-file byte range of a
+compressed stream cannot be decoded), so compressed objects are checked by
+their head only and listed. Other objects under the prefix are listed as
+skipped.
+
 Outputs a CSV report you can commit to Git.
 """
 
 import argparse
 import csv
+import hashlib
 import io
 import json
-from dataclasses import dataclass, asdict
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict, fields
 from typing import List, Dict, Tuple, Optional
 
 import boto3
-from botocore.exceptions import ClientError
-
-
-EXPECTED_COLUMNS = [
-    'Change_Type', 'Covered_Recipient_Type', 'Teaching_Hospital_CCN',
-    'Teaching_Hospital_ID', 'Teaching_Hospital_Name',
-    'Covered_Recipient_Profile_ID', 'Covered_Recipient_NPI',
-    'Covered_Recipient_First_Name', 'Covered_Recipient_Middle_Name',
-    'Covered_Recipient_Last_Name', 'Covered_Recipient_Name_Suffix',
-    'Recipient_Primary_Business_Street_Address_Line1',
-    'Recipient_Primary_Business_Street_Address_Line2', 'Recipient_City',
-    'Recipient_State', 'Recipient_Zip_Code', 'Recipient_Country',
-    'Recipient_Province', 'Recipient_Postal_Code',
-    'Covered_Recipient_Primary_Type_1', 'Covered_Recipient_Primary_Type_2',
-    'Covered_Recipient_Primary_Type_3', 'Covered_Recipient_Primary_Type_4',
-    'Covered_Recipient_Primary_Type_5', 'Covered_Recipient_Primary_Type_6',
-    'Covered_Recipient_Specialty_1', 'Covered_Recipient_Specialty_2',
-    'Covered_Recipient_Specialty_3', 'Covered_Recipient_Specialty_4',
-    'Covered_Recipient_Specialty_5', 'Covered_Recipient_Specialty_6',
-    'Covered_Recipient_License_State_code1',
-    'Covered_Recipient_License_State_code2',
-    'Covered_Recipient_License_State_code3',
-    'Covered_Recipient_License_State_code4',
-    'Covered_Recipient_License_State_code5',
-    'Submitting_Applicable_Manufacturer_or_Applicable_GPO_Name',
-    'Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_ID',
-    'Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_Name',
-    'Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_State',
-    'Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_Country',
-    'Total_Amount_of_Payment_USDollars', 'Date_of_Payment',
-    'Number_of_Payments_Included_in_Total_Amount',
-    'Form_of_Payment_or_Transfer_of_Value',
-    'Nature_of_Payment_or_Transfer_of_Value', 'City_of_Travel',
-    'State_of_Travel', 'Country_of_Travel', 'Physician_Ownership_Indicator',
-    'Third_Party_Payment_Recipient_Indicator',
-    'Name_of_Third_Party_Entity_Receiving_Payment_or_Transfer_of_Value',
-    'Charity_Indicator', 'Third_Party_Equals_Covered_Recipient_Indicator',
-    'Contextual_Information', 'Delay_in_Publication_Indicator', 'Record_ID',
-    'Dispute_Status_for_Publication', 'Related_Product_Indicator',
-    'Covered_or_Noncovered_Indicator_1',
-    'Indicate_Drug_or_Biological_or_Device_or_Medical_Supply_1',
-    'Product_Category_or_Therapeutic_Area_1',
-    'Name_of_Drug_or_Biological_or_Device_or_Medical_Supply_1',
-    'Associated_Drug_or_Biological_NDC_1',
-    'Associated_Device_or_Medical_Supply_PDI_1',
-    'Covered_or_Noncovered_Indicator_2',
-    'Indicate_Drug_or_Biological_or_Device_or_Medical_Supply_2',
-    'Product_Category_or_Therapeutic_Area_2',
-    'Name_of_Drug_or_Biological_or_Device_or_Medical_Supply_2',
-    'Associated_Drug_or_Biological_NDC_2',
-    'Associated_Device_or_Medical_Supply_PDI_2',
-    'Covered_or_Noncovered_Indicator_3',
-    'Indicate_Drug_or_Biological_or_Device_or_Medical_Supply_3',
-    'Product_Category_or_Therapeutic_Area_3',
-    'Name_of_Drug_or_Biological_or_Device_or_Medical_Supply_3',
-    'Associated_Drug_or_Biological_NDC_3',
-    'Associated_Device_or_Medical_Supply_PDI_3',
-    'Covered_or_Noncovered_Indicator_4',
-    'Indicate_Drug_or_Biological_or_Device_or_Medical_Supply_4',
-    'Product_Category_or_Therapeutic_Area_4',
-    'Name_of_Drug_or_Biological_or_Device_or_Medical_Supply_4',
-    'Associated_Drug_or_Biological_NDC_4',
-    'Associated_Device_or_Medical_Supply_PDI_4',
-    'Covered_or_Noncovered_Indicator_5',
-    'Indicate_Drug_or_Biological_or_Device_or_Medical_Supply_5',
-    'Product_Category_or_Therapeutic_Area_5',
-    'Name_of_Drug_or_Biological_or_Device_or_Medical_Supply_5',
-    'Associated_Drug_or_Biological_NDC_5',
-    'Associated_Device_or_Medical_Supply_PDI_5', 'Program_Year',
-    'Payment_Publication_Date'
-]
+import pandas as pd
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from openpayments_column_profile import PROFILE_FIELDS, merge_profiles, profile_chunk
+from openpayments_csv_validate import (
+    DEFAULT_MAX_ISSUES,
+    DEFAULT_MAX_RECORD_BYTES,
+    CsvStreamValidator,
+    resync_offset,
+)
+from openpayments_compression import SUFFIXES, Compression
+from openpayments_schema import LATEST_SCHEMA, Schema, normalize_header, schema_for_year
+
+
+# column names/types live in the schema registry (openpayments_schema.py)
+EXPECTED_COLUMNS = list(LATEST_SCHEMA.names)
+CSV_SUFFIXES = tuple(".csv" + suffix for suffix in SUFFIXES.values())
+LISTED_KEYS_MAX = 20
 
 
 @dataclass
@@ -104,6 +95,54 @@ class AuditRow:
     sample_lines_checked: int
     sample_bad_line_count: int
     sample_parse_error: str  # empty or error string
+    sample_required_null_count: int = 0  # sampled rows with an empty non-nullable column
+    schema_version: str = ""
+    # listing metadata
+    etag: str = ""
+    last_modified: str = ""
+    head_bytes_read: int = 0
+    # --range-samples
+    range_samples_checked: int = 0
+    range_resync_failures: int = 0
+    range_records_checked: int = 0
+    range_bad_records: int = 0
+    range_first_bad_offset: int = -1
+    range_bytes_read: int = 0
+
+
+@dataclass
+class FullScanRow:
+    year: str
+    s3_key: str
+    size_bytes: int
+    header_col_count: int
+    expected_col_count: int
+    header_match: str
+    missing_columns: str
+    extra_columns: str
+    records: int
+    column_mismatch_records: int
+    unbalanced_quote_records: int
+    encoding_error_records: int
+    first_issue_offset: int  # -1 if clean
+    scan_error: str  # empty or error string
+    scan_seconds: float
+    schema_version: str = ""
+    etag: str = ""
+    last_modified: str = ""
+
+
+ISSUE_FIELDS = ["year", "s3_key", "kind", "record", "offset", "detail"]
+
+AUDIT_CACHE_VERSION = 3
+# one default cache per mode: their signatures differ, so a shared file would be
+# reset by every run of the other mode
+DEFAULT_AUDIT_CACHE = "raw_schema_audit_cache.json"
+DEFAULT_FULL_SCAN_CACHE = "raw_schema_full_scan_cache.json"
+DEFAULT_FIRST_RANGE_KB = 256
+DEFAULT_RANGE_SAMPLE_KB = 256
+FULL_SCAN_CHUNK_BYTES = 1024 * 1024
+DEFAULT_PROFILE_CHUNK_ROWS = 100_000
 
 
 def list_s3_objects(s3, bucket: str, prefix: str) -> List[Dict]:
@@ -118,29 +157,152 @@ def list_s3_objects(s3, bucket: str, prefix: str) -> List[Dict]:
     return out
 
 
-def read_s3_head_text(s3, bucket: str, key: str, max_bytes: int) -> str:
+def total_size_from_content_range(content_range: str) -> Optional[int]:
+    # "bytes 0-1048575/73400320" -> 73400320
+    try:
+        total = content_range.rsplit("/", 1)[1]
+        return None if total == "*" else int(total)
+    except (IndexError, ValueError):
+        return None
+
+
+class S3HeadStream(io.RawIOBase):
     """
-    Read up to max_bytes from the start of an S3 object and return as text.
+    Read-only stream over the first max_bytes of an S3 object, fetched lazily
+    as ranged GETs that double in size (first_range, 2x, 4x, ...). Nothing is
+    requested until the reader needs it, and each range body is streamed, not
+    buffered, so stopping early costs at most the range in flight.
     """
-    rng = f"bytes=0-{max_bytes-1}"
-    resp = s3.get_object(Bucket=bucket, Key=key, Range=rng)
-    data = resp["Body"].read()
-    # attempt utf-8, then fall back
-    try:
-        return data.decode("utf-8", errors="replace")
-    except Exception:
-        return data.decode(errors="replace")
+
+    def __init__(
+        self,
+        s3,
+        bucket: str,
+        key: str,
+        max_bytes: int,
+        first_range: int = DEFAULT_FIRST_RANGE_KB * 1024,
+        size_bytes: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.max_bytes = max_bytes
+        self.size_bytes = size_bytes  # learned from ContentRange if not given
+        self.bytes_read = 0
+        self.requests = 0
+        self._next_range = max(1, first_range)
+        self._fetched_to = 0
+        self._body = None
+
+    def readable(self) -> bool:
+        return True
+
+    @property
+    def limit(self) -> int:
+        return self.max_bytes if self.size_bytes is None else min(self.max_bytes, self.size_bytes)
+
+    @property
+    def capped(self) -> bool:
+        """
+        True if reading stopped at max_bytes before the end of the object.
+        """
+        return self.bytes_read >= self.max_bytes and (self.size_bytes is None or self.size_bytes > self.max_bytes)
+
+    def _open_next_range(self) -> bool:
+        if self._fetched_to >= self.limit:
+            return False
+        end = min(self._fetched_to + self._next_range, self.limit) - 1
+        resp = self.s3.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={self._fetched_to}-{end}")
+        self.requests += 1
+        if self.size_bytes is None:
+            total = total_size_from_content_range(resp.get("ContentRange", ""))
+            if total is None and "ContentLength" in resp:
+                total = int(resp["ContentLength"])
+            self.size_bytes = total
+        self._body = resp["Body"]
+        self._fetched_to = end + 1
+        self._next_range *= 2
+        return True
+
+    def readinto(self, b) -> int:
+        while True:
+            if self._body is None and not self._open_next_range():
+                return 0
+            data = self._body.read(len(b))
+            if data:
+                n = len(data)
+                b[:n] = data
+                self.bytes_read += n
+                return n
+            self._body.close()
+            self._body = None
+
+    def close(self) -> None:
+        if self._body is not None:
+            # drop the rest of the range in flight instead of draining it
+            self._body.close()
+            self._body = None
+        super().close()
+
+
+def sample_offsets(size_bytes: int, samples: int, skip_below: int, range_bytes: int) -> List[int]:
+    """
+    Start offsets of `samples` evenly spaced ranges (size * i / (samples + 1)),
+    dropping those inside the already-read head or past the last full range.
+    """
+    out = []
+    for i in range(1, samples + 1):
+        start = size_bytes * i // (samples + 1)
+        if start >= skip_below and start + range_bytes <= size_bytes and (not out or start >= out[-1] + range_bytes):
+            out.append(start)
+    return out
 
 
-def normalize_header(cols: List[str]) -> List[str]:
-    # strip BOM and whitespace
-    normalized = []
-    for i, c in enumerate(cols):
-        c2 = c.strip()
-        if i == 0:
-            c2 = c2.lstrip("\ufeff")
-        normalized.append(c2)
-    return normalized
+def audit_ranges(
+    s3,
+    bucket: str,
+    key: str,
+    size_bytes: int,
+    expected_fields: int,
+    samples: int,
+    range_bytes: int,
+    skip_below: int,
+) -> Dict[str, int]:
+    """
+    Check column counts in evenly spaced mid-file ranges; each range is
+    resynced to a record boundary first and its trailing partial record is
+    ignored. Returns the range_* AuditRow fields.
+    """
+    stats = {
+        "range_samples_checked": 0,
+        "range_resync_failures": 0,
+        "range_records_checked": 0,
+        "range_bad_records": 0,
+        "range_first_bad_offset": -1,
+        "range_bytes_read": 0,
+    }
+    for start in sample_offsets(size_bytes, samples, skip_below, range_bytes):
+        resp = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{start + range_bytes - 1}")
+        data = resp["Body"].read()
+        stats["range_samples_checked"] += 1
+        stats["range_bytes_read"] += len(data)
+
+        at = resync_offset(data, expected_fields)
+        if at < 0:
+            # no run of well-formed records anywhere in the range
+            stats["range_resync_failures"] += 1
+            if stats["range_first_bad_offset"] < 0:
+                stats["range_first_bad_offset"] = start
+            continue
+
+        v = CsvStreamValidator(max_issues=1, expected_fields=expected_fields, base_offset=start + at)
+        v.feed(data[at:])  # no finish(): the last record is cut by the range end
+        stats["range_records_checked"] += v.records
+        stats["range_bad_records"] += v.issue_count
+        if v.issues and stats["range_first_bad_offset"] < 0:
+            stats["range_first_bad_offset"] = int(v.issues[0]["offset"])
+    return stats
 
 
 def audit_one_file(
@@ -148,72 +310,446 @@ def audit_one_file(
     bucket: str,
     key: str,
     year: str,
-    expected: List[str],
+    schema: Schema,
     head_bytes: int,
     sample_rows: int,
+    size_bytes: Optional[int] = None,
+    etag: str = "",
+    last_modified: str = "",
+    first_range: int = DEFAULT_FIRST_RANGE_KB * 1024,
+    range_samples: int = 0,
+    range_bytes: int = DEFAULT_RANGE_SAMPLE_KB * 1024,
 ) -> AuditRow:
-    # Read head chunk (header + sample rows)
-    text = read_s3_head_text(s3, bucket, key, head_bytes)
+    """
+    size_bytes/etag/last_modified: from the listing; without size_bytes the
+    size comes from the first ranged GET's ContentRange.
+    range_samples: mid-file ranges to check after the head (0 = head only).
+    """
+    if size_bytes == 0:
+        # nothing to read (a ranged GET would fail with InvalidRange)
+        row = error_row(year, key, schema, "EMPTY_OR_NO_HEADER")
+        row.etag, row.last_modified = etag, last_modified
+        return row
+
+    # Stream the head (header + sample rows) through growing ranged GETs
+    compression = Compression.for_path(key.lower())
+    raw = S3HeadStream(s3, bucket, key, head_bytes, first_range=first_range, size_bytes=size_bytes)
+    plain = compression.stream_reader(io.BufferedReader(raw))
+    text = io.TextIOWrapper(plain, encoding="utf-8", errors="replace", newline="")
 
     # Use csv module for header + sampling
-    expected_set = set(expected)
     header_cols: List[str] = []
+    header_map = schema.map_header([])
     bad_line_count = 0
+    required_null_count = 0
     parse_error = ""
     rows_checked = 0
 
     try:
-        reader = csv.reader(io.StringIO(text))
+        reader = csv.reader(text)
         header_cols = next(reader)
         header_cols = normalize_header(header_cols)
-
-        expected_len = len(expected)
+        header_map = schema.map_header(header_cols, case_sensitive=False)
+        required = header_map.required_positions
 
         # Sample first N data rows to detect "bad lines" signals
+        last_bad = False
+        last_null = False
         for row in reader:
-            rows_checked += 1
-            if rows_checked > sample_rows:
+            if rows_checked >= sample_rows:
                 break
-            if len(row) != len(header_cols):
+            rows_checked += 1
+            last_bad = len(row) != len(header_cols)
+            if last_bad:
                 # row-length mismatch => likely quoting/newline/comma issue
                 bad_line_count += 1
+            last_null = any(i >= len(row) or not row[i].strip() for i in required)
+            if last_null:
+                required_null_count += 1
+        else:
+            if raw.capped and rows_checked:
+                # the last row was cut off by --head-bytes, not malformed
+                rows_checked -= 1
+                bad_line_count -= int(last_bad)
+                required_null_count -= int(last_null)
 
     except StopIteration:
         parse_error = "EMPTY_OR_NO_HEADER"
+    except EOFError as e:
+        # gzip head cut by --head-bytes: the rows parsed so far were complete
+        if not raw.capped:
+            parse_error = f"ERROR: {e}"
     except csv.Error as e:
         parse_error = f"CSV_ERROR: {e}"
+    except (ClientError, BotoCoreError):
+        raise
     except Exception as e:
         parse_error = f"ERROR: {e}"
-
-    header_set = set(header_cols)
-    missing = sorted(list(expected_set - header_set))
-    extra = sorted(list(header_set - expected_set))
-
-    match = "YES" if (len(missing) == 0 and len(extra) == 0) else "NO"
-
-    # get object size (best-effort)
-    size_bytes = 0
-    try:
-        head = s3.head_object(Bucket=bucket, Key=key)
-        size_bytes = int(head.get("ContentLength", 0))
-    except Exception:
-        size_bytes = 0
+    finally:
+        text.close()
+
+    range_stats: Dict[str, int] = {}
+    if range_samples and header_cols and raw.size_bytes and not compression.enabled:
+        try:
+            range_stats = audit_ranges(
+                s3, bucket, key, raw.size_bytes, len(header_cols), range_samples, range_bytes,
+                skip_below=raw.bytes_read,
+            )
+        except (ClientError, BotoCoreError) as e:
+            # keep the head results; an ERROR row is not cached, so the next run retries it
+            parse_error = parse_error or f"ERROR: range sample failed: {e}"
 
     return AuditRow(
         year=year,
         s3_key=key,
-        size_bytes=size_bytes,
+        size_bytes=raw.size_bytes or 0,
         header_col_count=len(header_cols),
-        expected_col_count=len(expected),
-        header_match=match,
-        missing_columns=";".join(missing),
-        extra_columns=";".join(extra),
+        expected_col_count=len(schema),
+        header_match="YES" if header_map.matches else "NO",
+        missing_columns=";".join(header_map.missing),
+        extra_columns=";".join(header_map.extra),
         sample_lines_checked=rows_checked,
         sample_bad_line_count=bad_line_count,
         sample_parse_error=parse_error,
+        sample_required_null_count=required_null_count,
+        schema_version=schema.version,
+        etag=etag,
+        last_modified=last_modified,
+        head_bytes_read=raw.bytes_read,
+        **range_stats,
+    )
+
+
+def error_row(year: str, key: str, schema: Schema, error: str) -> AuditRow:
+    return AuditRow(
+        year=year,
+        s3_key=key,
+        size_bytes=0,
+        header_col_count=0,
+        expected_col_count=len(schema),
+        header_match="NO",
+        missing_columns="",
+        extra_columns="",
+        sample_lines_checked=0,
+        sample_bad_line_count=0,
+        sample_parse_error=error,
+        schema_version=schema.version,
     )
 
 
+# ---------------------------
+# AUDIT CACHE (ETag -> row)
+# ---------------------------
+def audit_signature(years: List[str], **settings) -> str:
+    """
+    Cached rows are only valid for the same schema versions, audit mode/settings and audit logic.
+    """
+    schemas = {y: schema_for_year(y).version for y in years}
+    raw = json.dumps({"version": AUDIT_CACHE_VERSION, "schemas": schemas, **settings}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def load_audit_cache(path: str, signature: str) -> Dict[str, dict]:
+    """
+    {s3_key: {"etag": ..., "row": {...}[, "issues": [...]]}} from the last run,
+    or {} if missing, unreadable or written with other settings.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("signature") != signature:
+        print("[INFO] Audit cache settings changed; re-auditing everything")
+        return {}
+    return cache.get("objects", {})
+
+
+def save_audit_cache(path: str, signature: str, rows: list, issues: Optional[Dict[str, List[dict]]] = None) -> None:
+    objects = {}
+    for r in rows:
+        error = r.scan_error if isinstance(r, FullScanRow) else r.sample_parse_error
+        if not r.etag or error.startswith("ERROR"):  # do not cache transient failures
+            continue
+        objects[r.s3_key] = {"etag": r.etag, "row": asdict(r)}
+        if issues is not None:
+            objects[r.s3_key]["issues"] = issues.get(r.s3_key, [])
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"signature": signature, "objects": objects}, f)
+    os.replace(tmp, path)
+
+
+def audit_objects(
+    s3,
+    bucket: str,
+    targets: List[Tuple[str, Dict]],
+    head_bytes: int,
+    sample_rows: int,
+    workers: int,
+    cache: Optional[Dict[str, dict]] = None,
+    first_range: int = DEFAULT_FIRST_RANGE_KB * 1024,
+    range_samples: int = 0,
+    range_bytes: int = DEFAULT_RANGE_SAMPLE_KB * 1024,
+) -> List[AuditRow]:
+    """
+    Audit (year, listed object) targets with up to `workers` objects in flight.
+    Objects whose listing ETag matches the cache reuse the cached row.
+    Rows come back in target order; a failing object becomes an ERROR row
+    instead of stopping the audit.
+    """
+    cache = cache or {}
+
+    def audit(target: Tuple[str, Dict]) -> AuditRow:
+        year, obj = target
+        key = obj["Key"]
+        etag = obj.get("ETag", "").strip('"')
+        last_modified = obj["LastModified"].isoformat() if obj.get("LastModified") else ""
+        try:
+            return audit_one_file(
+                s3=s3,
+                bucket=bucket,
+                key=key,
+                year=year,
+                schema=schema_for_year(year),
+                head_bytes=head_bytes,
+                sample_rows=sample_rows,
+                size_bytes=obj.get("Size"),
+                etag=etag,
+                last_modified=last_modified,
+                first_range=first_range,
+                range_samples=range_samples,
+                range_bytes=range_bytes,
+            )
+        except (ClientError, BotoCoreError) as e:
+            row = error_row(year, key, schema_for_year(year), f"ERROR: {e}")
+            row.etag, row.last_modified = etag, last_modified
+            return row
+
+    rows: Dict[int, AuditRow] = {}
+    pending: List[Tuple[int, Tuple[str, Dict]]] = []
+    for i, (year, obj) in enumerate(targets):
+        hit = cache.get(obj["Key"])
+        if hit and obj.get("ETag") and hit.get("etag") == obj["ETag"].strip('"'):
+            rows[i] = AuditRow(**{**hit["row"], "year": year})
+        else:
+            pending.append((i, (year, obj)))
+    print(f"[INFO] Unchanged since last audit (ETag): {len(rows)}/{len(targets)} objects")
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="audit") as ex:
+        futs = {ex.submit(audit, t): i for i, t in pending}
+        for n, fut in enumerate(as_completed(futs), start=1):
+            r = fut.result()
+            rows[futs[fut]] = r
+            ranges = f" range_bad_records={r.range_bad_records}" if r.range_samples_checked else ""
+            print(f"[AUDIT] ({n}/{len(pending)}) {r.s3_key} match={r.header_match}{ranges}")
+
+    elapsed = time.monotonic() - started
+    read_mb = sum(rows[i].head_bytes_read + rows[i].range_bytes_read for i, _ in pending) / (1024 * 1024)
+    print(
+        f"[INFO] Audited {len(pending)} objects in {elapsed:,.1f}s "
+        f"({len(pending) / max(elapsed, 1e-6):,.1f} obj/s, {read_mb:,.1f} MB read)"
+    )
+    return [rows[i] for i in range(len(targets))]
+
+
+# ---------------------------
+# FULL SCAN (process pool)
+# ---------------------------
+_worker_s3 = None
+
+
+def _init_s3_worker() -> None:
+    # boto3 clients cannot cross processes: one per worker process
+    global _worker_s3
+    _worker_s3 = boto3.client("s3")
+
+
+def full_scan_one_file(
+    bucket: str,
+    year: str,
+    obj: Dict,
+    max_issues: int,
+    max_record_bytes: int,
+) -> Tuple[FullScanRow, List[Dict]]:
+    """
+    Stream the whole object through CsvStreamValidator (runs in a worker process).
+    """
+    key = obj["Key"]
+    schema = schema_for_year(year)
+    started = time.monotonic()
+    v = CsvStreamValidator(max_record_bytes=max_record_bytes, max_issues=max_issues)
+    scan_error = ""
+    try:
+        if obj.get("Size") != 0:
+            body = _worker_s3.get_object(Bucket=bucket, Key=key)["Body"]
+            try:
+                plain = Compression.for_path(key.lower()).stream_reader(body)
+                for chunk in iter(lambda: plain.read(FULL_SCAN_CHUNK_BYTES), b""):
+                    v.feed(chunk)
+            finally:
+                body.close()
+        v.finish()
+    except (ClientError, BotoCoreError, EOFError, OSError) as e:
+        scan_error = f"ERROR: {e}"
+
+    header_cols = normalize_header(v.header or [])
+    if not scan_error and not header_cols:
+        scan_error = "EMPTY_OR_NO_HEADER"
+    header_map = schema.map_header(header_cols, case_sensitive=False)
+
+    row = FullScanRow(
+        year=year,
+        s3_key=key,
+        size_bytes=int(obj.get("Size", v.bytes_scanned)),
+        header_col_count=len(header_cols),
+        expected_col_count=len(schema),
+        header_match="YES" if header_map.matches else "NO",
+        missing_columns=";".join(header_map.missing),
+        extra_columns=";".join(header_map.extra),
+        records=v.records,
+        column_mismatch_records=v.column_mismatches,
+        unbalanced_quote_records=v.unbalanced_quotes,
+        encoding_error_records=v.encoding_errors,
+        first_issue_offset=min((int(i["offset"]) for i in v.issues), default=-1),
+        scan_error=scan_error,
+        scan_seconds=round(time.monotonic() - started, 3),
+        schema_version=schema.version,
+        etag=obj.get("ETag", "").strip('"'),
+        last_modified=obj["LastModified"].isoformat() if obj.get("LastModified") else "",
+    )
+    issues = [{"year": year, "s3_key": key, **i} for i in v.issues]
+    return row, issues
+
+
+def full_scan_objects(
+    bucket: str,
+    targets: List[Tuple[str, Dict]],
+    workers: int,
+    cache: Optional[Dict[str, dict]] = None,
+    max_issues: int = DEFAULT_MAX_ISSUES,
+    max_record_bytes: int = DEFAULT_MAX_RECORD_BYTES,
+) -> Tuple[List[FullScanRow], Dict[str, List[dict]]]:
+    """
+    Full-scan (year, listed object) targets in up to `workers` processes.
+    Returns rows in target order and {s3_key: issues}; unchanged objects
+    (listing ETag == cached ETag) reuse the cached row and issues.
+    """
+    cache = cache or {}
+    rows: Dict[int, FullScanRow] = {}
+    issues: Dict[str, List[dict]] = {}
+    pending: List[Tuple[int, Tuple[str, Dict]]] = []
+    for i, (year, obj) in enumerate(targets):
+        hit = cache.get(obj["Key"])
+        if hit and obj.get("ETag") and hit.get("etag") == obj["ETag"].strip('"'):
+            rows[i] = FullScanRow(**{**hit["row"], "year": year})
+            issues[obj["Key"]] = hit.get("issues", [])
+        else:
+            pending.append((i, (year, obj)))
+    print(f"[INFO] Unchanged since last full scan (ETag): {len(rows)}/{len(targets)} objects")
+
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_s3_worker) as ex:
+        futs = {
+            ex.submit(full_scan_one_file, bucket, year, obj, max_issues, max_record_bytes): i
+            for i, (year, obj) in pending
+        }
+        for n, fut in enumerate(as_completed(futs), start=1):
+            r, file_issues = fut.result()
+            rows[futs[fut]] = r
+            issues[r.s3_key] = file_issues
+            bad = r.column_mismatch_records + r.unbalanced_quote_records + r.encoding_error_records
+            print(
+                f"[AUDIT] ({n}/{len(pending)}) {r.s3_key} records={r.records:,} "
+                f"bad_records={bad:,} match={r.header_match}{' ' + r.scan_error if r.scan_error else ''}"
+            )
+
+    elapsed = time.monotonic() - started
+    scanned_mb = sum(rows[i].size_bytes for i, _ in pending) / (1024 * 1024)
+    print(
+        f"[INFO] Full-scanned {len(pending)} objects ({scanned_mb:,.1f} MB) in {elapsed:,.1f}s "
+        f"({scanned_mb / max(elapsed, 1e-6):,.1f} MB/s)"
+    )
+    return [rows[i] for i in range(len(targets))], issues
+
+
+# ---------------------------
+# COLUMN PROFILE (process pool)
+# ---------------------------
+def profile_one_file(bucket: str, year: str, obj: Dict, chunk_rows: int) -> Tuple[str, str, Dict, str]:
+    """
+    Stream the whole object through pandas in chunk_rows chunks (runs in a
+    worker process). Returns (year, key, {column: ColumnProfile}, error).
+    """
+    key = obj["Key"]
+    profiles: Dict = {}
+    if obj.get("Size") == 0:
+        return year, key, profiles, "EMPTY_OR_NO_HEADER"
+    try:
+        body = _worker_s3.get_object(Bucket=bucket, Key=key)["Body"]
+        try:
+            reader = pd.read_csv(
+                Compression.for_path(key.lower()).stream_reader(body), dtype=str, keep_default_na=False, chunksize=chunk_rows, encoding_errors="replace"
+            )
+            for df in reader:
+                df.columns = normalize_header([str(c) for c in df.columns])
+                profile_chunk(profiles, df)
+        finally:
+            body.close()
+    except (ClientError, BotoCoreError, ValueError, EOFError, OSError) as e:
+        # ValueError covers pandas parse errors (pd.errors.ParserError / EmptyDataError);
+        # EOFError / OSError a truncated or corrupt compressed object
+        return year, key, profiles, f"ERROR: {e}"
+    return year, key, profiles, ""
+
+
+def run_profile(args: argparse.Namespace, targets: List[Tuple[str, Dict]]) -> int:
+    per_year: Dict[str, Dict] = {}
+    out_rows: List[Dict[str, object]] = []
+    fieldnames = ["scope", "year", "s3_key", "error"] + PROFILE_FIELDS
+
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_s3_worker) as ex:
+        futs = [ex.submit(profile_one_file, args.bucket, year, obj, args.profile_chunk_rows) for year, obj in targets]
+        for n, fut in enumerate(as_completed(futs), start=1):
+            year, key, profiles, error = fut.result()
+            rows = max((p.rows for p in profiles.values()), default=0)
+            print(f"[AUDIT] ({n}/{len(targets)}) {key} rows={rows:,} columns={len(profiles)}{' ' + error if error else ''}")
+            if error:
+                out_rows.append({"scope": "file", "year": year, "s3_key": key, "error": error})
+                continue
+            for prof in profiles.values():
+                out_rows.append({"scope": "file", "year": year, "s3_key": key, "error": "", **prof.to_row()})
+            merge_profiles(per_year.setdefault(year, {}), profiles)
+
+    elapsed = time.monotonic() - started
+    print(f"[INFO] Profiled {len(targets)} objects in {elapsed:,.1f}s")
+
+    out_rows.sort(key=lambda r: (r["year"], r["s3_key"]))
+    for year in sorted(per_year):
+        for prof in per_year[year].values():
+            out_rows.append({"scope": "year", "year": year, "s3_key": "*", "error": "", **prof.to_row()})
+
+    with open(args.profile_output, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w.writeheader()
+        w.writerows(out_rows)
+
+    print(f"[DONE] Wrote column profile: {args.profile_output}")
+    return 0
+
+
+def print_keys(message: str, keys: List[str]) -> None:
+    if not keys:
+        return
+    print(f"[INFO] {message}:")
+    for key in keys[:LISTED_KEYS_MAX]:
+        print(f"[INFO]   {key}")
+    if len(keys) > LISTED_KEYS_MAX:
+        print(f"[INFO]   ... and {len(keys) - LISTED_KEYS_MAX} more")
+
+
 def main() -> int:
     p = argparse.ArgumentParser(description="Audit raw Open Payments CSV schema in S3.")
     p.add_argument("--bucket", required=True, help="S3 bucket name (e.g., open-payments-1759a)")
@@ -227,7 +763,13 @@ def main() -> int:
         "--head-bytes",
         type=int,
         default=10 * 1024 * 1024,
-        help="Bytes to read from start of each file (default 10MB). Increase if headers span large chunk.",
+        help="Max bytes to read from start of each file (default 10MB). Reading stops earlier once --sample-rows rows are parsed.",
+    )
+    p.add_argument(
+        "--first-range-kb",
+        type=int,
+        default=DEFAULT_FIRST_RANGE_KB,
+        help=f"First ranged GET size; each further range doubles (default {DEFAULT_FIRST_RANGE_KB}).",
     )
     p.add_argument(
         "--sample-rows",
@@ -235,16 +777,87 @@ def main() -> int:
         default=2000,
         help="How many data rows to sample for bad-line signals (default 2000).",
     )
+    p.add_argument(
+        "--range-samples",
+        type=int,
+        default=0,
+        help="Also check N evenly spaced mid-file ranges per object (default 0 = head only).",
+    )
+    p.add_argument(
+        "--range-sample-kb",
+        type=int,
+        default=DEFAULT_RANGE_SAMPLE_KB,
+        help=f"Size of each --range-samples range (default {DEFAULT_RANGE_SAMPLE_KB}).",
+    )
     p.add_argument(
         "--output",
         default="raw_schema_audit_report.csv",
         help="Local output CSV filename.",
     )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Objects audited concurrently (default 16 threads; --full-scan/--profile: one process per CPU).",
+    )
+    p.add_argument(
+        "--full-scan",
+        action="store_true",
+        help="Stream and validate every record of every object instead of sampling the head.",
+    )
+    p.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile every column of every object (null rate, distinct estimate, min/max, parse failures).",
+    )
+    p.add_argument(
+        "--profile-output",
+        default="raw_column_profile.csv",
+        help="--profile: per-file and per-year column profile CSV filename.",
+    )
+    p.add_argument(
+        "--profile-chunk-rows",
+        type=int,
+        default=DEFAULT_PROFILE_CHUNK_ROWS,
+        help=f"--profile: rows per pandas chunk; bounds worker memory (default {DEFAULT_PROFILE_CHUNK_ROWS:,}).",
+    )
+    p.add_argument(
+        "--issues-output",
+        default="raw_schema_full_scan_issues.csv",
+        help="--full-scan: row-level issues (kind, record number, byte offset) CSV filename.",
+    )
+    p.add_argument(
+        "--max-issues-per-file",
+        type=int,
+        default=DEFAULT_MAX_ISSUES,
+        help=f"--full-scan: row-level issues kept per object; counts stay exact (default {DEFAULT_MAX_ISSUES}).",
+    )
+    p.add_argument(
+        "--max-record-mb",
+        type=int,
+        default=DEFAULT_MAX_RECORD_BYTES // (1024 * 1024),
+        help="--full-scan: a quoted field open longer than this is reported as an unbalanced quote (default 4).",
+    )
+    p.add_argument(
+        "--cache",
+        default=None,
+        help=(
+            f"ETag-keyed audit cache; unchanged objects are not re-read "
+            f"(default {DEFAULT_AUDIT_CACHE}, --full-scan: {DEFAULT_FULL_SCAN_CACHE})"
+        ),
+    )
+    p.add_argument("--no-cache", action="store_true", help="Re-audit every object (the cache is still rewritten)")
     args = p.parse_args()
+    if args.workers is None:
+        args.workers = (os.cpu_count() or 4) if (args.full_scan or args.profile) else 16
+    if args.cache is None:
+        args.cache = DEFAULT_FULL_SCAN_CACHE if args.full_scan else DEFAULT_AUDIT_CACHE
 
-    s3 = boto3.client("s3")
+    # one client shared by all workers; pool sized so no worker waits for a connection
+    s3 = boto3.client("s3", config=Config(max_pool_connections=max(10, args.workers)))
 
-    rows: List[AuditRow] = []
+    targets: List[Tuple[str, Dict]] = []
+    skipped: List[str] = []
     for year in args.years:
         prefix = args.prefix_template.format(year=year)
         print(f"[INFO] Listing s3://{args.bucket}/{prefix}")
@@ -253,27 +866,51 @@ def main() -> int:
 
         for obj in objects:
             key = obj["Key"]
-            # only CSVs
-            if not key.lower().endswith(".csv"):
+            # only CSVs, plain or compressed by the downloader
+            if not key.lower().endswith(CSV_SUFFIXES):
+                skipped.append(key)
                 continue
-            print(f"[AUDIT] {key}")
-            r = audit_one_file(
-                s3=s3,
-                bucket=args.bucket,
-                key=key,
-                year=year,
-                expected=EXPECTED_COLUMNS,
-                head_bytes=args.head_bytes,
-                sample_rows=args.sample_rows,
-            )
-            rows.append(r)
+            targets.append((year, obj))
+
+    print_keys(f"Skipped {len(skipped)} non-CSV objects", skipped)
+
+    if args.profile:
+        return run_profile(args, targets)
+    if args.full_scan:
+        return run_full_scan(args, targets)
+
+    if args.range_samples:
+        compressed = [obj["Key"] for _, obj in targets if Compression.for_path(obj["Key"].lower()).enabled]
+        print_keys(
+            f"--range-samples is not supported for {len(compressed)} compressed objects; head checked only",
+            compressed,
+        )
+
+    signature = audit_signature(
+        args.years,
+        head_bytes=args.head_bytes,
+        sample_rows=args.sample_rows,
+        range_samples=args.range_samples,
+        range_bytes=args.range_sample_kb * 1024,
+    )
+    cache = {} if args.no_cache else load_audit_cache(args.cache, signature)
+
+    rows = audit_objects(
+        s3=s3,
+        bucket=args.bucket,
+        targets=targets,
+        head_bytes=args.head_bytes,
+        sample_rows=args.sample_rows,
+        workers=args.workers,
+        cache=cache,
+        first_range=args.first_range_kb * 1024,
+        range_samples=args.range_samples,
+        range_bytes=args.range_sample_kb * 1024,
+    )
+    save_audit_cache(args.cache, signature, rows)
 
     # Write report
-    fieldnames = list(asdict(rows[0]).keys()) if rows else list(AuditRow(
-        year="", s3_key="", size_bytes=0, header_col_count=0, expected_col_count=0,
-        header_match="", missing_columns="", extra_columns="",
-        sample_lines_checked=0, sample_bad_line_count=0, sample_parse_error=""
-    ).__dict__.keys())
+    fieldnames = [f.name for f in fields(AuditRow)]
 
     with open(args.output, "w", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=fieldnames)
@@ -285,5 +922,45 @@ def main() -> int:
     return 0
 
 
+def run_full_scan(args: argparse.Namespace, targets: List[Tuple[str, Dict]]) -> int:
+    max_record_bytes = args.max_record_mb * 1024 * 1024
+    signature = audit_signature(
+        args.years,
+        mode="full_scan",
+        max_issues=args.max_issues_per_file,
+        max_record_bytes=max_record_bytes,
+    )
+    cache = {} if args.no_cache else load_audit_cache(args.cache, signature)
+
+    rows, issues = full_scan_objects(
+        bucket=args.bucket,
+        targets=targets,
+        workers=args.workers,
+        cache=cache,
+        max_issues=args.max_issues_per_file,
+        max_record_bytes=max_record_bytes,
+    )
+    save_audit_cache(args.cache, signature, rows, issues)
+
+    with open(args.output, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=[fd.name for fd in fields(FullScanRow)])
+        w.writeheader()
+        for r in rows:
+            w.writerow(asdict(r))
+
+    n_issues = 0
+    with open(args.issues_output, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=ISSUE_FIELDS)
+        w.writeheader()
+        for r in rows:
+            for issue in issues.get(r.s3_key, []):
+                w.writerow(issue)
+                n_issues += 1
+
+    print(f"[DONE] Wrote report: {args.output}")
+    print(f"[DONE] Wrote {n_issues} row-level issues: {args.issues_output}")
+    return 0
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
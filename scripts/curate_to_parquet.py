@@ -0,0 +1,813 @@
+#!/usr/bin/env python3
+"""
+Compile raw Open Payments CSVs into the curated Parquet layer locally
+(the Day 3 Glue ETL, runnable on the runner for fast iteration):
+
+    <base-dir>/YYYY/csv_<id>.csv[.gz|.zst]
+        -> <out-root>/year=YYYY/general_payments/company_<id>.parquet
+
+- explicit typed schema from the registry (openpayments_schema.py, per
+  program year): IDs / counts as integers, the amount as decimal(14,2), dates
+  (MM/DD/YYYY) as date, everything else as trimmed text with "" -> null;
+  dictionary-hinted columns are dictionary encoded, and the schema version is
+  stored in the Parquet metadata
+- columns selected by name in schema order; missing ones are null, extra ones
+  dropped (both reported), as are nulls in non-nullable columns
+- values that do not parse for their type become null and are counted per
+  column instead of failing the file
+- streamed: pyarrow reads the CSV in blocks and writes one row group at a
+  time (--row-group-rows), so memory is bounded by one row group per worker
+  whatever the company size
+- one company file per task across a process pool (--workers); outputs are
+  written to a temp file and renamed, and skipped when newer than their
+  source (--force to rebuild)
+
+- --dedup consults the Record_ID index (openpayments_record_index.py, built
+  by the downloader's --record-index or that script) batch by batch: of the
+  IDs repeated within a company only the first row is kept, and IDs landed by
+  an earlier company (company_id order) are dropped. Only those two small key
+  sets are loaded per file; files without an index (or whose index was built
+  from a different file size) are compiled as-is and flagged in the report
+
+- --partitioned then rewrites each program year into one Hive-partitioned
+  table for Athena, so queries filtering on the year and the secondary keys
+  (--partition-by, default Recipient_State and
+  Nature_of_Payment_or_Transfer_of_Value) read only the matching folders:
+
+    <out-root>/general_payments/program_year=YYYY/recipient_state=CA/
+        nature_of_payment_or_transfer_of_value=Food%20and%20Beverage/part-N.parquet
+
+  Files hold at most --partition-file-rows rows, sorted by --sort-by into
+  --row-group-rows row groups (min/max statistics then skip row groups on
+  date / company filters). Partition lists for the Glue database
+  open_payments_curated (infra/cloudformation/day3_glue_etl.yaml) are
+  written to <out-root>/glue_partitions.json (BatchCreatePartition input)
+  and glue_partitions.sql (Athena DDL), with locations under --table-location.
+  A year is re-partitioned when any of its company files was recompiled or
+  the layout options changed.
+  Partition folder names are URI-encoded by pyarrow (space -> %20, / -> %2F);
+  the Glue partition values are the decoded strings and each partition's
+  location is its encoded folder, so uploaded paths and the catalog agree.
+  Open output files are capped below the process's RLIMIT_NOFILE; a year
+  with more partitions than that still works, with some extra smaller files
+
+A per-file report is written to <out-root>/curate_report.csv.
+"""
+
+import argparse
+import csv
+import functools
+import io
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError as e:
+    raise SystemExit('curate_to_parquet.py needs pyarrow (pip install "aws-open-payments-pipeline[parquet]")') from e
+
+from openpayments_record_index import INDEX_DIR_NAME, RECORD_ID, RecordIndex, record_id_keys
+from openpayments_schema import Schema, schema_for_year
+
+
+DATASET = "general_payments"
+REPORT_NAME = "curate_report.csv"
+DEFAULT_ROW_GROUP_ROWS = 256 * 1024
+CSV_BLOCK_BYTES = 16 * 1024 * 1024
+DATE_FORMAT = "%m/%d/%Y"
+
+INT_PATTERN = r"^[+-]?\d{1,18}$"  # fits int64; narrower types are range-checked
+DECIMAL_PATTERN = r"^[+-]?\d{1,12}(\.\d{1,2})?$"
+
+SCHEMA_VERSION_KEY = b"openpayments.schema_version"
+
+# registry (Athena) type -> Arrow type
+ARROW_TYPES: Dict[str, pa.DataType] = {
+    "string": pa.string(),
+    "bigint": pa.int64(),
+    "int": pa.int32(),
+    "decimal(14,2)": pa.decimal128(14, 2),
+    "date": pa.date32(),
+}
+
+# Arrow's string -> number cast rejects a leading "+"
+PLUS_SIGN = r"^\+"
+INT_RANGES: Dict[pa.DataType, Tuple[int, int]] = {
+    pa.int32(): (-(2**31), 2**31 - 1),
+}
+
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+# --partitioned
+YEAR_COLUMN = "Program_Year"
+YEAR_PARTITION = "program_year"
+DEFAULT_PARTITION_BY = ["Recipient_State", "Nature_of_Payment_or_Transfer_of_Value"]
+DEFAULT_SORT_BY = ["Date_of_Payment", "Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_ID"]
+DEFAULT_PARTITION_FILE_ROWS = 1024 * 1024  # one file is sorted in memory
+MAX_PARTITIONS = 10_000  # per program year
+OPEN_FILES_HEADROOM = 128  # input files, pool pipes, logs
+MIN_OPEN_FILES = 16
+FALLBACK_OPEN_FILES = 400  # no RLIMIT_NOFILE (Windows: 512 C runtime handles)
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+PARTITION_SPEC_NAME = "_partitioning.json"  # "_" files are ignored by Athena
+
+GLUE_DATABASE = "open_payments_curated"
+DEFAULT_TABLE_LOCATION = "s3://open-payments-1759a/curated/general_payments/"
+GLUE_PARTITIONS_JSON = "glue_partitions.json"
+GLUE_PARTITIONS_SQL = "glue_partitions.sql"
+SQL_PARTITIONS_PER_STATEMENT = 100
+PARQUET_INPUT_FORMAT = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat"
+PARQUET_OUTPUT_FORMAT = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat"
+PARQUET_SERDE = "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+
+
+# ---------------------------
+# CURATED SCHEMA
+# ---------------------------
+@functools.lru_cache(maxsize=None)
+def arrow_schema(schema: Schema) -> pa.Schema:
+    # every field stays nullable: values that fail to parse become null
+    fields = [pa.field(c.name, ARROW_TYPES[c.type]) for c in schema.columns]
+    return pa.schema(fields, metadata={SCHEMA_VERSION_KEY: schema.version.encode("utf-8")})
+
+
+# ---------------------------
+# CASTING
+# ---------------------------
+def cast_column(values: pa.Array, typ: pa.DataType) -> Tuple[pa.Array, int]:
+    """
+    Trimmed text -> typ. Returns (array, values that failed to parse and became null).
+    """
+    values = pc.utf8_trim_whitespace(values)
+    values = pc.if_else(pc.equal(values, ""), pa.scalar(None, pa.string()), values)
+    if pa.types.is_string(typ):
+        return values, 0
+
+    if pa.types.is_date32(typ):
+        parsed = pc.strptime(values, format=DATE_FORMAT, unit="s", error_is_null=True)
+        return pc.cast(parsed, typ), parsed.null_count - values.null_count
+
+    pattern = DECIMAL_PATTERN if pa.types.is_decimal(typ) else INT_PATTERN
+    valid = pc.if_else(pc.match_substring_regex(values, pattern), values, pa.scalar(None, pa.string()))
+    valid = pc.replace_substring_regex(valid, pattern=PLUS_SIGN, replacement="")
+    if typ not in INT_RANGES:
+        return pc.cast(valid, typ), valid.null_count - values.null_count
+
+    wide = pc.cast(valid, pa.int64())
+    low, high = INT_RANGES[typ]
+    in_range = pc.and_(pc.greater_equal(wide, low), pc.less_equal(wide, high))
+    narrow = pc.cast(pc.if_else(in_range, wide, pa.scalar(None, pa.int64())), typ)
+    return narrow, narrow.null_count - values.null_count
+
+
+def curate_batch(
+    batch: pa.RecordBatch,
+    target: pa.Schema,
+    positions: Tuple[int, ...],
+    required: Tuple[int, ...],
+    failures: Dict[str, int],
+    required_nulls: Dict[str, int],
+) -> pa.RecordBatch:
+    """
+    positions: schema column i -> column index in the batch (-1 if the file lacks it);
+    required: schema indexes of non-nullable columns.
+    """
+    arrays = []
+    for i, field in enumerate(target):
+        pos = positions[i]
+        if pos < 0:
+            arr = pa.nulls(batch.num_rows, field.type)
+        else:
+            arr, failed = cast_column(batch.column(pos), field.type)
+            if failed:
+                failures[field.name] = failures.get(field.name, 0) + failed
+        if i in required and arr.null_count:
+            required_nulls[field.name] = required_nulls.get(field.name, 0) + arr.null_count
+        arrays.append(arr)
+    return pa.RecordBatch.from_arrays(arrays, schema=target)
+
+
+# ---------------------------
+# ONE COMPANY FILE (worker process)
+# ---------------------------
+def read_header(src: Path, compression: Optional[str]) -> List[str]:
+    with pa.input_stream(str(src), compression=compression) as raw:
+        # utf-8-sig: pyarrow drops a leading BOM from column names too
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+        return next(csv.reader(text), [])
+
+
+def dedup_batch(batch: pa.RecordBatch, record_id_pos: int, dedup) -> pa.RecordBatch:
+    """
+    Drop the rows the company's CompanyDedupFilter rejects (raw Record_ID text).
+    """
+    values = batch.column(record_id_pos).to_numpy(zero_copy_only=False)
+    keep = dedup.keep(*record_id_keys(values))
+    return batch if keep.all() else batch.filter(pa.array(keep))
+
+
+def curate_file(
+    year: str,
+    src: Path,
+    dest: Path,
+    row_group_rows: int,
+    parquet_compression: str,
+    index_root: Optional[str] = None,
+) -> Dict[str, object]:
+    started = time.monotonic()
+    compression = COMPRESSIONS.get(src.suffix)
+    result: Dict[str, object] = {
+        "year": year,
+        "source": str(src),
+        "output": str(dest),
+        "rows": 0,
+        "row_groups": 0,
+        "cast_failures": "",
+        "required_nulls": "",
+        "missing_columns": "",
+        "extra_columns": "",
+        "seconds": 0.0,
+        "schema_version": "",
+        "dedup_index": "off" if index_root is None else "",
+        "duplicates_dropped": 0,
+        "cross_company_dropped": 0,
+        "error": "",
+    }
+
+    schema = schema_for_year(year)
+    target = arrow_schema(schema)
+    result["schema_version"] = schema.version
+    tmp = dest.with_name(dest.name + ".tmp")
+    failures: Dict[str, int] = {}
+    required_nulls: Dict[str, int] = {}
+    dedup = None
+    try:
+        header = read_header(src, compression)
+        header_map = schema.map_header(header, case_sensitive=False)
+        result["missing_columns"] = ";".join(header_map.missing)
+        result["extra_columns"] = ";".join(header_map.extra)
+        missing_required = [c for c in header_map.missing if c in schema.required]
+        if missing_required:
+            raise ValueError(f"missing_required_columns({';'.join(missing_required)})")
+        # only the schema's columns are read, in file order; batch index of each
+        include = sorted(p for p in header_map.positions if p >= 0)
+        batch_pos = {p: j for j, p in enumerate(include)}
+        positions = tuple(batch_pos[p] if p >= 0 else -1 for p in header_map.positions)
+        required = frozenset(schema.index[name] for name in schema.required)
+        raw_names = [header[p].lstrip("\ufeff") for p in include]  # pyarrow drops the BOM too
+
+        if index_root is not None:
+            dedup, result["dedup_index"] = open_dedup_filter(Path(index_root), year, src)
+        record_id_pos = positions[schema.index[RECORD_ID]]
+        if record_id_pos < 0:
+            dedup = None
+
+        reader = pacsv.open_csv(
+            pa.input_stream(str(src), compression=compression),
+            read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_BYTES, use_threads=False),
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(
+                column_types={raw: pa.string() for raw in raw_names},
+                include_columns=raw_names,
+                strings_can_be_null=False,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        pending: List[pa.RecordBatch] = []
+        pending_rows = 0
+        with pq.ParquetWriter(
+            str(tmp), target, compression=parquet_compression, use_dictionary=list(schema.dictionary)
+        ) as writer:
+            for batch in reader:
+                if dedup is not None:
+                    batch = dedup_batch(batch, record_id_pos, dedup)
+                out = curate_batch(batch, target, positions, required, failures, required_nulls)
+                pending.append(out)
+                pending_rows += out.num_rows
+                while pending_rows >= row_group_rows:
+                    table = pa.Table.from_batches(pending, schema=target)
+                    writer.write_table(table.slice(0, row_group_rows), row_group_size=row_group_rows)
+                    rest = table.slice(row_group_rows)
+                    pending = rest.to_batches()
+                    pending_rows = rest.num_rows
+                    result["row_groups"] = int(result["row_groups"]) + 1
+                result["rows"] = int(result["rows"]) + out.num_rows
+            if pending_rows:
+                writer.write_table(pa.Table.from_batches(pending, schema=target), row_group_size=row_group_rows)
+                result["row_groups"] = int(result["row_groups"]) + 1
+        os.replace(tmp, dest)
+    except (pa.ArrowException, OSError, ValueError) as e:
+        result["error"] = f"ERROR: {e}"
+        try:
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+
+    if dedup is not None:
+        result["duplicates_dropped"] = dedup.duplicates_dropped
+        result["cross_company_dropped"] = dedup.cross_company_dropped
+    result["cast_failures"] = json.dumps(failures, sort_keys=True) if failures else ""
+    result["required_nulls"] = json.dumps(required_nulls, sort_keys=True) if required_nulls else ""
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+# ---------------------------
+# DISCOVERY
+# ---------------------------
+def company_id_of(src: Path) -> str:
+    # csv_<id>.csv[.gz|.zst]
+    name = src.name
+    return name[len("csv_"):name.index(".csv")]
+
+
+def open_dedup_filter(index_root: Path, year: str, src: Path):
+    """
+    (CompanyDedupFilter or None, dedup_index report value: ok / missing / stale).
+    """
+    index = RecordIndex(index_root)
+    company_id = company_id_of(src)
+    stats = index.company_stats(year, company_id)
+    if stats is None:
+        return None, "missing"
+    if int(stats.get("source_bytes", -1)) != src.stat().st_size:
+        return None, "stale"
+    return index.dedup_filter(year, company_id), "ok"
+
+
+def index_files(index_root: Optional[Path], year: str, src: Path) -> List[Path]:
+    if index_root is None:
+        return []
+    index = RecordIndex(index_root)
+    company_id = company_id_of(src)
+    return [index.company_path(year, company_id, "json"), index.company_path(year, company_id, "drop")]
+
+
+def iter_company_csvs(year_dir: Path):
+    for src in sorted(year_dir.glob("csv_*.csv*")):
+        if src.suffix in (".csv", ".gz", ".zst") and src.is_file():
+            yield src
+
+
+def output_path(out_root: Path, year: str, src: Path) -> Path:
+    return out_root / f"year={year}" / DATASET / f"company_{company_id_of(src)}.parquet"
+
+
+def is_up_to_date(src: Path, dest: Path, deps: Sequence[Path] = ()) -> bool:
+    """
+    dest is newer than src and than every existing dep (index files with --dedup).
+    """
+    try:
+        built = dest.stat().st_mtime
+        if built < src.stat().st_mtime:
+            return False
+    except FileNotFoundError:
+        return False
+    return all(built >= p.stat().st_mtime for p in deps if p.exists())
+
+
+# ---------------------------
+# PARTITIONED LAYOUT (--partitioned)
+# ---------------------------
+def partition_name(column: str) -> str:
+    # Athena / Glue names are lowercase
+    return column.lower()
+
+
+def partition_spec(args, schema: Schema) -> Dict[str, object]:
+    keys = list(args.partition_by)
+    sort_by = list(args.sort_by)
+    for name in keys + sort_by:
+        if name not in schema.index:
+            raise SystemExit(f"Unknown column: {name}")
+    if YEAR_COLUMN in keys or len(set(keys)) != len(keys):
+        raise SystemExit(f"--partition-by: secondary keys must be distinct and exclude {YEAR_COLUMN}")
+    overlap = set(keys) & set(sort_by)
+    if overlap:
+        raise SystemExit(f"--sort-by columns are constant within a partition: {sorted(overlap)}")
+    return {
+        "partition_by": keys,
+        "sort_by": sort_by,
+        "file_rows": args.partition_file_rows,
+        "row_group_rows": args.row_group_rows,
+        "compression": args.parquet_compression,
+    }
+
+
+def sort_partition_file(
+    path: str,
+    sort_by: List[str],
+    row_group_rows: int,
+    parquet_compression: str,
+    dictionary: List[str],
+    version: str,
+) -> int:
+    """
+    Rewrite one partition file (at most --partition-file-rows rows) sorted by
+    sort_by, in row groups of row_group_rows, so row-group min/max statistics
+    prune within the partition too. Returns its row count.
+    """
+    src = Path(path)
+    table = pq.read_table(src)
+    keys = [(c, "ascending") for c in sort_by if c in table.column_names]
+    if keys:
+        table = table.sort_by(keys)
+    table = table.replace_schema_metadata({SCHEMA_VERSION_KEY: version.encode("utf-8")})
+    tmp = src.with_name(src.name + ".tmp")
+    pq.write_table(
+        table,
+        str(tmp),
+        row_group_size=row_group_rows,
+        compression=parquet_compression,
+        use_dictionary=[c for c in dictionary if c in table.column_names],
+    )
+    os.replace(tmp, src)
+    return table.num_rows
+
+
+def max_open_partition_files() -> int:
+    """
+    Output files ds.write_dataset may keep open: the soft RLIMIT_NOFILE minus
+    headroom (1024 on most Linux runners), at most MAX_PARTITIONS. When the
+    cap is hit pyarrow closes the least recently used file and starts a new
+    one, so the cap costs smaller files, never a failure.
+    """
+    try:
+        import resource
+    except ImportError:
+        return FALLBACK_OPEN_FILES
+    soft, _hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return MAX_PARTITIONS
+    return max(MIN_OPEN_FILES, min(MAX_PARTITIONS, soft - OPEN_FILES_HEADROOM))
+
+
+def partition_year(
+    year: str,
+    company_files: List[Path],
+    table_dir: Path,
+    spec: Dict[str, object],
+    workers: int,
+) -> Tuple[int, int]:
+    """
+    Rewrite one program year's curated company files into
+    <table_dir>/program_year=YYYY/<key>=<value>/.../part-N.parquet.
+
+    pyarrow's dataset writer streams the company files into Hive partitions
+    (partition columns move from the data into the path; Program_Year is the
+    year folder), capping files at file_rows rows; every file is then sorted
+    into row groups across a process pool. The year is built in a hidden
+    temp dir and swapped in whole, so partitions that disappeared do not
+    linger. Returns (files, rows).
+    """
+    schema = schema_for_year(year)
+    target = arrow_schema(schema)
+    keys: List[str] = list(spec["partition_by"])
+    final = table_dir / f"{YEAR_PARTITION}={year}"
+    tmp = table_dir / f".tmp_{YEAR_PARTITION}={year}"
+    old = table_dir / f".old_{YEAR_PARTITION}={year}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    shutil.rmtree(old, ignore_errors=True)
+
+    dataset = ds.dataset([str(p) for p in company_files], schema=target, format="parquet")
+    columns = {
+        (partition_name(name) if name in keys else name): ds.field(name)
+        for name in target.names
+        if name != YEAR_COLUMN
+    }
+    ds.write_dataset(
+        dataset.scanner(columns=columns),
+        str(tmp),
+        format="parquet",
+        # rewritten (sorted, compressed) right after
+        file_options=ds.ParquetFileFormat().make_write_options(compression="none"),
+        partitioning=ds.partitioning(
+            pa.schema([(partition_name(k), target.field(k).type) for k in keys]), flavor="hive"
+        ),
+        basename_template="part-{i}.parquet",
+        max_rows_per_file=int(spec["file_rows"]),
+        max_rows_per_group=min(int(spec["row_group_rows"]), int(spec["file_rows"])),
+        max_partitions=MAX_PARTITIONS,
+        max_open_files=max_open_partition_files(),
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    files = sorted(str(p) for p in tmp.rglob("*.parquet"))
+    dictionary = list(schema.dictionary)  # partition columns are not in the files any more
+    rows = 0
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as ex:
+        futs = [
+            ex.submit(
+                sort_partition_file, f, list(spec["sort_by"]), int(spec["row_group_rows"]),
+                str(spec["compression"]), dictionary, schema.version,
+            )
+            for f in files
+        ]
+        for fut in as_completed(futs):
+            rows += fut.result()
+
+    if final.exists():
+        final.rename(old)
+    if tmp.exists():
+        tmp.rename(final)
+    shutil.rmtree(old, ignore_errors=True)
+    return len(files), rows
+
+
+def list_partitions(table_dir: Path, keys: List[str]) -> List[Dict[str, object]]:
+    """
+    Every leaf partition dir under table_dir with its (decoded) values,
+    relative path, files, rows (Parquet footers) and bytes.
+    """
+    depth = 1 + len(keys)
+    out = []
+    for year_dir in sorted(table_dir.glob(f"{YEAR_PARTITION}=*")):
+        if not year_dir.is_dir():
+            continue
+        leaves = [year_dir]
+        for _ in range(depth - 1):
+            leaves = [d for leaf in leaves for d in sorted(leaf.iterdir()) if d.is_dir() and "=" in d.name]
+        for leaf in leaves:
+            files = sorted(leaf.glob("*.parquet"))
+            if not files:
+                continue
+            rel = leaf.relative_to(table_dir)
+            out.append({
+                "values": [unquote(part.split("=", 1)[1]) for part in rel.parts],
+                "path": rel.as_posix(),
+                "files": len(files),
+                "rows": sum(pq.ParquetFile(str(f)).metadata.num_rows for f in files),
+                "bytes": sum(f.stat().st_size for f in files),
+            })
+    return out
+
+
+def sql_literal(value: str, typ: str) -> str:
+    if typ in ("int", "bigint") and value != HIVE_NULL:
+        return value
+    return "'" + value.replace("'", "''") + "'"
+
+
+def write_glue_partitions(
+    out_root: Path,
+    spec: Dict[str, object],
+    schema: Schema,
+    database: str,
+    location: str,
+) -> Tuple[Path, Path, int]:
+    """
+    Partition list of the partitioned table for the Glue catalog, two ways:
+    - glue_partitions.json: Glue BatchCreatePartition input (send in chunks of
+      100), full StorageDescriptor per partition plus numRows/numFiles/totalSize
+    - glue_partitions.sql: Athena CREATE EXTERNAL TABLE + ALTER TABLE ADD
+      PARTITION statements
+    Returns (json_path, sql_path, partitions).
+    """
+    keys: List[str] = list(spec["partition_by"])
+    partitions = list_partitions(out_root / DATASET, keys)
+    location = location.rstrip("/") + "/"
+    part_cols = [(YEAR_PARTITION, schema.column(YEAR_COLUMN).type)]
+    part_cols += [(partition_name(k), schema.column(k).type) for k in keys]
+    data_cols = [(c.name.lower(), c.type) for c in schema.columns if c.name != YEAR_COLUMN and c.name not in keys]
+    table = f"`{database}`.`{DATASET}`"
+
+    def descriptor(loc: str) -> Dict[str, object]:
+        return {
+            "Columns": [{"Name": n, "Type": t} for n, t in data_cols],
+            "Location": loc,
+            "InputFormat": PARQUET_INPUT_FORMAT,
+            "OutputFormat": PARQUET_OUTPUT_FORMAT,
+            "SerdeInfo": {"SerializationLibrary": PARQUET_SERDE},
+        }
+
+    doc = {
+        "DatabaseName": database,
+        "TableName": DATASET,
+        "PartitionKeys": [{"Name": n, "Type": t} for n, t in part_cols],
+        "SchemaVersion": schema.version,
+        "PartitionInputList": [
+            {
+                "Values": p["values"],
+                "StorageDescriptor": descriptor(location + p["path"] + "/"),
+                "Parameters": {"numRows": str(p["rows"]), "numFiles": str(p["files"]), "totalSize": str(p["bytes"])},
+            }
+            for p in partitions
+        ],
+    }
+    json_path = out_root / GLUE_PARTITIONS_JSON
+    json_path.write_text(json.dumps(doc, indent=1), encoding="utf-8")
+
+    lines = [
+        f"CREATE EXTERNAL TABLE IF NOT EXISTS {table} (",
+        ",\n".join(f"  `{n}` {t}" for n, t in data_cols),
+        ")",
+        "PARTITIONED BY (" + ", ".join(f"`{n}` {t}" for n, t in part_cols) + ")",
+        "STORED AS PARQUET",
+        f"LOCATION '{location}'",
+        f"TBLPROPERTIES ('openpayments.schema_version'='{schema.version}');",
+    ]
+    for start in range(0, len(partitions), SQL_PARTITIONS_PER_STATEMENT):
+        lines += ["", f"ALTER TABLE {table} ADD IF NOT EXISTS"]
+        for p in partitions[start:start + SQL_PARTITIONS_PER_STATEMENT]:
+            values = ", ".join(f"{n}={sql_literal(v, t)}" for (n, t), v in zip(part_cols, p["values"]))
+            lines.append(f"  PARTITION ({values}) LOCATION '{location}{p['path']}/'")
+        lines[-1] += ";"
+    sql_path = out_root / GLUE_PARTITIONS_SQL
+    sql_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return json_path, sql_path, len(partitions)
+
+
+def load_partition_spec(table_dir: Path) -> Optional[Dict[str, object]]:
+    try:
+        return json.loads((table_dir / PARTITION_SPEC_NAME).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def run_partitioning(
+    args,
+    out_root: Path,
+    years: List[str],
+    compiled_years: set,
+    spec: Dict[str, object],
+) -> None:
+    table_dir = out_root / DATASET
+    table_dir.mkdir(parents=True, exist_ok=True)
+    spec_changed = load_partition_spec(table_dir) != spec
+    if spec_changed:
+        # a different layout: every year present must be rebuilt, stale years removed
+        for d in table_dir.glob(f"{YEAR_PARTITION}=*"):
+            if d.name.split("=", 1)[1] not in years:
+                shutil.rmtree(d)
+
+    for year in years:
+        final = table_dir / f"{YEAR_PARTITION}={year}"
+        if not (args.force or spec_changed or year in compiled_years or not final.exists()):
+            print(f"[INFO] Partitions up to date: {final}")
+            continue
+        company_files = sorted((out_root / f"year={year}" / DATASET).glob("company_*.parquet"))
+        if not company_files:
+            print(f"[INFO] No curated company files for {year}; nothing to partition")
+            continue
+        started = time.monotonic()
+        files, rows = partition_year(year, company_files, table_dir, spec, args.workers)
+        print(
+            f"[OK] Partitioned {year}: {len(company_files)} company files -> {files} files "
+            f"({rows:,} rows) in {time.monotonic() - started:,.1f}s"
+        )
+
+    spec_path = table_dir / PARTITION_SPEC_NAME
+    spec_path.write_text(json.dumps(spec, sort_keys=True), encoding="utf-8")
+    json_path, sql_path, n = write_glue_partitions(
+        out_root, spec, schema_for_year(years[-1]), args.glue_database, args.table_location
+    )
+    print(f"[DONE] Wrote {n} partitions for {args.glue_database}.{DATASET}: {json_path} | {sql_path}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compile raw Open Payments CSVs into curated Parquet locally.")
+    parser.add_argument("--base-dir", default=".", help="Downloader output root containing YYYY/ folders")
+    parser.add_argument("--years", nargs="+", default=["2023", "2024"])
+    parser.add_argument("--out-root", default="curated", help="Curated output root (default: curated)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Company files compiled in parallel")
+    parser.add_argument(
+        "--row-group-rows",
+        type=int,
+        default=DEFAULT_ROW_GROUP_ROWS,
+        help=f"Rows per Parquet row group; bounds memory per worker (default: {DEFAULT_ROW_GROUP_ROWS:,})",
+    )
+    parser.add_argument(
+        "--parquet-compression",
+        default="snappy",
+        choices=["snappy", "zstd", "gzip", "none"],
+        help="Parquet column compression (default: snappy)",
+    )
+    parser.add_argument("--force", action="store_true", help="Rebuild outputs even if newer than their source")
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help=f"Drop duplicate Record_IDs using the index in <base-dir>/{INDEX_DIR_NAME} (see openpayments_record_index.py)",
+    )
+    parser.add_argument("--index-dir", default=None, help=f"--dedup: index root (default: <base-dir>/{INDEX_DIR_NAME})")
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help=f"Also build the Hive-partitioned table <out-root>/{DATASET}/{YEAR_PARTITION}=YYYY/... and its Glue partition lists",
+    )
+    parser.add_argument(
+        "--partition-by",
+        nargs="*",
+        default=DEFAULT_PARTITION_BY,
+        metavar="COLUMN",
+        help=f"--partitioned: secondary partition keys after {YEAR_PARTITION}; low-cardinality columns only "
+             f"(default: {' '.join(DEFAULT_PARTITION_BY)}; none: year only)",
+    )
+    parser.add_argument(
+        "--sort-by",
+        nargs="*",
+        default=DEFAULT_SORT_BY,
+        metavar="COLUMN",
+        help=f"--partitioned: sort order of rows within each file (default: {' '.join(DEFAULT_SORT_BY)})",
+    )
+    parser.add_argument(
+        "--partition-file-rows",
+        type=int,
+        default=DEFAULT_PARTITION_FILE_ROWS,
+        help=f"--partitioned: max rows per Parquet file; one file is sorted in memory "
+             f"(default: {DEFAULT_PARTITION_FILE_ROWS:,})",
+    )
+    parser.add_argument("--glue-database", default=GLUE_DATABASE, help=f"--partitioned: Glue database (default: {GLUE_DATABASE})")
+    parser.add_argument(
+        "--table-location",
+        default=DEFAULT_TABLE_LOCATION,
+        help=f"--partitioned: S3 location the {DATASET} folder is uploaded to (default: {DEFAULT_TABLE_LOCATION})",
+    )
+    args = parser.parse_args()
+
+    base_dir = Path(args.base_dir).resolve()
+    out_root = Path(args.out_root).resolve()
+    spec = partition_spec(args, schema_for_year(args.years[-1])) if args.partitioned else None
+    index_root: Optional[Path] = None
+    if args.dedup:
+        index_root = Path(args.index_dir).resolve() if args.index_dir else base_dir / INDEX_DIR_NAME
+        if not index_root.is_dir():
+            raise SystemExit(f"Record_ID index not found: {index_root} (run openpayments_record_index.py first)")
+
+    tasks: List[Tuple[str, Path, Path]] = []
+    skipped = 0
+    for year in args.years:
+        year_dir = base_dir / year
+        if not year_dir.is_dir():
+            raise SystemExit(f"Year folder not found: {year_dir}")
+        for src in iter_company_csvs(year_dir):
+            dest = output_path(out_root, year, src)
+            if not args.force and is_up_to_date(src, dest, index_files(index_root, year, src)):
+                skipped += 1
+                continue
+            tasks.append((year, src, dest))
+
+    print(f"[INFO] Company files to compile: {len(tasks)} (up to date: {skipped})")
+
+    results: List[Dict[str, object]] = []
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        futs = [
+            ex.submit(
+                curate_file, year, src, dest, args.row_group_rows, args.parquet_compression,
+                str(index_root) if index_root is not None else None,
+            )
+            for year, src, dest in tasks
+        ]
+        for n, fut in enumerate(as_completed(futs), start=1):
+            r = fut.result()
+            results.append(r)
+            if r["error"]:
+                print(f"[ERROR] ({n}/{len(tasks)}) {r['source']} {r['error']}")
+            else:
+                failed = f" cast_failures={r['cast_failures']}" if r["cast_failures"] else ""
+                if r["duplicates_dropped"] or r["cross_company_dropped"]:
+                    failed += f" duplicates_dropped={r['duplicates_dropped']:,} cross_company_dropped={r['cross_company_dropped']:,}"
+                if r["dedup_index"] in ("missing", "stale"):
+                    failed += f" dedup_index={r['dedup_index']}"
+                print(f"[OK] ({n}/{len(tasks)}) {r['output']} rows={r['rows']:,}{failed}")
+
+    elapsed = time.monotonic() - started
+    rows = sum(int(r["rows"]) for r in results)
+    errors = sum(1 for r in results if r["error"])
+    print(f"[INFO] Compiled {len(results) - errors} files ({rows:,} rows) in {elapsed:,.1f}s; errors: {errors}")
+    if index_root is not None:
+        dropped = sum(int(r["duplicates_dropped"]) + int(r["cross_company_dropped"]) for r in results)
+        unindexed = sum(1 for r in results if r["dedup_index"] in ("missing", "stale"))
+        print(f"[INFO] Dedup: {dropped:,} duplicate rows dropped; files without a current index: {unindexed}")
+
+    if results:
+        out_root.mkdir(parents=True, exist_ok=True)
+        report = out_root / REPORT_NAME
+        with report.open("w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            w.writeheader()
+            for r in sorted(results, key=lambda r: (r["year"], r["source"])):
+                w.writerow(r)
+        print(f"[DONE] Wrote report: {report}")
+
+    if spec is not None:
+        compiled_years = {r["year"] for r in results if not r["error"]}
+        run_partitioning(args, out_root, list(args.years), compiled_years, spec)
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+openpayments_checkpoint.py
+
+Page-level checkpoint manifest for openpayments_general_payments_download.py.
+
+One append-only JSONL file per output root:
+    <out_root>/download_manifest.jsonl
+
+Record types (one JSON object per line, last record wins):
+- {"type": "reset",   "year", "company_id"}                       company restarted from offset 0
+- {"type": "page",    "year", "company_id", "page", "offset",
+   "header_lines", "data_rows", "bytes"}                           page landed in its part file
+- {"type": "company", "year", "company_id", "expected_total",
+   "ok", "message", "rows", "bytes", "path"[, "sha256", "crc32c"]} company finalized (ok or not);
+                                                                   checksums of the final file
+                                                                   (openpayments_digest.py)
+
+With --resume the downloader skips companies whose final CSV is still on disk
+with the recorded size (--sink s3: whose recorded path is the target s3://
+URI), and within unfinished companies skips pages whose part file is still on
+disk with the recorded size (--direct-write: pages in the committed prefix of
+csv_<id>.csv.part; an unfinished S3 upload restarts from page 0). A torn last
+line (crash during append) is ignored on load, and the next append starts on
+a new line.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+MANIFEST_NAME = "download_manifest.jsonl"
+
+# (header_lines, data_rows, bytes)
+PageRecord = Tuple[int, int, int]
+
+
+class JsonlAppender:
+    """
+    Crash-safe appends to an append-only JSONL file (this manifest, the upload
+    ledger): one fsynced line per record, thread-safe, opened on first append.
+    If the file ends in a torn line (crash during append), the first record of
+    the session starts on a new line, or it would be lost with the torn one.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = None
+
+    def append(self, rec: dict) -> None:
+        line = json.dumps(rec, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._fh is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fh = self.path.open("a", encoding="utf-8")
+                if self._torn_tail():
+                    line = "\n" + line
+            self._fh.write(line)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def _torn_tail(self) -> bool:
+        try:
+            with self.path.open("rb") as fh:
+                fh.seek(0, os.SEEK_END)
+                if fh.tell() == 0:
+                    return False
+                fh.seek(-1, os.SEEK_END)
+                return fh.read(1) != b"\n"
+        except OSError:
+            return False
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+@dataclass
+class CompanyState:
+    pages: Dict[int, PageRecord] = field(default_factory=dict)
+    company: Optional[dict] = None
+
+
+class CheckpointManifest:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._state: Dict[Tuple[int, str], CompanyState] = {}
+        self._log = JsonlAppender(path)
+
+    # ---------------------------
+    # LOAD
+    # ---------------------------
+    def load(self) -> "CheckpointManifest":
+        if not self.path.exists():
+            return self
+
+        bad = 0
+        with self.path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                    key = (int(rec["year"]), str(rec["company_id"]))
+                except Exception:
+                    bad += 1
+                    continue
+
+                kind = rec.get("type")
+                if kind == "reset":
+                    self._state[key] = CompanyState()
+                elif kind == "page":
+                    st = self._state.setdefault(key, CompanyState())
+                    st.pages[int(rec["page"])] = (
+                        int(rec.get("header_lines", 0)),
+                        int(rec.get("data_rows", 0)),
+                        int(rec.get("bytes", 0)),
+                    )
+                elif kind == "company":
+                    self._state.setdefault(key, CompanyState()).company = rec
+
+        logging.info("Checkpoint loaded: %s companies=%d bad_lines=%d", self.path, len(self._state), bad)
+        return self
+
+    def company_record(self, year: int, company_id: str) -> Optional[dict]:
+        st = self._state.get((year, company_id))
+        return st.company if st else None
+
+    def company_records(self) -> Dict[Tuple[int, str], dict]:
+        """
+        Latest company record per (year, company_id).
+        """
+        return {key: st.company for key, st in self._state.items() if st.company is not None}
+
+    def is_company_done(self, year: int, company_id: str, location: str) -> bool:
+        """
+        location: local final CSV path (must still be on disk with the recorded
+        size) or s3:// URI (must match the recorded one; objects only appear
+        once their multipart upload completed).
+        """
+        rec = self.company_record(year, company_id)
+        if not rec or not rec.get("ok"):
+            return False
+        if location.startswith("s3://"):
+            return rec.get("path") == location
+        final_path = Path(location)
+        try:
+            return final_path.exists() and final_path.stat().st_size == int(rec.get("bytes", -1))
+        except OSError:
+            return False
+
+    def completed_page(self, year: int, company_id: str, page_index: int, part_path: Path) -> Optional[PageRecord]:
+        """
+        Recorded page whose output is still intact (empty pages have no part file).
+        """
+        st = self._state.get((year, company_id))
+        if not st or page_index not in st.pages:
+            return None
+        header_lines, data_rows, nbytes = st.pages[page_index]
+        if data_rows == 0:
+            return st.pages[page_index]
+        try:
+            if part_path.exists() and part_path.stat().st_size == nbytes:
+                return st.pages[page_index]
+        except OSError:
+            pass
+        return None
+
+    def committed_prefix(self, year: int, company_id: str, tmp_path: Path) -> Dict[int, PageRecord]:
+        """
+        --direct-write: recorded pages 0..k that are fully contained, in order, in
+        csv_<id>.csv.part. Anything after the prefix is truncated on reopen.
+        """
+        st = self._state.get((year, company_id))
+        if not st or not st.pages:
+            return {}
+        try:
+            size = tmp_path.stat().st_size
+        except OSError:
+            return {}
+
+        prefix: Dict[int, PageRecord] = {}
+        total = 0
+        i = 0
+        while i in st.pages and total + st.pages[i][2] <= size:
+            total += st.pages[i][2]
+            prefix[i] = st.pages[i]
+            i += 1
+        return prefix
+
+    # ---------------------------
+    # APPEND
+    # ---------------------------
+    def _append(self, rec: dict) -> None:
+        rec["ts"] = datetime.now().isoformat(timespec="seconds")
+        self._log.append(rec)
+
+    def record_reset(self, year: int, company_id: str) -> None:
+        self._state[(year, company_id)] = CompanyState()
+        self._append({"type": "reset", "year": year, "company_id": company_id})
+
+    def record_page(
+        self,
+        year: int,
+        company_id: str,
+        page_index: int,
+        offset: int,
+        header_lines: int,
+        data_rows: int,
+        nbytes: int,
+    ) -> None:
+        self._append({
+            "type": "page",
+            "year": year,
+            "company_id": company_id,
+            "page": page_index,
+            "offset": offset,
+            "header_lines": header_lines,
+            "data_rows": data_rows,
+            "bytes": nbytes,
+        })
+
+    def record_company(
+        self,
+        year: int,
+        company_id: str,
+        expected_total: int,
+        ok: bool,
+        message: str,
+        rows: int,
+        nbytes: int,
+        path: Optional[str],
+        checksums: Optional[dict] = None,
+    ) -> None:
+        rec = {
+            "type": "company",
+            "year": year,
+            "company_id": company_id,
+            "expected_total": expected_total,
+            "ok": ok,
+            "message": message,
+            "rows": rows,
+            "bytes": nbytes,
+            "path": str(path) if path else "",
+        }
+        rec.update(checksums or {})
+        self._state.setdefault((year, company_id), CompanyState()).company = rec
+        self._append(rec)
+
+    def close(self) -> None:
+        self._log.close()
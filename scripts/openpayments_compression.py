@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+openpayments_compression.py
+
+Optional on-the-fly compression of downloaded CSVs
+(openpayments_general_payments_download.py --compress).
+
+- gzip: csv_<id>.csv.gz, readable by Athena / Glue as-is
+- zstd: csv_<id>.csv.zst, faster and smaller for local staging (needs zstandard)
+
+Every page is compressed while it streams, by its own compressor, into a
+self-contained gzip member / zstd frame. A concatenation of members is itself
+a valid gzip / zstd stream (gzip -d, zstd -d, Athena and Python's gzip module
+read all members), so merge_parts, the ordered writer and the S3 sink keep
+concatenating pages byte-for-byte and each company file is one compressed
+stream. Pages are ~PAGE_LIMIT rows, so per-member overhead is negligible.
+"""
+
+from __future__ import annotations
+
+import gzip
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+
+CODECS = ("none", "gzip", "zstd")
+SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+CONTENT_TYPES = {"none": "text/csv", "gzip": "application/gzip", "zstd": "application/zstd"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+HEAD_MAX_BYTES = 512 * 1024
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise SystemExit("--compress zstd needs the zstandard package (pip install zstandard)") from e
+    return zstandard
+
+
+@dataclass(frozen=True)
+class Compression:
+    codec: str = "none"
+    level: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.codec != "none"
+
+    @property
+    def suffix(self) -> str:
+        return SUFFIXES[self.codec]
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.codec]
+
+    def compressor(self):
+        """
+        New streaming compressor for one page (compress(data) -> bytes, flush() -> bytes),
+        or None for plain CSV.
+        """
+        level = self.level if self.level is not None else DEFAULT_LEVELS.get(self.codec)
+        if self.codec == "gzip":
+            return zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+        if self.codec == "zstd":
+            return _zstandard().ZstdCompressor(level=level).compressobj()
+        return None
+
+    def decompress_head(self, sample: bytes, max_bytes: int = HEAD_MAX_BYTES) -> bytes:
+        """
+        Plain bytes at the start of a (possibly truncated) compressed sample,
+        enough for header validation.
+        """
+        if self.codec == "gzip":
+            return zlib.decompressobj(GZIP_WBITS).decompress(sample, max_bytes)
+        if self.codec == "zstd":
+            return _zstandard().ZstdDecompressor().decompressobj().decompress(sample)[:max_bytes]
+        return sample
+
+    def open_reader(self, path) -> BinaryIO:
+        """
+        Binary reader of the plain CSV bytes of a finished company file (all members / frames).
+        """
+        if self.codec == "gzip":
+            return gzip.open(path, "rb")
+        if self.codec == "zstd":
+            return _zstandard().ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        return open(path, "rb")
+
+    def stream_reader(self, raw: BinaryIO) -> BinaryIO:
+        """
+        Binary reader of the plain CSV bytes of a compressed stream (e.g. an S3
+        body), read sequentially. A gzip stream cut short raises EOFError, a
+        zstd one just ends.
+        """
+        if self.codec == "gzip":
+            return gzip.GzipFile(fileobj=raw, mode="rb")
+        if self.codec == "zstd":
+            return _zstandard().ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        return raw
+
+    @classmethod
+    def for_path(cls, path) -> "Compression":
+        """
+        Codec of an existing csv_<id>.csv[.gz|.zst] file, from its suffix.
+        """
+        name = str(path)
+        for codec, suffix in SUFFIXES.items():
+            if suffix and name.endswith(suffix):
+                return cls(codec)
+        return cls()
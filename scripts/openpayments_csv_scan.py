@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+openpayments_csv_scan.py
+
+Incremental, quote-aware CSV record boundary scanner.
+
+Open Payments rows can contain newlines inside quoted fields (e.g.
+Contextual_Information), so "one \\n == one row" over-counts rows and can cut a
+record in the middle of a quoted field. This scanner tracks quote parity
+across chunks:
+- a newline ends a record only when an even number of '"' has been seen since
+  the record started (an escaped "" flips parity twice, so it needs no special case)
+- state survives chunk boundaries, so bytes can be fed exactly as they stream in
+
+Blank records (an empty line or a lone "\r\n" outside quotes) are not counted,
+as the line-based writers skipped them; blank_spans lists the byte ranges of
+those completed by the last feed so the page writer can leave them out.
+
+It never decodes bytes and only loops in Python once per physical line (quote
+counting and newline search are bytes.count / bytes.find); chunks without any
+quote while outside a quoted field take a single bytes.count.
+
+Usage:
+    scanner = CsvRecordScanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    scanner.records        # complete non-blank records seen
+    scanner.last_boundary  # byte offset just past the last complete record
+    scanner.in_quotes      # True => input ended inside a quoted field
+"""
+
+from __future__ import annotations
+
+
+QUOTE = b'"'
+NEWLINE = b"\n"
+CR = 0x0D
+BLANK_LINES = (b"\n\n", b"\n\r\n")
+
+
+class CsvRecordScanner:
+    __slots__ = ("in_quotes", "records", "blank_records", "blank_spans", "offset", "last_boundary", "_last_byte")
+
+    def __init__(self) -> None:
+        self.in_quotes = False
+        self.records = 0
+        self.blank_records = 0
+        self.blank_spans = []    # (start, end) offsets of blank records completed by the last feed
+        self.offset = 0          # bytes fed so far
+        self.last_boundary = 0   # offset just past the last record-ending newline
+        self._last_byte = -1     # last byte of the previous chunk
+
+    def _may_start_blank(self, data, base: int) -> bool:
+        # the record open at the start of data is empty so far, or just "\r"
+        pending = base - self.last_boundary
+        if pending == 0:
+            return data[:1] == NEWLINE or data[:2] == b"\r\n"
+        return pending == 1 and self._last_byte == CR and data[:1] == NEWLINE
+
+    def feed(self, data) -> int:
+        """
+        Scan the next chunk; returns how many non-blank records it completed.
+        """
+        self.blank_spans = []
+        n = len(data)
+        if n == 0:
+            return 0
+
+        base = self.offset
+        self.offset += n
+
+        # fast path: no quote anywhere, not inside a quoted field, no blank line
+        if (
+            not self.in_quotes
+            and data.find(QUOTE) == -1
+            and not any(b in data for b in BLANK_LINES)
+            and not self._may_start_blank(data, base)
+        ):
+            c = data.count(NEWLINE)
+            if c:
+                self.records += c
+                self.last_boundary = base + data.rfind(NEWLINE) + 1
+            self._last_byte = data[-1]
+            return c
+
+        completed = 0
+        odd = self.in_quotes
+        start = 0
+        while True:
+            nl = data.find(NEWLINE, start)
+            if nl == -1:
+                if data.count(QUOTE, start) & 1:
+                    odd = not odd
+                break
+            if data.count(QUOTE, start, nl) & 1:
+                odd = not odd
+            if not odd:
+                end = base + nl + 1
+                length = end - 1 - self.last_boundary
+                prev = data[nl - 1] if nl else self._last_byte
+                if length == 0 or (length == 1 and prev == CR):
+                    self.blank_records += 1
+                    self.blank_spans.append((self.last_boundary, end))
+                else:
+                    completed += 1
+                self.last_boundary = end
+            start = nl + 1
+
+        self.in_quotes = odd
+        self.records += completed
+        self._last_byte = data[-1]
+        return completed
+
+    @property
+    def at_boundary(self) -> bool:
+        return not self.in_quotes and self.offset == self.last_boundary
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+openpayments_csv_validate.py
+
+Streaming, bounded-memory validation of a whole Open Payments CSV
+(audit_raw_csv_schema.py --full-scan).
+
+Bytes are fed in chunks exactly as they stream from S3. Records are split with
+the same quote-parity rule as CsvRecordScanner (openpayments_csv_scan.py): a
+newline ends a record only outside a quoted field. For every record:
+- field count: commas outside quotes + 1 (the segments at even positions of
+  record.split(b'"') are the unquoted parts; an escaped "" adds an empty one),
+  compared with the header's column count
+- encoding: strict UTF-8 decode
+- unbalanced quotes: a quoted field still open after max_record_bytes, or at
+  end of file
+
+Only the current record is buffered. A record that outgrows max_record_bytes
+(almost always a stray quote swallowing the rest of the file) is reported as
+an unbalanced quote and scanning resyncs at the physical line after the one
+it started on, so memory stays bounded whatever the input.
+
+Counts are exact; row-level issues (kind, record number, byte offset, detail)
+are kept for the first max_issues only. Record numbers count data records
+from 1 (the header is record 0); offsets are bytes from the start of the file.
+
+Mid-file samples (audit_raw_csv_schema.py --range-samples) start at an
+arbitrary byte, where quote parity is unknown: resync_offset() picks the first
+line start from which the next few records all have the expected field count,
+and the validator then runs from there with expected_fields/base_offset set.
+
+Usage:
+    v = CsvStreamValidator()
+    for chunk in chunks:
+        v.feed(chunk)
+    v.finish()
+    v.records, v.column_mismatches, v.unbalanced_quotes, v.encoding_errors, v.issues
+"""
+
+from __future__ import annotations
+
+import csv
+from typing import Dict, List, Optional
+
+
+QUOTE = b'"'
+NEWLINE = b"\n"
+COMMA = b","
+
+DEFAULT_MAX_RECORD_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_ISSUES = 100
+RESYNC_CONFIRM_RECORDS = 3
+
+COLUMN_MISMATCH = "column_mismatch"
+UNBALANCED_QUOTE = "unbalanced_quote"
+ENCODING_ERROR = "encoding_error"
+
+
+def count_fields(record: bytes) -> int:
+    if QUOTE not in record:
+        return record.count(COMMA) + 1
+    return sum(seg.count(COMMA) for seg in record.split(QUOTE)[::2]) + 1
+
+
+def iter_record_ends(data: bytes, start: int = 0):
+    """
+    End offsets (just past the newline) of the complete records in data[start:],
+    assuming start is outside a quoted field.
+    """
+    odd = False
+    pos = start
+    while True:
+        nl = data.find(NEWLINE, pos)
+        if nl == -1:
+            return
+        if data.count(QUOTE, pos, nl) & 1:
+            odd = not odd
+        pos = nl + 1
+        if not odd:
+            yield pos
+
+
+def resync_offset(data: bytes, expected_fields: int, confirm: int = RESYNC_CONFIRM_RECORDS) -> int:
+    """
+    First line start in data (a chunk beginning mid-record) from which the next
+    `confirm` records all have expected_fields fields, or -1 if none.
+    """
+    candidate = data.find(NEWLINE) + 1
+    while candidate:
+        ok = 0
+        rec_start = candidate
+        for end in iter_record_ends(data, candidate):
+            if count_fields(data[rec_start:end]) != expected_fields:
+                break
+            ok += 1
+            if ok >= confirm:
+                return candidate
+            rec_start = end
+        candidate = data.find(NEWLINE, candidate) + 1
+    return -1
+
+
+class CsvStreamValidator:
+    def __init__(
+        self,
+        max_record_bytes: int = DEFAULT_MAX_RECORD_BYTES,
+        max_issues: int = DEFAULT_MAX_ISSUES,
+        expected_fields: Optional[int] = None,
+        base_offset: int = 0,
+    ) -> None:
+        """
+        expected_fields/base_offset: for data starting mid-file at a record
+        boundary (no header record; offsets reported relative to the file).
+        """
+        self.max_record_bytes = max_record_bytes
+        self.max_issues = max_issues
+        self.expected_fields = expected_fields
+
+        self.header: Optional[List[str]] = None
+        self.records = 0
+        self.column_mismatches = 0
+        self.unbalanced_quotes = 0
+        self.encoding_errors = 0
+        self.issues: List[Dict[str, object]] = []
+        self.bytes_scanned = 0
+
+        self._buf = bytearray()
+        self._base = base_offset  # file offset of _buf[0] (always a record start)
+        self._line_start = 0    # where the newline search resumes in _buf
+        self._odd = False       # quote parity of _buf[:_line_start]
+
+    @property
+    def issue_count(self) -> int:
+        return self.column_mismatches + self.unbalanced_quotes + self.encoding_errors
+
+    def _issue(self, kind: str, record: int, offset: int, detail: str) -> None:
+        if len(self.issues) < self.max_issues:
+            self.issues.append({"kind": kind, "record": record, "offset": offset, "detail": detail})
+
+    def _check(self, rec: bytes, offset: int) -> None:
+        if self.expected_fields is None:
+            self.header = next(csv.reader([rec.decode("utf-8", errors="replace")]), [])
+            self.expected_fields = len(self.header)
+            return
+        self.records += 1
+        try:
+            rec.decode("utf-8")
+        except UnicodeDecodeError as e:
+            self.encoding_errors += 1
+            self._issue(ENCODING_ERROR, self.records, offset + e.start, f"invalid utf-8 byte 0x{rec[e.start]:02x}")
+        n = count_fields(rec)
+        if n != self.expected_fields:
+            self.column_mismatches += 1
+            self._issue(COLUMN_MISMATCH, self.records, offset, f"fields={n} expected={self.expected_fields}")
+
+    def feed(self, data) -> None:
+        if not data:
+            return
+        self.bytes_scanned += len(data)
+        buf = self._buf
+        buf += data
+
+        rec_start = 0
+        start = self._line_start
+        odd = self._odd
+        while True:
+            nl = buf.find(NEWLINE, start)
+            if nl == -1:
+                if odd and start - rec_start > self.max_record_bytes:
+                    # runaway quoted field: report it, then rescan from the line after its start
+                    self.records += 1
+                    self.unbalanced_quotes += 1
+                    self._issue(
+                        UNBALANCED_QUOTE, self.records, self._base + rec_start,
+                        f"quoted field still open after {start - rec_start} bytes; resynced at next line",
+                    )
+                    rec_start = start = buf.find(NEWLINE, rec_start) + 1
+                    odd = False
+                    continue
+                break
+            if buf.count(QUOTE, start, nl) & 1:
+                odd = not odd
+            start = nl + 1
+            if not odd:
+                self._check(bytes(buf[rec_start:start]), self._base + rec_start)
+                rec_start = start
+
+        del buf[:rec_start]
+        self._base += rec_start
+        self._line_start = start - rec_start
+        self._odd = odd
+
+    def finish(self) -> None:
+        """
+        Check the last record (no trailing newline, or an open quote at EOF).
+        """
+        buf = self._buf
+        if buf:
+            if self._odd ^ bool(buf.count(QUOTE, self._line_start) & 1):
+                self.records += 1
+                self.unbalanced_quotes += 1
+                self._issue(UNBALANCED_QUOTE, self.records, self._base, "quoted field still open at end of file")
+            else:
+                self._check(bytes(buf), self._base)
+        self._buf = bytearray()
+        self._base += len(buf)
+        self._line_start = 0
+        self._odd = False
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+openpayments_digest.py
+
+Running checksums of each company CSV, computed over the bytes as they are
+written (openpayments_general_payments_download.py; on by default,
+--no-checksum to disable, --crc32c to add CRC32C).
+
+- SHA-256 (hex): what upload_run_to_s3.py compares / stores as x-amz-meta-sha256
+- CRC32C (base64, S3's x-amz-checksum-crc32c format): optional, needs awscrt
+  (pip install "boto3[crt]"), the same implementation botocore uses for S3
+
+The digest follows the final file byte order, so it is fed wherever bytes are
+appended in order: the --direct-write sinks (pages already in memory cost no
+read at all), or, for part files, OrderedPageDigest while the pages land, so
+merge_parts keeps its kernel-side copy and never reads a part back. The result
+is stored in the company
+record of download_manifest.jsonl next to rows/bytes:
+    {"type": "company", ..., "rows", "bytes", "sha256", "crc32c"}
+so the uploader and audits never re-read a CSV just to checksum it.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from openpayments_ordered_writer import write_all
+
+
+DIGEST_READ_BYTES = 1024 * 1024
+
+
+def _crc32c_fn():
+    try:
+        from awscrt import checksums
+    except ImportError as e:
+        raise SystemExit('--crc32c needs awscrt (pip install "boto3[crt]")') from e
+    return checksums.crc32c
+
+
+class RunningDigest:
+    def __init__(self, crc32c: bool = False) -> None:
+        self._sha256 = hashlib.sha256()
+        self._crc32c_fn = _crc32c_fn() if crc32c else None
+        self._crc32c = 0
+        self.bytes = 0
+
+    def update(self, data) -> None:
+        self._sha256.update(data)
+        if self._crc32c_fn is not None:
+            self._crc32c = self._crc32c_fn(data, self._crc32c)
+        self.bytes += len(data)
+
+    def state(self) -> Tuple[object, int, int]:
+        return (self._sha256.copy(), self._crc32c, self.bytes)
+
+    def restore(self, state: Tuple[object, int, int]) -> None:
+        sha256, self._crc32c, self.bytes = state
+        self._sha256 = sha256.copy()
+
+    def update_from_file(self, src: Path, out_fd: Optional[int] = None, limit: Optional[int] = None) -> int:
+        """
+        Digest src (its first `limit` bytes), copying it to out_fd on the way if
+        given: one read serves both. Returns bytes read.
+        """
+        n = 0
+        with src.open("rb", buffering=0) as inp:
+            while limit is None or n < limit:
+                want = DIGEST_READ_BYTES if limit is None else min(DIGEST_READ_BYTES, limit - n)
+                buf = inp.read(want)
+                if not buf:
+                    break
+                self.update(buf)
+                if out_fd is not None:
+                    write_all(out_fd, buf)
+                n += len(buf)
+        return n
+
+    @property
+    def sha256_hex(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def sha256_b64(self) -> str:
+        return base64.b64encode(self._sha256.digest()).decode("ascii")
+
+    @property
+    def crc32c_b64(self) -> Optional[str]:
+        if self._crc32c_fn is None:
+            return None
+        return base64.b64encode(self._crc32c.to_bytes(4, "big")).decode("ascii")
+
+    def to_record(self) -> Dict[str, object]:
+        rec: Dict[str, object] = {"sha256": self.sha256_hex}
+        if self._crc32c_fn is not None:
+            rec["crc32c"] = self.crc32c_b64
+        return rec
+
+
+
+class OrderedPageDigest:
+    """
+    Feeds a company's RunningDigest with its part files in page order while the
+    pages download, in any order, on several workers.
+
+    The page that is next in order when it starts gets a live tap: the bytes
+    PageStreamWriter writes to its part file go straight into the digest. Pages
+    that land ahead of it wait; once every earlier page has landed they are
+    digested from their just-written (page-cache-hot) part file by the worker
+    that closed the gap. A page that leaves no part (failed or empty) is rolled
+    back out of the digest.
+    """
+
+    def __init__(self, digest: RunningDigest) -> None:
+        self.digest = digest
+        self._lock = threading.Lock()
+        self._next = 0                          # first page not yet digested
+        self._live: Optional[int] = None        # page being digested through its tap
+        self._live_state: Optional[Tuple[object, int, int]] = None
+        self._landed: Dict[int, Optional[Path]] = {}
+
+    @property
+    def pages(self) -> int:
+        """
+        Pages 0..pages-1 are in the digest.
+        """
+        with self._lock:
+            return self._next
+
+    def open_page(self, page_index: int) -> Optional[Callable[[bytes], None]]:
+        """
+        Tap for a page about to stream, or None if earlier pages are still missing.
+        """
+        with self._lock:
+            if page_index != self._next or self._live is not None:
+                return None
+            self._live = page_index
+            self._live_state = self.digest.state()
+            return self.digest.update
+
+    def page_landed(self, page_index: int, part_path: Optional[Path]) -> None:
+        """
+        part_path: the page's finished part file, or None if it left none.
+        """
+        with self._lock:
+            if page_index == self._live:
+                if part_path is None:
+                    self.digest.restore(self._live_state)
+                self._live = None
+                self._live_state = None
+                self._next += 1
+            else:
+                self._landed[page_index] = part_path
+            while self._next in self._landed:
+                path = self._landed.pop(self._next)
+                if path is not None:
+                    self.digest.update_from_file(path)
+                self._next += 1
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+openpayments_download_async.py
+
+asyncio backend for openpayments_general_payments_download.py
+(selected with --backend asyncio).
+
+Every page request for every company/year runs as a coroutine on ONE event
+loop: --max-inflight consumer coroutines drain the same global PageScheduler
+as the threaded backend, so hundreds of requests can be outstanding on a
+small runner without hundreds of OS threads.
+
+Same rules and outputs as the threaded backend:
+- pages land in _parts/<id>/part_NNNNNN.csv, then finalize_company merges them
+  (or go through the company's ordered writer and sink with --direct-write / --sink s3)
+- Header-only => FAIL
+- Returns the same report rows
+
+Only socket reads and cheap bookkeeping run on the loop. Blocking work goes
+through asyncio.to_thread: compressing and Record_ID parsing of each chunk,
+the Record_ID key files, the checkpoint append (one fsync per page),
+draining the page digest, sink commits and the company merge. A plain page
+chunk (no --compress, no --record-index) is written inline: one newline
+count and one buffered write of at most STREAM_CHUNK_BYTES, well under a
+millisecond.
+
+Requires aiohttp (only imported when this backend is selected).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import aiohttp
+from tqdm import tqdm
+
+from openpayments_general_payments_download import (
+    BACKOFF_FACTOR,
+    CONNECT_TIMEOUT,
+    DEFAULT_HEADERS,
+    MANUAL_ATTEMPTS,
+    MANUAL_BACKOFF_BASE,
+    MAX_RETRIES,
+    READ_TIMEOUT,
+    build_params,
+    PageJob,
+    build_scheduler,
+    checkpoint_page,
+    land_page_digest,
+    commit_direct_page,
+    complete_company,
+    page_error_result,
+    page_record_ids,
+    resumed_page_result,
+    save_page_record_ids,
+)
+from openpayments_checkpoint import CheckpointManifest
+from openpayments_compression import Compression
+from openpayments_ordered_writer import ReorderBudget
+from openpayments_page_writer import STREAM_CHUNK_BYTES, PageStreamWriter
+from openpayments_rate_limit import get_rate_limiter
+from openpayments_record_index import RecordIdCollector, RecordIndex
+
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+# ---------------------------
+# HTTP
+# ---------------------------
+def make_async_session(max_inflight: int) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(limit=max_inflight, limit_per_host=max_inflight)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=DEFAULT_HEADERS)
+
+
+async def request_with_manual_backoff_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    params: dict,
+) -> aiohttp.ClientResponse:
+    """
+    Async twin of request_with_manual_backoff, also covering the 5xx retries that
+    urllib3 Retry does for the threaded backend. Caller must release the response.
+    Shares the process-wide rate limiter with the threaded code paths.
+    """
+    last_exc: Optional[Exception] = None
+    server_errors = 0
+    limiter = get_rate_limiter()
+
+    for attempt in range(1, MANUAL_ATTEMPTS + MAX_RETRIES + 1):
+        if attempt - server_errors > MANUAL_ATTEMPTS:
+            break
+        await limiter.acquire_async()
+        try:
+            resp = await session.get(url, params=params)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            last_exc = e
+            sleep_s = MANUAL_BACKOFF_BASE * (attempt ** 1.3)
+            logging.warning("REQUEST EXCEPTION attempt=%s/%s err=%r sleep=%.2fs", attempt, MANUAL_ATTEMPTS, e, sleep_s)
+            await asyncio.sleep(sleep_s)
+            continue
+
+        if resp.status in RETRY_STATUSES and server_errors < MAX_RETRIES:
+            server_errors += 1
+            resp.release()
+            sleep_s = BACKOFF_FACTOR * (2 ** (server_errors - 1))
+            logging.warning("HTTP %s retry=%s/%s sleep=%.2fs params=%s", resp.status, server_errors, MAX_RETRIES, sleep_s, params)
+            await asyncio.sleep(sleep_s)
+            continue
+
+        if resp.status in (403, 429):
+            resp.release()
+            sleep_s = MANUAL_BACKOFF_BASE * (attempt ** 1.6)
+            logging.warning(
+                "HTTP %s attempt=%s/%s (WAF/throttle?) global_pause=%.2fs rate=%.2f params=%s",
+                resp.status, attempt, MANUAL_ATTEMPTS, sleep_s, limiter.rate, params
+            )
+            limiter.on_throttle(resp.status, penalty_s=sleep_s)
+            continue
+
+        limiter.record(resp.status)
+        return resp
+
+    if last_exc:
+        raise last_exc
+    raise RuntimeError("request_with_manual_backoff_async exhausted without response")
+
+
+async def stream_page_bytes(
+    resp: aiohttp.ClientResponse,
+    fh,
+    write_header: bool,
+    compression: Compression = Compression(),
+    record_ids: Optional[RecordIdCollector] = None,
+    tap: Optional[Callable[[bytes], None]] = None,
+) -> PageStreamWriter:
+    """
+    Copy one CSV page from resp into the open binary handle fh as raw bytes
+    (or one compressed member with --compress).
+    Returns the closed writer (header_lines, data_lines, truncated_bytes).
+    Chunks that need compressing or Record_ID parsing are fed in a worker
+    thread, one at a time so the page stays in order.
+    """
+    writer = PageStreamWriter(
+        fh, write_header=write_header, compressor=compression.compressor(), record_ids=record_ids, tap=tap
+    )
+    offload = compression.enabled or record_ids is not None
+    async for chunk in resp.content.iter_chunked(STREAM_CHUNK_BYTES):
+        if offload:
+            await asyncio.to_thread(writer.feed, chunk)
+        else:
+            writer.feed(chunk)
+    if offload:
+        await asyncio.to_thread(writer.close)
+    else:
+        writer.close()
+    return writer
+
+
+# ---------------------------
+# PAGE DOWNLOAD
+# ---------------------------
+async def fetch_page_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    company_id: str,
+    offset: int,
+    fh,
+    is_first_page: bool,
+    compression: Compression = Compression(),
+    record_ids: Optional[RecordIdCollector] = None,
+    tap: Optional[Callable[[bytes], None]] = None,
+) -> Tuple[bool, str, int, int]:
+    """
+    Stream one page into the open binary handle fh (part file or reorder buffer).
+    Returns: (ok, msg, header_lines_written, data_lines_written)
+    Header-only => empty_page_no_data_rows
+    """
+    params = build_params(company_id, offset)
+    logging.debug("REQUEST url=%s company_id=%s offset=%s params=%s", url, company_id, offset, params)
+
+    try:
+        resp = await request_with_manual_backoff_async(session, url, params)
+    except Exception as e:
+        return (False, f"request_error:{e}", 0, 0)
+
+    try:
+        if resp.status != 200:
+            return (False, f"HTTP {resp.status} at offset {offset}", 0, 0)
+        writer = await stream_page_bytes(
+            resp, fh, write_header=is_first_page, compression=compression, record_ids=record_ids, tap=tap
+        )
+    except Exception as e:
+        return (False, f"write_error:{e}", 0, 0)
+    finally:
+        resp.release()
+
+    if writer.truncated_bytes:
+        logging.warning(
+            "PARTIAL RECORD dropped company_id=%s offset=%s bytes=%s (body ended inside a quoted field)",
+            company_id, offset, writer.truncated_bytes
+        )
+
+    if writer.data_lines == 0:
+        return (True, "empty_page_no_data_rows", writer.header_lines, 0)
+    return (True, "ok", writer.header_lines, writer.data_lines)
+
+
+def save_and_checkpoint_page(
+    checkpoint: Optional[CheckpointManifest],
+    page: PageJob,
+    result: Tuple[bool, str, int, int],
+    record_ids: Optional[RecordIdCollector],
+) -> None:
+    # part files: one worker-thread hop for both blocking steps
+    save_page_record_ids(page, result, record_ids)
+    checkpoint_page(checkpoint, page, result)
+
+
+async def fetch_page_for_job_async(
+    session: aiohttp.ClientSession,
+    checkpoint: Optional[CheckpointManifest],
+    page: PageJob,
+) -> Tuple[bool, str, int, int]:
+    """
+    Async twin of fetch_page_for_job: part file, or the company's ordered
+    writer with --direct-write; checkpoints the result.
+    """
+    job = page.job
+    is_first_page = page.page_index == 0
+    record_ids = page_record_ids(job)
+
+    if job.writer is None:
+        part_path = job.part_path(page.page_index)
+        tap = job.page_digest.open_page(page.page_index) if job.page_digest is not None else None
+        try:
+            with part_path.open("wb") as fh:
+                result = await fetch_page_async(
+                    session, job.url, job.company_id, page.offset, fh, is_first_page, job.compression, record_ids,
+                    tap,
+                )
+        except Exception as e:
+            result = (False, f"write_error:{e}", 0, 0)
+        if not result[0] or result[3] == 0:
+            try:
+                part_path.unlink()
+            except Exception:
+                pass
+        await asyncio.to_thread(save_and_checkpoint_page, checkpoint, page, result, record_ids)
+        return result
+
+    target, fh = job.writer.open_page(job.part_path(page.page_index))
+    try:
+        result = await fetch_page_async(
+            session, job.url, job.company_id, page.offset, fh, is_first_page, job.compression, record_ids
+        )
+    except Exception:
+        job.writer.discard_page(target)  # give back its reorder budget slot
+        raise
+    finally:
+        if fh is not target:
+            fh.close()  # spilled to a part file
+    # key files, sink commits (possibly several buffered pages, to disk or S3) and
+    # checkpoint fsyncs all block; keep them off the event loop
+    await asyncio.to_thread(save_page_record_ids, page, result, record_ids)
+    return await asyncio.to_thread(commit_direct_page, checkpoint, page, target, result)
+
+
+# ---------------------------
+# DRIVER
+# ---------------------------
+IDLE_POLL_S = 0.05
+
+
+async def _run_all(
+    tasks: List[Tuple[int, str, int, str, Path]],
+    max_inflight: int,
+    desc: str,
+    checkpoint: Optional[CheckpointManifest],
+    reorder_budget: Optional[ReorderBudget],
+    sink_factory,
+    compression: Optional[Compression],
+    digest_factory,
+    record_index: Optional[RecordIndex],
+) -> List[Tuple[str, int, int, bool, str]]:
+    scheduler, jobs = build_scheduler(
+        tasks, checkpoint, reorder_budget, sink_factory, compression, digest_factory, record_index
+    )
+    results: List[Tuple[str, int, int, bool, str]] = []
+
+    async with make_async_session(max_inflight) as session:
+        with tqdm(total=len(jobs), desc=desc, unit="job") as bar:
+
+            async def consumer() -> None:
+                while True:
+                    page, finished = scheduler.get_nowait()
+                    if page is None:
+                        if finished:
+                            return
+                        # only continuation pages can still appear; wait for them
+                        await asyncio.sleep(IDLE_POLL_S)
+                        continue
+
+                    job = page.job
+                    if job.failed:
+                        result = (True, "skipped_company_failed", 0, 0)
+                    else:
+                        try:
+                            # stats the page's part file: off the event loop
+                            result = await asyncio.to_thread(resumed_page_result, checkpoint, page)
+                            if result is None:
+                                result = await fetch_page_for_job_async(session, checkpoint, page)
+                        except Exception as e:
+                            # fail the page, not this consumer (gather would cancel the others)
+                            result = page_error_result(page, e)
+                        logging.debug(
+                            "PAGE RESULT year=%s company_id=%s page=%s offset=%s ok=%s msg=%s data_lines=%s",
+                            job.year, job.company_id, page.page_index, page.offset, result[0], result[1], result[3]
+                        )
+
+                    if job.page_digest is not None:
+                        # may digest pages that landed ahead of this one from their part files
+                        await asyncio.to_thread(land_page_digest, page, result)
+                    if scheduler.page_done(page, result):
+                        # merge is pure disk I/O; keep it off the event loop
+                        results.append(await asyncio.to_thread(complete_company, checkpoint, job))
+                        bar.update(1)
+
+            await asyncio.gather(*(consumer() for _ in range(max_inflight)))
+
+    return results
+
+
+def run_async_downloads(
+    tasks: List[Tuple[int, str, int, str, Path]],
+    max_inflight: int,
+    desc: str,
+    checkpoint: Optional[CheckpointManifest] = None,
+    reorder_budget: Optional[ReorderBudget] = None,
+    sink_factory=None,
+    compression: Optional[Compression] = None,
+    digest_factory=None,
+    record_index: Optional[RecordIndex] = None,
+) -> List[Tuple[str, int, int, bool, str]]:
+    """
+    tasks: (year, company_id, expected_total, url, year_dir)
+    Returns report rows: (company_id, year, expected_total, ok, message)
+    """
+    logging.info("asyncio backend | requests_in_flight<=%s", max_inflight)
+    return asyncio.run(_run_all(
+        tasks, max_inflight, desc, checkpoint, reorder_budget, sink_factory, compression, digest_factory, record_index
+    ))
@@ -0,0 +1,1478 @@
+#!/usr/bin/env python3
+"""
+openpayments_general_payments_download.py
+
+Downloads Open Payments "General Payments" rows by company_id for one or more
+program years in a single process, based on totals file
+openpayments_companies_totals_by_year.json.
+
+Each program year is its own CMS dataset; the year -> dataset id mapping lives
+in DATASETS below and can be extended per run with --dataset YEAR=ID.
+
+Rules:
+- Uses the per-year dataset ID (NO Program_Year filter)
+- --years selects which registry years to pull (default: all of DATASETS)
+- Skip total_YYYY == 0
+- Every (company_id, offset) page is one unit on a single global priority
+  queue (largest companies first) drained by --workers threads or, with
+  --backend asyncio, by --max-inflight coroutines
+- ceil(total_YYYY / 5000) pages are queued per company; a full last page
+  queues the next offset too (stale totals)
+- Pages land in <year>/_parts/<company_id>/part_NNNNNN.csv, then merge;
+  with --direct-write they are appended in order straight into the final
+  file through a bounded reorder buffer (openpayments_ordered_writer.py)
+- --sink s3 --s3-bucket B streams each company's pages, in offset order,
+  straight into a multipart upload at s3://B/raw/year=YYYY/csv_<id>.csv
+  (implies --direct-write; see openpayments_sinks.py). The local sink is
+  the default.
+- --compress gzip|zstd writes csv_<id>.csv.gz / .csv.zst: every page is
+  compressed while it streams (openpayments_compression.py), locally and on S3
+- A running SHA-256 (plus CRC32C with --crc32c) of every company file is
+  computed while its pages are written and stored in its manifest record
+  (openpayments_digest.py); --no-checksum turns it off
+- --record-index collects every page's Record_IDs while it streams and
+  indexes each finished company under <out_root>/_record_index/YYYY/
+  (duplicates within the company, missing IDs, gap to the expected total),
+  then reconciles each year across companies into
+  record_index_report_YYYY.csv (see openpayments_record_index.py)
+- Every landed page and finished company is appended to
+  <out_root>/download_manifest.jsonl; --resume skips finished companies and
+  pages whose files are still intact (see openpayments_checkpoint.py)
+- --incremental diffs the totals JSON against the totals/rows recorded for
+  each company's last finalized download and only queues changed, new,
+  short or previously failed companies
+- Save to folder: <out_root>/YYYY/
+- Optional slicing: --slice "0:10" or --slice "90:-1" (applied per year)
+- All years share one HTTP session (connection pool) and one company-level
+  worker pool, so a multi-year pull does not run competing processes against
+  the CMS rate limit.
+- Every request acquires from the process-wide AIMD limiter in
+  openpayments_rate_limit.py (--rate/--min-rate/--max-rate); 403/429 slows and
+  pauses all workers, sustained 200s speed them back up ("RATE" log lines).
+
+Strict "no results" rule:
+- Header-only => FAIL
+
+Logging:
+- FILE ONLY (no console output)
+- One log file per run:
+    <out_root>/logs/openpayments_download_<years>_<timestamp>.log
+
+Reports:
+- One report per year: <out_root>/download_report_YYYY.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import functools
+import heapq
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from urllib3.util.retry import Retry
+
+from openpayments_checkpoint import MANIFEST_NAME, CheckpointManifest
+from openpayments_compression import CODECS, Compression
+from openpayments_digest import OrderedPageDigest, RunningDigest
+from openpayments_ordered_writer import DEFAULT_REORDER_PAGES, OrderedCompanyWriter, ReorderBudget, append_file
+from openpayments_page_writer import STREAM_CHUNK_BYTES, PageStreamWriter
+from openpayments_rate_limit import add_rate_limit_args, configure_from_args, get_rate_limiter
+from openpayments_record_index import INDEX_DIR_NAME, RecordIdCollector, RecordIndex
+from openpayments_schema import LATEST_SCHEMA, Schema, schema_for_year
+from openpayments_sinks import DEFAULT_S3_PART_MB, DEFAULT_S3_PREFIX, LocalSinkFactory, S3SinkFactory
+
+
+# ====================== DATASET REGISTRY ======================
+# program year -> CMS "General Payments" dataset id
+DATASETS: Dict[int, str] = {
+    2023: "74707c0a-5cf5-5b1a-a8b8-53588d660e9a",
+    2024: "4c41c25d-66b8-5fc4-9d98-8d0050d5b4bb",
+}
+DATASET_URL_TEMPLATE = "https://openpaymentsdata.cms.gov/api/1/datastore/query/{dataset_id}/download"
+# ==============================================================
+
+
+# ====================== CONFIG ======================
+PAGE_LIMIT = 5000
+
+CONNECT_TIMEOUT = 60
+READ_TIMEOUT = 180
+
+# urllib3 Retry (does NOT include 403/429)
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.8
+
+# Manual retry for 403/429 (WAF/throttle) + request exceptions
+MANUAL_ATTEMPTS = 5
+MANUAL_BACKOFF_BASE = 2.0  # seconds (grows)
+
+MAX_VALIDATION_BYTES = 512 * 1024
+
+DEFAULT_HEADERS = {
+    "Referer": "https://openpaymentsdata.cms.gov/",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/143.0.0.0 Safari/537.36",
+    "Accept": "text/csv,application/csv,application/octet-stream;q=0.9,*/*;q=0.8",
+}
+# ====================================================
+
+
+# ---------------------------
+# LOGGING (FILE ONLY)
+# ---------------------------
+def setup_logging(out_root: Path, verbose: bool, years: Sequence[int]) -> Path:
+    logs_dir = out_root / "logs"
+    logs_dir.mkdir(parents=True, exist_ok=True)
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    years_tag = "_".join(str(y) for y in years)
+    log_path = logs_dir / f"openpayments_download_{years_tag}_{ts}.log"
+
+    level = logging.DEBUG if verbose else logging.INFO
+    logger = logging.getLogger()
+    logger.setLevel(level)
+    logger.handlers.clear()
+    logger.propagate = False
+
+    fmt = logging.Formatter("%(asctime)s | %(levelname)s | %(threadName)s | %(message)s")
+
+    fh = logging.FileHandler(log_path, mode="w", encoding="utf-8")
+    fh.setLevel(level)
+    fh.setFormatter(fmt)
+    logger.addHandler(fh)
+
+    logger.info("Logging to: %s", log_path.resolve())
+    return log_path
+
+
+# ---------------------------
+# UTILS
+# ---------------------------
+def ensure_dir(p: Path) -> None:
+    p.mkdir(parents=True, exist_ok=True)
+
+
+def dataset_url(dataset_id: str) -> str:
+    return DATASET_URL_TEMPLATE.format(dataset_id=dataset_id)
+
+
+def parse_dataset_overrides(items: Optional[List[str]]) -> Dict[int, str]:
+    """
+    ["2025=abcd-..."] -> {2025: "abcd-..."}
+    """
+    out: Dict[int, str] = {}
+    for item in items or []:
+        if "=" not in item:
+            raise ValueError(f"Invalid --dataset '{item}'. Use YEAR=DATASET_ID")
+        year_s, dataset_id = item.split("=", 1)
+        try:
+            year = int(year_s.strip())
+        except ValueError:
+            raise ValueError(f"Invalid --dataset '{item}'. Year must be an integer")
+        dataset_id = dataset_id.strip()
+        if not dataset_id:
+            raise ValueError(f"Invalid --dataset '{item}'. Dataset id is empty")
+        out[year] = dataset_id
+    return out
+
+
+def make_session(pool_size: int) -> requests.Session:
+    sess = requests.Session()
+
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    sess.headers.update(DEFAULT_HEADERS)
+    return sess
+
+
+def parse_slice(slice_str: Optional[str]) -> Optional[slice]:
+    """
+    "0:10"   -> slice(0, 10)
+    "90:-1"  -> slice(90, None)   # -1 means "to end"
+    ":50"    -> slice(None, 50)
+    "10:"    -> slice(10, None)
+    "10"     -> slice(0,10)
+    """
+    if not slice_str:
+        return None
+
+    s = slice_str.strip()
+    if ":" not in s:
+        try:
+            n = int(s)
+            return slice(0, n)
+        except Exception:
+            raise ValueError(f"Invalid --slice '{slice_str}'. Use formats like 0:10, 90:-1, :50, 10:")
+
+    left, right = s.split(":", 1)
+    left = left.strip()
+    right = right.strip()
+
+    start = int(left) if left != "" else None
+    if right == "":
+        end = None
+    else:
+        end_int = int(right)
+        end = None if end_int == -1 else end_int
+
+    return slice(start, end)
+
+
+def validate_header_file(
+    path: Path,
+    schema: Schema = LATEST_SCHEMA,
+    compression: Optional[Compression] = None,
+) -> Tuple[bool, str]:
+    try:
+        with path.open("rb") as fh:
+            sample = fh.read(MAX_VALIDATION_BYTES)
+    except Exception as e:
+        return (False, f"validation_error:{e}")
+    return validate_header_sample(sample, schema, compression)
+
+
+def validate_header_sample(
+    sample: bytes,
+    schema: Schema = LATEST_SCHEMA,
+    compression: Optional[Compression] = None,
+) -> Tuple[bool, str]:
+    """
+    Header check on the first bytes of a CSV (file head, or what a sink kept in memory)
+    against the program year's registered schema: enough columns, and every
+    non-nullable column present (names matched case-insensitively).
+    """
+    try:
+        if compression is not None:
+            sample = compression.decompress_head(sample, MAX_VALIDATION_BYTES)
+        header_line = None
+        for enc in ("utf-8-sig", "utf-8", "cp1252"):
+            try:
+                text = sample.decode(enc, errors="replace")
+                for line in text.splitlines():
+                    if line.strip():
+                        header_line = line
+                        break
+                if header_line:
+                    break
+            except Exception:
+                continue
+
+        if not header_line:
+            return (False, "empty_or_binary_file")
+
+        cols = next(csv.reader([header_line]))
+        if len(cols) < schema.min_header_columns:
+            return (False, f"too_few_columns({len(cols)}<{schema.min_header_columns})")
+        missing_required = [c for c in schema.map_header(cols, case_sensitive=False).missing if c in schema.required]
+        if missing_required:
+            return (False, f"missing_required_columns({';'.join(missing_required)})")
+        return (True, "")
+    except Exception as e:
+        return (False, f"validation_error:{e}")
+
+
+def build_params(company_id: str, offset: int) -> dict:
+    # matches your working sample: NO year condition (dataset itself is per-year)
+    return {
+        "conditions[0][property]": "applicable_manufacturer_or_applicable_gpo_making_payment_id",
+        "conditions[0][operator]": "=",
+        "conditions[0][value]": company_id,
+        "format": "csv",
+        "limit": PAGE_LIMIT,
+        "offset": offset,
+    }
+
+
+def request_with_manual_backoff(
+    session: requests.Session,
+    url: str,
+    params: dict,
+    timeout: Tuple[int, int],
+) -> requests.Response:
+    """
+    Manual retry loop for WAF/throttle (403/429) + transient exceptions.
+    Every attempt goes through the process-wide rate limiter; a 403/429 slows
+    and pauses ALL workers (not just this thread) for the backoff period.
+    """
+    last_exc: Optional[Exception] = None
+    limiter = get_rate_limiter()
+
+    for attempt in range(1, MANUAL_ATTEMPTS + 1):
+        limiter.acquire()
+        try:
+            resp = session.get(url, params=params, stream=True, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            last_exc = e
+            sleep_s = MANUAL_BACKOFF_BASE * (attempt ** 1.3)
+            logging.warning("REQUEST EXCEPTION attempt=%s/%s err=%s sleep=%.2fs", attempt, MANUAL_ATTEMPTS, e, sleep_s)
+            time.sleep(sleep_s)
+            continue
+
+        if resp.status_code in (403, 429):
+            sleep_s = MANUAL_BACKOFF_BASE * (attempt ** 1.6)
+            logging.warning(
+                "HTTP %s attempt=%s/%s (WAF/throttle?) global_pause=%.2fs rate=%.2f params=%s",
+                resp.status_code, attempt, MANUAL_ATTEMPTS, sleep_s, limiter.rate, params
+            )
+            resp.close()
+            limiter.on_throttle(resp.status_code, penalty_s=sleep_s)
+            continue
+
+        limiter.record(resp.status_code)
+        return resp
+
+    if last_exc:
+        raise last_exc
+    raise RuntimeError("request_with_manual_backoff exhausted without response")
+
+
+# ---------------------------
+# PAGE DOWNLOAD
+# ---------------------------
+def fetch_page(
+    session: requests.Session,
+    url: str,
+    company_id: str,
+    offset: int,
+    fh: BinaryIO,
+    is_first_page: bool,
+    compression: Compression = Compression(),
+    record_ids: Optional[RecordIdCollector] = None,
+    tap: Optional[Callable[[bytes], None]] = None,
+) -> Tuple[bool, str, int, int]:
+    """
+    Stream one page into the open binary handle fh (part file or reorder buffer),
+    as one compressed member with --compress; record_ids collects its Record_IDs,
+    tap sees the bytes written (OrderedPageDigest).
+    Returns: (ok, msg, header_lines_written, data_lines_written)
+    Header-only => empty_page_no_data_rows
+    """
+    params = build_params(company_id, offset)
+    logging.debug("REQUEST url=%s company_id=%s offset=%s params=%s", url, company_id, offset, params)
+
+    try:
+        resp = request_with_manual_backoff(
+            session=session,
+            url=url,
+            params=params,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        )
+    except Exception as e:
+        return (False, f"request_error:{e}", 0, 0)
+
+    if resp.status_code != 200:
+        return (False, f"HTTP {resp.status_code} at offset {offset}", 0, 0)
+
+    try:
+        # raw bytes straight to fh: no per-line decode/re-encode
+        writer = PageStreamWriter(
+            fh, write_header=is_first_page, compressor=compression.compressor(), record_ids=record_ids, tap=tap
+        )
+        for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+            writer.feed(chunk)
+        header_lines, data_lines = writer.close()
+    except Exception as e:
+        return (False, f"write_error:{e}", 0, 0)
+
+    if writer.truncated_bytes:
+        logging.warning(
+            "PARTIAL RECORD dropped company_id=%s offset=%s bytes=%s (body ended inside a quoted field)",
+            company_id, offset, writer.truncated_bytes
+        )
+
+    if data_lines == 0:
+        return (True, "empty_page_no_data_rows", header_lines, data_lines)
+    return (True, "ok", header_lines, data_lines)
+
+
+def fetch_page_to_partfile(
+    session: requests.Session,
+    url: str,
+    company_id: str,
+    offset: int,
+    part_path: Path,
+    is_first_page: bool,
+    compression: Compression = Compression(),
+    record_ids: Optional[RecordIdCollector] = None,
+    tap: Optional[Callable[[bytes], None]] = None,
+) -> Tuple[bool, str, int, int]:
+    """
+    fetch_page into part_path; the part file is removed again for failed or empty pages.
+    """
+    try:
+        with part_path.open("wb") as fh:
+            result = fetch_page(session, url, company_id, offset, fh, is_first_page, compression, record_ids, tap)
+    except Exception as e:
+        result = (False, f"write_error:{e}", 0, 0)
+
+    if not result[0] or result[3] == 0:
+        try:
+            part_path.unlink()
+        except Exception:
+            pass
+    return result
+
+
+# ---------------------------
+# MERGE
+# ---------------------------
+def merge_parts(
+    parts: List[Path],
+    final_path: Path,
+    data_rows: int,
+    compression: Optional[Compression] = None,
+    schema: Schema = LATEST_SCHEMA,
+) -> Tuple[bool, str]:
+    """
+    Concatenate page parts (in order) into final_path with constant memory.
+
+    data_rows is the record count already known from the page writers, and the
+    header check reads only the head of the first part, so the merged file is
+    never re-read. A single part is simply renamed. With --compress each part
+    is a complete gzip member / zstd frame, so the byte concatenation is one
+    valid multi-member stream. The company digest is already fed while the
+    pages land (OrderedPageDigest), so parts are only ever copied kernel-side.
+    """
+    tmp_path = final_path.with_suffix(final_path.suffix + ".part")
+    try:
+        parts = [p for p in parts if p.exists() and p.stat().st_size > 0]
+        if not parts:
+            return (False, "merged_empty")
+
+        if data_rows <= 0:
+            return (False, "no_results_header_only_after_merge")
+
+        ok, reason = validate_header_file(parts[0], schema, compression)
+        if not ok:
+            return (False, f"validation_failed:{reason}")
+
+        ensure_dir(final_path.parent)
+        if len(parts) == 1:
+            os.replace(parts[0], final_path)
+            return (True, "merged_ok")
+
+        expected_bytes = sum(p.stat().st_size for p in parts)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            written = 0
+            for p in parts:
+                written += append_file(p, fd)
+        finally:
+            os.close(fd)
+
+        if written != expected_bytes:
+            tmp_path.unlink()
+            return (False, f"merge_short_write({written}!={expected_bytes})")
+
+        os.replace(tmp_path, final_path)
+        return (True, "merged_ok")
+
+    except Exception as e:
+        try:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        except Exception:
+            pass
+        return (False, f"merge_error:{e}")
+
+
+# ---------------------------
+# GLOBAL PAGE QUEUE
+# ---------------------------
+@dataclass
+class CompanyJob:
+    """
+    One (year, company_id) download. Its pages are scheduled individually on the
+    global PageScheduler; the worker that finishes the last page finalizes it.
+    """
+    year: int
+    company_id: str
+    expected_total: int
+    url: str
+    year_dir: Path
+    known_pages: int = 0
+    scheduled_pages: int = 0
+    # page_index -> (ok, msg, header_lines, data_lines)
+    page_results: Dict[int, Tuple[bool, str, int, int]] = field(default_factory=dict)
+    outstanding: int = 0
+    failed: bool = False
+    # --direct-write: pages are appended in order to writer.sink instead of parts + merge
+    writer: Optional[OrderedCompanyWriter] = None
+    compression: Compression = field(default_factory=Compression)
+    # running checksum of the final file, fed in file order by the sink or page_digest
+    digest: Optional[RunningDigest] = None
+    # part files: feeds digest with the pages in order as they land
+    page_digest: Optional[OrderedPageDigest] = None
+    # --record-index: per-page Record_ID keys, indexed when the company completes
+    record_index: Optional[RecordIndex] = None
+
+    @property
+    def schema(self) -> Schema:
+        return schema_for_year(self.year)
+
+    @property
+    def location(self) -> str:
+        """
+        Where the finished CSV ends up (local path or s3:// URI).
+        """
+        return self.writer.sink.location if self.writer is not None else str(self.final_path)
+
+    @property
+    def final_path(self) -> Path:
+        return self.year_dir / f"csv_{self.company_id}.csv{self.compression.suffix}"
+
+    @property
+    def tmp_path(self) -> Path:
+        return self.year_dir / f"csv_{self.company_id}.csv{self.compression.suffix}.part"
+
+    @property
+    def parts_root(self) -> Path:
+        return self.year_dir / "_parts" / self.company_id
+
+    def part_path(self, page_index: int) -> Path:
+        return self.parts_root / f"part_{page_index:06d}.csv{self.compression.suffix}"
+
+
+@dataclass(order=True)
+class PageJob:
+    priority: Tuple[int, int, int]
+    job: CompanyJob = field(compare=False)
+    page_index: int = field(compare=False)
+
+    @property
+    def offset(self) -> int:
+        return self.page_index * PAGE_LIMIT
+
+
+class PageScheduler:
+    """
+    Thread-safe priority queue of (company, page) units shared by every worker.
+
+    - Pages of the largest companies (by expected_total) are served first, so the
+      longest company starts immediately instead of finishing last.
+    - Each company schedules ceil(expected_total / PAGE_LIMIT) pages up front (at
+      least 1). If its last page comes back full, the next offset is scheduled
+      too, so stale totals and small companies (previously paged sequentially
+      until an empty page) are handled by the same queue.
+    - Pages of a company that already failed are skipped.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[PageJob] = []
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._open_companies = 0
+
+    def add_company(self, job: CompanyJob) -> None:
+        job.known_pages = max(1, int(math.ceil(job.expected_total / PAGE_LIMIT)))
+        with self._cond:
+            self._seq += 1
+            job_seq = self._seq
+            self._open_companies += 1
+            job.outstanding = job.known_pages
+            job.scheduled_pages = job.known_pages
+            for i in range(job.known_pages):
+                heapq.heappush(self._heap, PageJob((-job.expected_total, job_seq, i), job, i))
+            self._cond.notify_all()
+
+    def pending_pages(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def get_nowait(self) -> Tuple[Optional[PageJob], bool]:
+        """
+        Returns (page, finished). page is None when nothing is queued right now;
+        finished is True once every company has been completed.
+        """
+        with self._cond:
+            if self._heap:
+                return (heapq.heappop(self._heap), False)
+            return (None, self._open_companies == 0)
+
+    def get(self) -> Optional[PageJob]:
+        """
+        Blocking variant for worker threads. None => all companies completed.
+        """
+        with self._cond:
+            while not self._heap:
+                if self._open_companies == 0:
+                    return None
+                self._cond.wait()
+            return heapq.heappop(self._heap)
+
+    def page_done(
+        self,
+        page: PageJob,
+        result: Tuple[bool, str, int, int],
+    ) -> bool:
+        """
+        Record a page result. Returns True if this completed the company
+        (the caller must then finalize it).
+        """
+        job = page.job
+        ok, _msg, _header_lines, data_lines = result
+        with self._cond:
+            job.page_results[page.page_index] = result
+            job.outstanding -= 1
+            if not ok:
+                job.failed = True
+
+            is_last = page.page_index == job.scheduled_pages - 1
+            if ok and not job.failed and is_last and data_lines >= PAGE_LIMIT:
+                # full last page => there may be more rows than the totals say
+                nxt = page.page_index + 1
+                job.outstanding += 1
+                job.scheduled_pages += 1
+                heapq.heappush(self._heap, PageJob((page.priority[0], page.priority[1], nxt), job, nxt))
+                self._cond.notify()
+                return False
+
+            if job.outstanding > 0:
+                return False
+
+            self._open_companies -= 1
+            self._cond.notify_all()
+            return True
+
+
+def finalize_direct_company(job: CompanyJob) -> Tuple[str, int, bool, str]:
+    """
+    --direct-write: every page is already in the company's sink in order;
+    validate the header and publish it (rename, or complete the S3 multipart
+    upload). Returns (company_id, year, ok, message).
+    """
+    company_id, year = job.company_id, job.year
+    writer = job.writer
+    pages = len(job.page_results)
+
+    def remove_parts_root() -> None:
+        try:
+            if job.parts_root.exists() and not any(job.parts_root.iterdir()):
+                job.parts_root.rmdir()
+        except Exception:
+            pass
+
+    hard_fails = [(i, r[1]) for i, r in sorted(job.page_results.items()) if not r[0]]
+    if hard_fails:
+        # local sink: the committed prefix stays on disk (and in the checkpoint) for --resume
+        writer.abort()
+        logging.error("FAILED year=%s company_id=%s hard_fails=%s", year, company_id, hard_fails[:3])
+        return (company_id, year, False, f"page_download_failed:{hard_fails[:3]}")
+
+    total_data_rows = sum(r[3] for r in job.page_results.values())
+    if total_data_rows == 0:
+        writer.abort(discard=True)
+        remove_parts_root()
+        logging.warning("NO RESULTS (header-only) year=%s company_id=%s", year, company_id)
+        return (company_id, year, False, "no_results_header_only")
+
+    ok, msg = writer.finish()
+    remove_parts_root()
+    if not ok:
+        writer.abort()
+        logging.error("DIRECT WRITE FAILED year=%s company_id=%s msg=%s", year, company_id, msg)
+        return (company_id, year, False, msg)
+
+    ok, reason = validate_header_sample(writer.sink.header_sample(), job.schema, job.compression)
+    if not ok:
+        writer.abort(discard=True)
+        return (company_id, year, False, f"validation_failed:{reason}")
+
+    try:
+        location = writer.sink.publish()
+    except Exception as e:
+        writer.abort()
+        logging.error("PUBLISH FAILED year=%s company_id=%s sink=%s err=%s", year, company_id, writer.sink.location, e)
+        return (company_id, year, False, f"publish_failed:{e}")
+    logging.info(
+        "DONE (direct) year=%s company_id=%s pages=%s rows~%s -> %s",
+        year, company_id, pages, total_data_rows, location
+    )
+    return (company_id, year, True, f"downloaded_ok_pages={pages}_rows~{total_data_rows}")
+
+
+def finalize_company(job: CompanyJob) -> Tuple[str, int, bool, str]:
+    """
+    Merge a completed company's parts into csv_<company_id>.csv and clean up.
+    Returns (company_id, year, ok, message).
+    """
+    if job.writer is not None:
+        return finalize_direct_company(job)
+
+    company_id, year = job.company_id, job.year
+    pages = len(job.page_results)
+    part_paths = [job.part_path(i) for i in sorted(job.page_results)]
+
+    def cleanup_parts() -> None:
+        # best-effort
+        try:
+            for p in part_paths:
+                if p.exists():
+                    p.unlink()
+            if job.parts_root.exists() and not any(job.parts_root.iterdir()):
+                job.parts_root.rmdir()
+        except Exception:
+            pass
+
+    hard_fails = [(i, r[1]) for i, r in sorted(job.page_results.items()) if not r[0]]
+    if hard_fails:
+        # good parts are kept (and checkpointed) so --resume only refetches the failed pages
+        logging.error("FAILED year=%s company_id=%s hard_fails=%s", year, company_id, hard_fails[:3])
+        return (company_id, year, False, f"page_download_failed:{hard_fails[:3]}")
+
+    total_data_rows = sum(r[3] for r in job.page_results.values())
+    if total_data_rows == 0:
+        logging.warning("NO RESULTS (header-only) year=%s company_id=%s", year, company_id)
+        cleanup_parts()
+        return (company_id, year, False, "no_results_header_only")
+
+    ok, msg = merge_parts(part_paths, job.final_path, total_data_rows, job.compression, job.schema)
+    cleanup_parts()
+    if not ok:
+        logging.error("MERGE FAILED year=%s company_id=%s msg=%s", year, company_id, msg)
+        return (company_id, year, False, msg)
+
+    logging.info("DONE year=%s company_id=%s pages=%s rows~%s -> %s", year, company_id, pages, total_data_rows, job.final_path)
+    return (company_id, year, True, f"downloaded_ok_pages={pages}_rows~{total_data_rows}")
+
+
+def resumed_page_result(
+    checkpoint: Optional[CheckpointManifest],
+    page: PageJob,
+) -> Optional[Tuple[bool, str, int, int]]:
+    """
+    Page result from the checkpoint manifest if the page already landed intact.
+    """
+    job = page.job
+    if job.writer is not None:
+        # --direct-write: pages in the committed prefix of csv_<id>.csv.part (local sink only)
+        rec = job.writer.resumed.get(page.page_index)
+        if rec is None:
+            return None
+        return (True, "resumed" if rec[1] else "resumed_empty_page", rec[0], rec[1])
+
+    if checkpoint is None:
+        return None
+    rec = checkpoint.completed_page(job.year, job.company_id, page.page_index, job.part_path(page.page_index))
+    if rec is None:
+        return None
+    header_lines, data_rows, _nbytes = rec
+    return (True, "resumed" if data_rows else "resumed_empty_page", header_lines, data_rows)
+
+
+def page_record_ids(job: CompanyJob) -> Optional[RecordIdCollector]:
+    return job.record_index.collector(job.schema) if job.record_index is not None else None
+
+
+def save_page_record_ids(
+    page: PageJob,
+    result: Tuple[bool, str, int, int],
+    record_ids: Optional[RecordIdCollector],
+) -> None:
+    """
+    --record-index: store a landed page's sorted keys. A failure only leaves the
+    company to be indexed from its finished file (local sink) instead.
+    """
+    job = page.job
+    if record_ids is None or not result[0] or not result[3]:
+        return
+    try:
+        job.record_index.save_page(job.year, job.company_id, page.page_index, record_ids)
+    except Exception as e:
+        logging.warning(
+            "RECORD INDEX page keys not saved year=%s company_id=%s page=%s err=%s",
+            job.year, job.company_id, page.page_index, e
+        )
+
+
+def index_company_record_ids(job: CompanyJob, nbytes: int) -> None:
+    """
+    --record-index: index a finalized company from its page keys, or from the
+    finished local file when some page keys are missing (resumed pages landed
+    without --record-index). Duplicates and gaps are logged, never fatal.
+    """
+    year, company_id = job.year, job.company_id
+    page_rows = {i: r[3] for i, r in job.page_results.items()}
+    local = not job.location.startswith("s3://")
+    try:
+        stats = job.record_index.build_company(
+            year, company_id, page_rows, job.expected_total, job.location, nbytes
+        )
+        if stats is None and local:
+            stats = job.record_index.build_company_from_file(
+                year, company_id, Path(job.location), job.expected_total, job.schema
+            )
+    except Exception as e:
+        logging.exception("RECORD INDEX FAILED year=%s company_id=%s err=%s", year, company_id, e)
+        return
+    if stats is None:
+        logging.warning("RECORD INDEX incomplete year=%s company_id=%s (page keys missing)", year, company_id)
+        return
+    log = logging.warning if stats["duplicate_rows"] or stats["missing_ids"] or stats["gap"] else logging.info
+    log(
+        "RECORD_IDS year=%s company_id=%s rows=%s unique=%s duplicates=%s missing_ids=%s gap=%s",
+        year, company_id, stats["rows"], stats["unique_ids"], stats["duplicate_rows"], stats["missing_ids"],
+        stats["gap"]
+    )
+
+
+def land_page_digest(page: PageJob, result: Tuple[bool, str, int, int]) -> None:
+    """
+    Part files: hand a finished (downloaded, resumed or skipped) page to the
+    company's OrderedPageDigest. Must run before scheduler.page_done. A read
+    error stops the digest short, so the company's checksum is not stored.
+    """
+    job = page.job
+    if job.page_digest is None:
+        return
+    kept = result[0] and result[3] > 0  # failed and empty pages leave no part file
+    try:
+        job.page_digest.page_landed(page.page_index, job.part_path(page.page_index) if kept else None)
+    except Exception as e:
+        logging.warning(
+            "CHECKSUM page not digested year=%s company_id=%s page=%s err=%s",
+            job.year, job.company_id, page.page_index, e
+        )
+
+
+def page_error_result(page: PageJob, e: Exception) -> Tuple[bool, str, int, int]:
+    """
+    Result of a page whose resume check, download or checkpoint raised: the page
+    (and so its company) fails, while the worker goes on and the run finishes.
+    """
+    job = page.job
+    logging.exception("FAIL (exception) year=%s company_id=%s page=%s", job.year, job.company_id, page.page_index)
+    return (False, f"executor_error:{e}", 0, 0)
+
+
+def checkpoint_page(
+    checkpoint: Optional[CheckpointManifest],
+    page: PageJob,
+    result: Tuple[bool, str, int, int],
+) -> None:
+    ok, _msg, header_lines, data_rows = result
+    if checkpoint is None or not ok:
+        return
+    job = page.job
+    part_path = job.part_path(page.page_index)
+    nbytes = part_path.stat().st_size if data_rows and part_path.exists() else 0
+    checkpoint.record_page(job.year, job.company_id, page.page_index, page.offset, header_lines, data_rows, nbytes)
+
+
+def commit_direct_page(
+    checkpoint: Optional[CheckpointManifest],
+    page: PageJob,
+    target,
+    result: Tuple[bool, str, int, int],
+) -> Tuple[bool, str, int, int]:
+    """
+    --direct-write: hand a downloaded page to its company's ordered writer and
+    checkpoint every page that this commit wrote to the sink. A sink write
+    error (disk full, S3 UploadPart failure) fails the page, and so the company.
+    """
+    job = page.job
+    ok, _msg, header_lines, data_rows = result
+    if not ok:
+        job.writer.discard_page(target)
+        return result
+    try:
+        committed = job.writer.commit(page.page_index, target, header_lines, data_rows)
+    except Exception as e:
+        logging.exception("SINK WRITE FAILED year=%s company_id=%s page=%s", job.year, job.company_id, page.page_index)
+        return (False, f"sink_write_failed:{e}", header_lines, data_rows)
+    for i, h, d, nbytes in committed:
+        if checkpoint is not None:
+            checkpoint.record_page(job.year, job.company_id, i, i * PAGE_LIMIT, h, d, nbytes)
+    return result
+
+
+def fetch_page_for_job(
+    session: requests.Session,
+    checkpoint: Optional[CheckpointManifest],
+    page: PageJob,
+) -> Tuple[bool, str, int, int]:
+    """
+    Threaded backend: download one scheduled page into its part file, or into the
+    company's ordered writer with --direct-write, and checkpoint it.
+    """
+    job = page.job
+    is_first_page = page.page_index == 0
+    record_ids = page_record_ids(job)
+    if job.writer is None:
+        tap = job.page_digest.open_page(page.page_index) if job.page_digest is not None else None
+        result = fetch_page_to_partfile(
+            session, job.url, job.company_id, page.offset, job.part_path(page.page_index), is_first_page,
+            job.compression, record_ids, tap,
+        )
+        save_page_record_ids(page, result, record_ids)
+        checkpoint_page(checkpoint, page, result)
+        return result
+
+    target, fh = job.writer.open_page(job.part_path(page.page_index))
+    try:
+        result = fetch_page(
+            session, job.url, job.company_id, page.offset, fh, is_first_page, job.compression, record_ids
+        )
+    except Exception:
+        job.writer.discard_page(target)  # give back its reorder budget slot
+        raise
+    finally:
+        if fh is not target:
+            fh.close()  # spilled to a part file
+    save_page_record_ids(page, result, record_ids)
+    return commit_direct_page(checkpoint, page, target, result)
+
+
+def complete_company(
+    checkpoint: Optional[CheckpointManifest],
+    job: CompanyJob,
+) -> Tuple[str, int, int, bool, str]:
+    """
+    finalize_company + logging + Record_ID index + checkpoint. Returns the report row.
+    """
+    try:
+        row = log_company_result(job, finalize_company(job))
+    except Exception as e:
+        logging.exception("FAIL (exception) year=%s company_id=%s", job.year, job.company_id)
+        row = (job.company_id, job.year, job.expected_total, False, f"executor_error:{e}")
+
+    ok, msg = row[3], row[4]
+    if job.writer is not None:
+        nbytes = job.writer.committed_bytes if ok else 0
+    else:
+        nbytes = job.final_path.stat().st_size if ok and job.final_path.exists() else 0
+    if ok and job.record_index is not None:
+        index_company_record_ids(job, nbytes)
+
+    if checkpoint is not None:
+        rows = sum(r[3] for r in job.page_results.values())
+        checksums = None
+        if ok and job.digest is not None:
+            if job.page_digest is None or job.page_digest.pages == len(job.page_results):
+                checksums = job.digest.to_record()
+            else:
+                logging.warning("CHECKSUM incomplete year=%s company_id=%s (not stored)", job.year, job.company_id)
+        try:
+            checkpoint.record_company(
+                job.year, job.company_id, job.expected_total, ok, msg, rows, nbytes, job.location if ok else None,
+                checksums=checksums,
+            )
+        except Exception as e:
+            # the company is only downloaded again by the next --resume / --incremental run
+            logging.error("CHECKPOINT FAILED year=%s company_id=%s err=%s", job.year, job.company_id, e)
+    return row
+
+
+def build_scheduler(
+    tasks: List[Tuple[int, str, int, str, Path]],
+    checkpoint: Optional[CheckpointManifest] = None,
+    reorder_budget: Optional[ReorderBudget] = None,
+    sink_factory=None,
+    compression: Optional[Compression] = None,
+    digest_factory: Optional[Callable[[], RunningDigest]] = None,
+    record_index: Optional[RecordIndex] = None,
+) -> Tuple[PageScheduler, List[CompanyJob]]:
+    """
+    tasks: (year, company_id, expected_total, url, year_dir)
+    reorder_budget: set => --direct-write (one OrderedCompanyWriter per company)
+    sink_factory: where direct-write companies go (default: LocalSinkFactory)
+    compression: --compress codec for every page (default: plain CSV)
+    digest_factory: new RunningDigest per company (None: no checksums)
+    record_index: --record-index (None: Record_IDs are not collected)
+    """
+    compression = compression or Compression()
+    sink_factory = sink_factory or LocalSinkFactory(suffix=compression.suffix)
+    scheduler = PageScheduler()
+    jobs: List[CompanyJob] = []
+    for year, company_id, expected_total, url, year_dir in tasks:
+        job = CompanyJob(
+            year=year,
+            company_id=company_id,
+            expected_total=expected_total,
+            url=url,
+            year_dir=year_dir,
+            compression=compression,
+            digest=digest_factory() if digest_factory is not None else None,
+            record_index=record_index,
+        )
+        if reorder_budget is not None:
+            resumed = {}
+            if checkpoint is not None and sink_factory.supports_page_resume:
+                resumed = checkpoint.committed_prefix(year, company_id, job.tmp_path)
+            sink = sink_factory.open(
+                year, company_id, year_dir, resume_bytes=sum(r[2] for r in resumed.values()), digest=job.digest
+            )
+            job.writer = OrderedCompanyWriter(sink, reorder_budget, resumed=resumed)
+            if resumed:
+                logging.info("RESUME direct year=%s company_id=%s committed_pages=%d", year, company_id, len(resumed))
+        elif job.digest is not None:
+            job.page_digest = OrderedPageDigest(job.digest)
+        ensure_dir(job.parts_root)
+        scheduler.add_company(job)
+        jobs.append(job)
+        logging.info(
+            "QUEUE year=%s company_id=%s expected_total=%s pages=%s",
+            year, company_id, expected_total, job.known_pages
+        )
+    logging.info("Global queue: companies=%d pages=%d", len(jobs), scheduler.pending_pages())
+    return scheduler, jobs
+
+
+def log_company_result(job: CompanyJob, result: Tuple[str, int, bool, str]) -> Tuple[str, int, int, bool, str]:
+    cid, y, ok, msg = result
+    if ok:
+        logging.info("SUCCESS year=%s company_id=%s total=%s msg=%s", y, cid, job.expected_total, msg)
+    else:
+        logging.warning("FAIL year=%s company_id=%s total=%s msg=%s", y, cid, job.expected_total, msg)
+    return (cid, y, job.expected_total, ok, msg)
+
+
+# ---------------------------
+# INPUT: totals json
+# ---------------------------
+def load_company_totals_json(path: Path) -> pd.DataFrame:
+    df = pd.read_json(path)
+    df["company_id"] = df["company_id"].astype(str)
+    return df
+
+
+def build_year_tasks(
+    df: pd.DataFrame,
+    year: int,
+    sl: Optional[slice],
+) -> List[Tuple[str, int]]:
+    total_col = f"total_{year}"
+    if total_col not in df.columns:
+        logging.error("Totals JSON missing required column: %s", total_col)
+        return []
+
+    temp = df[["company_id", total_col]].copy()
+    temp[total_col] = temp[total_col].fillna(0).astype(int)
+    temp = temp[temp[total_col] > 0]  # skip zeros
+    temp = temp.sort_values("company_id")
+
+    tasks: List[Tuple[str, int]] = [(row["company_id"], int(row[total_col])) for _, row in temp.iterrows()]
+
+    if not tasks:
+        logging.warning("No tasks found for year=%s (maybe %s is 0 for all rows).", year, total_col)
+        return []
+
+    if sl is not None:
+        tasks = tasks[sl]
+        logging.info("Applied slice=%s year=%s -> tasks=%d", sl, year, len(tasks))
+
+    return tasks
+
+
+def plan_incremental(
+    checkpoint: CheckpointManifest,
+    tasks: List[Tuple[int, str, int, str, Path]],
+) -> Tuple[List[Tuple[int, str, int, str, Path]], List[Tuple[str, int, int, bool, str]]]:
+    """
+    Keep only companies that need a download compared with the last finalized
+    run in the manifest:
+    - never downloaded
+    - last download failed
+    - total_YYYY changed since that download
+    - fewer rows landed than the total it was downloaded against
+    Returns (tasks_to_run, report_rows_for_skipped).
+    """
+    pending: List[Tuple[int, str, int, str, Path]] = []
+    skipped: List[Tuple[str, int, int, bool, str]] = []
+    reasons: Dict[str, int] = {}
+
+    for task in tasks:
+        year, company_id, expected_total = task[0], task[1], task[2]
+        rec = checkpoint.company_record(year, company_id)
+        if rec is None:
+            reason = "new"
+        elif not rec.get("ok"):
+            reason = "previous_failed"
+        elif int(rec.get("expected_total", -1)) != expected_total:
+            reason = f"total_changed:{rec.get('expected_total')}->{expected_total}"
+        elif int(rec.get("rows", 0)) < int(rec.get("expected_total", 0)):
+            reason = f"short_landing:{rec.get('rows')}<{rec.get('expected_total')}"
+        else:
+            skipped.append((company_id, year, expected_total, True, "skipped_incremental_unchanged"))
+            continue
+
+        reasons[reason.split(":", 1)[0]] = reasons.get(reason.split(":", 1)[0], 0) + 1
+        logging.info("INCREMENTAL enqueue year=%s company_id=%s reason=%s", year, company_id, reason)
+        pending.append(task)
+
+    logging.info("Incremental: %d unchanged skipped, %d to download %s", len(skipped), len(pending), reasons)
+    return pending, skipped
+
+
+def write_year_reports(out_root: Path, results: List[Tuple[str, int, int, bool, str]], years: Sequence[int]) -> None:
+    columns = ["company_id", "year", "expected_total", "ok", "message"]
+    for year in years:
+        year_rows = [r for r in results if r[1] == year]
+        report_path = out_root / f"download_report_{year}.csv"
+        rep_df = pd.DataFrame(year_rows, columns=columns)
+        rep_df.to_csv(report_path, index=False)
+        logging.info("Report saved (year=%s): %s", year, report_path.resolve())
+
+
+def run_threaded_downloads(
+    tasks: List[Tuple[int, str, int, str, Path]],
+    workers: int,
+    desc: str,
+    checkpoint: Optional[CheckpointManifest] = None,
+    reorder_budget: Optional[ReorderBudget] = None,
+    sink_factory=None,
+    compression: Optional[Compression] = None,
+    digest_factory: Optional[Callable[[], RunningDigest]] = None,
+    record_index: Optional[RecordIndex] = None,
+) -> List[Tuple[str, int, int, bool, str]]:
+    """
+    tasks: (year, company_id, expected_total, url, year_dir)
+    Returns report rows: (company_id, year, expected_total, ok, message)
+
+    One pool of page workers drains the global PageScheduler; there is no
+    per-company pool.
+    """
+    scheduler, jobs = build_scheduler(
+        tasks, checkpoint, reorder_budget, sink_factory, compression, digest_factory, record_index
+    )
+    session = make_session(pool_size=workers * 2)
+    completed: "queue.Queue[Tuple[str, int, int, bool, str]]" = queue.Queue()
+
+    def worker() -> None:
+        while True:
+            page = scheduler.get()
+            if page is None:
+                return
+            job = page.job
+            if job.failed:
+                result = (True, "skipped_company_failed", 0, 0)
+            else:
+                try:
+                    result = resumed_page_result(checkpoint, page)
+                    if result is None:
+                        result = fetch_page_for_job(session, checkpoint, page)
+                except Exception as e:
+                    result = page_error_result(page, e)
+                logging.debug(
+                    "PAGE RESULT year=%s company_id=%s page=%s offset=%s ok=%s msg=%s data_lines=%s",
+                    job.year, job.company_id, page.page_index, page.offset, result[0], result[1], result[3]
+                )
+            land_page_digest(page, result)
+            if scheduler.page_done(page, result):
+                completed.put(complete_company(checkpoint, job))
+
+    results: List[Tuple[str, int, int, bool, str]] = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="page") as ex:
+        futs = [ex.submit(worker) for _ in range(workers)]
+        for _ in tqdm(range(len(jobs)), total=len(jobs), desc=desc, unit="job"):
+            results.append(completed.get())
+        for fut in futs:
+            fut.result()
+
+    return results
+
+
+def reconcile_record_index(record_index: RecordIndex, years: Sequence[int]) -> None:
+    for year in years:
+        try:
+            rows = record_index.reconcile_year(year)
+        except Exception as e:
+            logging.exception("RECORD INDEX reconcile failed year=%s err=%s", year, e)
+            continue
+        logging.info(
+            "RECORD INDEX year=%s companies=%d duplicate_rows=%d cross_company_dropped=%d gap=%d report=%s",
+            year, len(rows),
+            sum(int(r["duplicate_rows"] or 0) for r in rows),
+            sum(int(r["cross_company_dropped"]) for r in rows),
+            sum(int(r["gap"] or 0) for r in rows),
+            record_index.report_path(year),
+        )
+
+
+def main(argv: Optional[List[str]] = None, default_years: Optional[List[int]] = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--totals-json", required=True, help="Path to openpayments_companies_totals_by_year.json")
+    parser.add_argument(
+        "--years",
+        nargs="+",
+        type=int,
+        default=default_years,
+        help="Program years to download (default: every year in the dataset registry)",
+    )
+    parser.add_argument(
+        "--dataset",
+        action="append",
+        default=None,
+        metavar="YEAR=DATASET_ID",
+        help="Add/override a registry entry, e.g. --dataset 2025=<uuid> (repeatable)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="threads backend: page workers draining the global queue (default: id-workers + page-workers)",
+    )
+    parser.add_argument("--id-workers", type=int, default=10, help="Legacy sizing knob, see --workers (default: 10)")
+    parser.add_argument("--page-workers", type=int, default=10, help="Legacy sizing knob, see --workers (default: 10)")
+    parser.add_argument(
+        "--backend",
+        choices=("threads", "asyncio"),
+        default="threads",
+        help="threads: --workers threads draining the global page queue (default). "
+             "asyncio: the same queue drained by coroutines on one event loop (needs aiohttp)",
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=100,
+        help="asyncio backend only: max HTTP requests in flight across all companies (default: 100)",
+    )
+    add_rate_limit_args(parser)
+    parser.add_argument("--out-root", default=".", help="Output root folder (default: current folder)")
+    parser.add_argument("--slice", default=None, help='Optional slicing like "0:10" or "90:-1". If omitted, runs all.')
+    parser.add_argument(
+        "--direct-write",
+        action="store_true",
+        help="Append pages in order straight into csv_<id>.csv (no part files + merge pass)",
+    )
+    parser.add_argument(
+        "--reorder-pages",
+        type=int,
+        default=DEFAULT_REORDER_PAGES,
+        help=f"--direct-write: out-of-order pages held in memory before spilling to disk "
+             f"(default: {DEFAULT_REORDER_PAGES})",
+    )
+    parser.add_argument(
+        "--sink",
+        choices=("local", "s3"),
+        default="local",
+        help="Where company CSVs go: local <out_root>/YYYY/ (default) or straight to S3 via multipart upload "
+             "(implies --direct-write)",
+    )
+    parser.add_argument("--s3-bucket", default=None, help="--sink s3: target bucket")
+    parser.add_argument(
+        "--s3-prefix",
+        default=DEFAULT_S3_PREFIX,
+        help=f"--sink s3: key prefix, {{year}} is substituted (default: {DEFAULT_S3_PREFIX})",
+    )
+    parser.add_argument(
+        "--s3-part-mb",
+        type=int,
+        default=DEFAULT_S3_PART_MB,
+        help=f"--sink s3: multipart part size in MiB, min 5; one part buffered per active company "
+             f"(default: {DEFAULT_S3_PART_MB})",
+    )
+    parser.add_argument(
+        "--s3-endpoint-url",
+        default=None,
+        help="--sink s3: S3-compatible endpoint URL, e.g. MinIO or LocalStack (default: AWS)",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=CODECS,
+        default="none",
+        help="Compress company CSVs while downloading: gzip (.csv.gz, Athena-readable) or zstd "
+             "(.csv.zst, local staging; needs zstandard). Default: none",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=None,
+        help="--compress level (default: gzip 6, zstd 3)",
+    )
+    parser.add_argument(
+        "--no-checksum",
+        action="store_true",
+        help="Do not compute the running SHA-256 of each company file (stored in the manifest)",
+    )
+    parser.add_argument(
+        "--crc32c",
+        action="store_true",
+        help='Also compute CRC32C (S3 checksum format; needs awscrt: pip install "boto3[crt]")',
+    )
+    parser.add_argument(
+        "--record-index",
+        action="store_true",
+        help=f"Collect Record_IDs while pages stream and index each company under <out_root>/{INDEX_DIR_NAME}/ "
+             "(duplicates, missing IDs, gaps; read by curate_to_parquet.py --dedup)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=f"Continue from <out_root>/{MANIFEST_NAME}: skip finished companies and finished pages",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only download companies that are new, failed last time, or whose total changed since the last "
+             f"finalized download recorded in <out_root>/{MANIFEST_NAME}",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Enable DEBUG logging to file")
+    args = parser.parse_args(argv)
+
+    registry = dict(DATASETS)
+    registry.update(parse_dataset_overrides(args.dataset))
+
+    years = sorted(set(args.years)) if args.years else sorted(registry)
+    unknown = [y for y in years if y not in registry]
+    if unknown:
+        raise SystemExit(f"No dataset id registered for year(s): {unknown}. Use --dataset YEAR=ID")
+
+    out_root = Path(args.out_root)
+    setup_logging(out_root=out_root, verbose=args.verbose, years=years)
+
+    totals_path = Path(args.totals_json)
+    if not totals_path.exists():
+        raise FileNotFoundError(f"Totals JSON not found: {totals_path}")
+
+    configure_from_args(args)
+
+    compression = Compression(args.compress, args.compress_level)
+    compression.compressor()  # fail fast on a missing codec / bad level
+
+    digest_factory: Optional[Callable[[], RunningDigest]] = None
+    if not args.no_checksum:
+        RunningDigest(crc32c=args.crc32c)  # fail fast without awscrt
+        digest_factory = functools.partial(RunningDigest, crc32c=args.crc32c)
+
+    workers = args.workers or (args.id_workers + args.page_workers)
+    if args.sink == "s3":
+        if not args.s3_bucket:
+            raise SystemExit("--sink s3 requires --s3-bucket")
+        args.direct_write = True
+        pool = args.max_inflight if args.backend == "asyncio" else workers
+        sink_factory = S3SinkFactory(
+            args.s3_bucket,
+            prefix_template=args.s3_prefix,
+            part_mb=args.s3_part_mb,
+            max_pool_connections=pool,
+            suffix=compression.suffix,
+            content_type=compression.content_type,
+            endpoint_url=args.s3_endpoint_url,
+        )
+    else:
+        sink_factory = LocalSinkFactory(suffix=compression.suffix)
+
+    record_index = RecordIndex.for_out_root(out_root) if args.record_index else None
+
+    df = load_company_totals_json(totals_path)
+    sl = parse_slice(args.slice)
+
+    # (year, company_id, expected_total, url, year_dir)
+    tasks: List[Tuple[int, str, int, str, Path]] = []
+    for year in years:
+        url = dataset_url(registry[year])
+        year_dir = out_root / str(year)
+        ensure_dir(year_dir)
+
+        year_tasks = build_year_tasks(df, year, sl)
+        logging.info("Year %s: tasks=%d | dataset URL: %s", year, len(year_tasks), url)
+        tasks.extend((year, cid, total, url, year_dir) for cid, total in year_tasks)
+
+    checkpoint = CheckpointManifest(out_root / MANIFEST_NAME)
+    results: List[Tuple[str, int, int, bool, str]] = []
+    if args.resume or args.incremental:
+        checkpoint.load()
+    if args.incremental:
+        tasks, skipped = plan_incremental(checkpoint, tasks)
+        results.extend(skipped)
+    if args.resume:
+        pending = []
+        for task in tasks:
+            year, company_id, expected_total, _url, year_dir = task
+            if checkpoint.is_company_done(year, company_id, sink_factory.location(year, company_id, year_dir)):
+                logging.info("RESUME skip finished year=%s company_id=%s", year, company_id)
+                results.append((company_id, year, expected_total, True, "skipped_resume_already_done"))
+            else:
+                pending.append(task)
+        logging.info("Resume: %d finished companies skipped, %d to (re)run", len(tasks) - len(pending), len(pending))
+        tasks = pending
+    else:
+        for year, company_id, _total, _url, _year_dir in tasks:
+            checkpoint.record_reset(year, company_id)
+
+    if not tasks:
+        logging.warning("No tasks left to run for years=%s.", years)
+        checkpoint.close()
+        write_year_reports(out_root, results, years)
+        return
+
+    logging.info("Total tasks to run (years=%s): %d", years, len(tasks))
+    logging.info(
+        "backend=%s | workers=%s | max_inflight=%s | page_limit=%s | sink=%s | compress=%s",
+        args.backend, workers, args.max_inflight, PAGE_LIMIT, sink_factory.name, compression.codec
+    )
+
+    reorder_budget = ReorderBudget(args.reorder_pages) if args.direct_write else None
+    desc = f"Downloading ({', '.join(str(y) for y in years)})"
+    if args.backend == "asyncio":
+        # aiohttp is only required for this backend
+        from openpayments_download_async import run_async_downloads
+
+        results += run_async_downloads(
+            tasks,
+            max_inflight=args.max_inflight,
+            desc=desc,
+            checkpoint=checkpoint,
+            reorder_budget=reorder_budget,
+            sink_factory=sink_factory,
+            compression=compression,
+            digest_factory=digest_factory,
+            record_index=record_index,
+        )
+    else:
+        results += run_threaded_downloads(
+            tasks,
+            workers=workers,
+            desc=desc,
+            checkpoint=checkpoint,
+            reorder_budget=reorder_budget,
+            sink_factory=sink_factory,
+            compression=compression,
+            digest_factory=digest_factory,
+            record_index=record_index,
+        )
+    checkpoint.close()
+
+    if record_index is not None:
+        reconcile_record_index(record_index, years)
+
+    ok_count = sum(1 for _, _, _, ok, _ in results if ok)
+    fail_count = len(results) - ok_count
+
+    logging.info("DONE. Success: %d/%d | Failed: %d/%d", ok_count, len(results), fail_count, len(results))
+
+    write_year_reports(out_root, results, years)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+openpayments_ordered_writer.py
+
+Direct-to-final page assembly for openpayments_general_payments_download.py
+(--direct-write).
+
+Instead of landing every page in _parts/<company_id>/part_NNNNNN.csv and then
+concatenating, each company has one OrderedCompanyWriter that appends pages to
+its sink (openpayments_sinks: csv_<company_id>.csv.part locally, or an S3
+multipart upload) strictly in page order as they complete:
+- a page that completes in order is written once, straight after its predecessor
+- a page that completes early waits in a reorder buffer until its turn
+
+Reorder buffer memory is bounded by a process-wide ReorderBudget counted in
+pages (PAGE_LIMIT rows each): a page is downloaded into memory only if it got
+a budget slot, otherwise it spills to its usual part file and is appended from
+disk when its turn comes. With the scheduler handing out pages in index order,
+almost every page is written exactly once.
+
+With the local sink, committed pages form a contiguous prefix of the .part
+file, so a crashed run can resume from it (see CheckpointManifest.committed_prefix).
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+
+MERGE_BUFFER_BYTES = 8 * 1024 * 1024  # only used when the kernel copy paths are unavailable
+DEFAULT_REORDER_PAGES = 32
+
+# (page_index, header_lines, data_rows, bytes)
+CommittedPage = Tuple[int, int, int, int]
+
+
+def append_file(src: Path, out_fd: int) -> int:
+    """
+    Append src to the raw fd out_fd without pulling it through Python memory:
+    copy_file_range (in-kernel, can reflink) -> sendfile -> read/write fallback.
+    Returns bytes copied.
+    """
+    size = src.stat().st_size
+    copied = 0
+    with src.open("rb", buffering=0) as inp:
+        in_fd = inp.fileno()
+
+        if hasattr(os, "copy_file_range"):
+            try:
+                while copied < size:
+                    n = os.copy_file_range(in_fd, out_fd, size - copied)
+                    if n == 0:
+                        break
+                    copied += n
+                if copied == size:
+                    return copied
+            except OSError:
+                pass  # e.g. EXDEV / ENOSYS: continue from `copied` below
+
+        if hasattr(os, "sendfile"):
+            try:
+                while copied < size:
+                    n = os.sendfile(out_fd, in_fd, copied, size - copied)
+                    if n == 0:
+                        break
+                    copied += n
+                if copied == size:
+                    return copied
+            except OSError:
+                pass
+
+        inp.seek(copied)
+        while True:
+            buf = inp.read(MERGE_BUFFER_BYTES)
+            if not buf:
+                break
+            write_all(out_fd, buf)
+            copied += len(buf)
+    return copied
+
+
+def write_all(fd: int, data) -> None:
+    view = memoryview(data)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+
+class ReorderBudget:
+    """
+    Non-blocking counter of in-memory page slots shared by all companies.
+    """
+
+    def __init__(self, pages: int) -> None:
+        self._free = max(0, pages)
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._free <= 0:
+                return False
+            self._free -= 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._free += 1
+
+
+# an in-memory page (holds a budget slot) or a spilled part file
+PageData = Union[io.BytesIO, Path]
+
+
+class OrderedCompanyWriter:
+    def __init__(
+        self,
+        sink,
+        budget: ReorderBudget,
+        resumed: Optional[Dict[int, Tuple[int, int, int]]] = None,
+    ) -> None:
+        """
+        sink: LocalFileSink / S3MultipartSink (openpayments_sinks).
+        resumed: contiguous committed prefix {page_index: (header_lines, data_rows, bytes)}
+        already present at the start of the sink (from the checkpoint; local sink only).
+        """
+        self.sink = sink
+        self.budget = budget
+        self.resumed = dict(resumed or {})
+        self.next_index = len(self.resumed)
+        self.committed_bytes = sum(r[2] for r in self.resumed.values())
+
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Tuple[PageData, int, int]] = {}
+        self._closed = False
+
+    # ---------------------------
+    # PAGE TARGETS
+    # ---------------------------
+    def open_page(self, spill_path: Path) -> Tuple[PageData, object]:
+        """
+        Returns (target, fh) for one page download: memory if a budget slot is
+        free, else the spill part file.
+        """
+        if self.budget.try_acquire():
+            buf = io.BytesIO()
+            return (buf, buf)
+        if spill_path.exists():
+            spill_path.unlink()
+        return (spill_path, spill_path.open("wb"))
+
+    def discard_page(self, target: PageData) -> None:
+        if isinstance(target, io.BytesIO):
+            self.budget.release()
+        else:
+            try:
+                target.unlink()
+            except FileNotFoundError:
+                pass
+
+    # ---------------------------
+    # COMMIT
+    # ---------------------------
+    def commit(self, page_index: int, target: PageData, header_lines: int, data_rows: int) -> List[CommittedPage]:
+        """
+        Hand over a finished page. Writes it (and any buffered successors) if it
+        is next in order. Returns the pages committed by this call.
+        """
+        committed: List[CommittedPage] = []
+        with self._lock:
+            if self._closed:
+                self.discard_page(target)
+                return committed
+
+            self._pending[page_index] = (target, header_lines, data_rows)
+            while self.next_index in self._pending:
+                i = self.next_index
+                data, h, d = self._pending.pop(i)
+                if isinstance(data, io.BytesIO):
+                    view = data.getbuffer()
+                    try:
+                        nbytes = self.sink.write(view)
+                    finally:
+                        view.release()
+                        self.budget.release()
+                else:
+                    nbytes = self.sink.append_file(data)
+                    data.unlink()
+                self.committed_bytes += nbytes
+                self.next_index += 1
+                committed.append((i, h, d, nbytes))
+        return committed
+
+    # ---------------------------
+    # END
+    # ---------------------------
+    def finish(self) -> Tuple[bool, str]:
+        """
+        All pages committed: stop accepting pages. The caller validates and
+        publishes the sink.
+        """
+        with self._lock:
+            self._closed = True
+            if self._pending:
+                missing = self.next_index
+                self._drop_pending()
+                self.sink.close()
+                return (False, f"reorder_gap_at_page:{missing}")
+            self.sink.close()
+            if self.committed_bytes == 0:
+                return (False, "merged_empty")
+            return (True, "")
+
+    def abort(self, discard: bool = False) -> None:
+        """
+        Company failed: free buffered pages and abort the sink (the local sink
+        keeps its committed prefix for --resume unless discard).
+        """
+        with self._lock:
+            self._closed = True
+            self._drop_pending()
+            self.sink.abort(discard=discard)
+        logging.debug("ORDERED WRITER aborted %s committed_pages=%s", self.sink.location, self.next_index)
+
+    def _drop_pending(self) -> None:
+        for data, _h, _d in self._pending.values():
+            self.discard_page(data)
+        self._pending.clear()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+openpayments_page_writer.py
+
+Byte-level writer for one CSV page streamed from the CMS download API.
+
+The response body is consumed in large chunks and written to disk as raw
+bytes: nothing is decoded to str or re-encoded, and no per-row objects are
+created. Only the header line is looked at:
+- leading blank lines are dropped
+- first page (write_header=True): header kept, UTF-8 BOM added if missing
+  (same bytes the old utf-8-sig text writer produced)
+- other pages: header dropped
+
+Data rows are counted as true CSV records with the quote-aware
+CsvRecordScanner, fed the same chunks as they are written (no second pass),
+so newlines inside quoted fields do not inflate the count. Blank lines
+outside quoted fields are neither counted nor written, as the old line-based
+writer skipped them (the scanner reports where they are). Bytes after the
+last complete record (at most one record) are held back until the record
+completes, so nothing is ever written and then taken back. On close:
+- body ended inside a quoted field => the held-back partial record is dropped
+  (truncated_bytes > 0)
+- body ended on a complete record without a trailing newline => one is added
+so every page ends on a record boundary and pages can be concatenated
+byte-for-byte. Because output is append-only, fh can be a compressor target:
+with a compressor (openpayments_compression.Compression.compressor()) every
+page is written as one self-contained gzip member / zstd frame.
+
+With record_ids (openpayments_record_index.RecordIdCollector, --record-index)
+the header line and every complete record are also handed to the collector
+as they are written, so Record_IDs are gathered in the same single pass.
+
+With tap (OrderedPageDigest.open_page) every byte written to fh, compressed
+or not, is also passed to tap, so the company checksum needs no read back.
+
+Used by both download backends:
+    writer = PageStreamWriter(fh, write_header=is_first_page, compressor=compression.compressor())
+    for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+        writer.feed(chunk)
+    header_lines, data_lines = writer.close()
+"""
+
+from __future__ import annotations
+
+from typing import BinaryIO, Tuple
+
+from openpayments_csv_scan import CsvRecordScanner
+
+
+STREAM_CHUNK_BYTES = 1024 * 1024
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+class PageStreamWriter:
+    def __init__(self, fh: BinaryIO, write_header: bool, compressor=None, record_ids=None, tap=None) -> None:
+        self.fh = fh
+        self.write_header = write_header
+        self.compressor = compressor
+        self.record_ids = record_ids
+        self.tap = tap
+        self.header_lines = 0
+        self.data_lines = 0
+        self.bytes_written = 0  # uncompressed
+        self.truncated_bytes = 0
+
+        self._in_header = True
+        self._pending = b""  # bytes seen before the header line is complete
+        self._tail = bytearray()  # data after the last complete record
+        self._scanner = CsvRecordScanner()
+
+    def _emit(self, out) -> None:
+        self.fh.write(out)
+        if self.tap is not None:
+            self.tap(out)
+
+    def _write(self, data) -> None:
+        if not data:
+            return
+        if self.compressor is not None:
+            out = self.compressor.compress(data)
+            if out:
+                self._emit(out)
+        else:
+            self._emit(data)
+        self.bytes_written += len(data)
+
+    def _write_data(self, data: bytes) -> None:
+        if not data:
+            return
+        base = self._scanner.offset
+        tail_start = self._scanner.last_boundary  # file offset of self._tail[0]
+        self.data_lines += self._scanner.feed(data)
+        cut = self._scanner.last_boundary - base
+        if cut <= 0:
+            # no record completed in this chunk
+            self._tail += data
+            return
+        view = memoryview(data)
+        if self._scanner.blank_spans:
+            # rare: copy the completed records without the blank lines
+            region = bytes(self._tail) + view[:cut]
+            kept = bytearray()
+            pos = 0
+            for start, end in self._scanner.blank_spans:
+                kept += region[pos:start - tail_start]
+                pos = end - tail_start
+            kept += region[pos:]
+            if self.record_ids is not None and kept:
+                self.record_ids.feed(bytes(kept))
+            self._write(kept)
+            self._tail = bytearray(view[cut:])
+            return
+        if self.record_ids is not None:
+            self.record_ids.feed(bytes(self._tail) + view[:cut])
+        if self._tail:
+            self._write(self._tail)
+            self._tail = bytearray()
+        self._write(view[:cut])
+        self._tail += view[cut:]
+
+    def _emit_header(self, header: bytes) -> None:
+        if not self.write_header:
+            return
+        if not header.startswith(UTF8_BOM):
+            self._write(UTF8_BOM)
+        self._write(header)
+        self.header_lines = 1
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+
+        if not self._in_header:
+            self._write_data(chunk)
+            return
+
+        buf = (self._pending + chunk).lstrip(b"\r\n")
+        nl = buf.find(b"\n")
+        if nl == -1:
+            self._pending = buf
+            return
+
+        self._in_header = False
+        self._pending = b""
+        if self.record_ids is not None:
+            self.record_ids.set_header(buf[:nl + 1])
+        self._emit_header(buf[:nl + 1])
+        self._write_data(buf[nl + 1:])
+
+    def close(self) -> Tuple[int, int]:
+        """
+        Flush what is left; returns (header_lines_written, data_lines_written).
+        """
+        if self._in_header:
+            # header without trailing newline (header-only page)
+            if self._pending:
+                self._emit_header(self._pending + b"\n")
+            self._pending = b""
+            self._in_header = False
+        elif self._scanner.in_quotes:
+            # stream ended inside a quoted field: drop the partial record
+            self.truncated_bytes = len(self._tail)
+            self._tail = bytearray()
+        elif self._tail.strip(b"\r"):
+            # last record without trailing newline
+            self._tail += b"\n"
+            self.data_lines += self._scanner.feed(b"\n")
+            if self.record_ids is not None:
+                self.record_ids.feed(bytes(self._tail))
+            self._write(self._tail)
+            self._tail = bytearray()
+
+        if self.compressor is not None and self.bytes_written:
+            self._emit(self.compressor.flush())
+            self.compressor = None
+
+        return (self.header_lines, self.data_lines)
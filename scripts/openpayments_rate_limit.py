@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+openpayments_rate_limit.py
+
+Process-wide adaptive rate limiter for every request sent to
+openpaymentsdata.cms.gov (download engine, asyncio backend, recordstotal.py).
+
+Token bucket whose refill rate follows AIMD:
+- every request first acquires a token (threads: acquire(), asyncio: acquire_async())
+- HTTP 403/429 => rate is cut multiplicatively (once per cooldown window, since the
+  requests already in flight will all bounce at once) and EVERY caller is paused
+  for the penalty, instead of only the thread that got throttled
+- success_window consecutive 200s => rate grows by increase_step (additive)
+
+Rate changes and a periodic summary are logged as "RATE ..." lines so throughput
+can be tuned against the CMS throttle from the run log.
+
+Usage:
+    from openpayments_rate_limit import configure_rate_limiter, get_rate_limiter
+    configure_rate_limiter(rate=10, min_rate=0.5, max_rate=50)   # once, in main()
+    limiter = get_rate_limiter()
+    limiter.acquire(); resp = session.get(...); limiter.record(resp.status_code)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+
+# ---------------------------
+# DEFAULTS
+# ---------------------------
+DEFAULT_RATE = 10.0          # requests/second at start
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RATE = 50.0
+DEFAULT_DECREASE_FACTOR = 0.5
+DEFAULT_INCREASE_STEP = 0.5  # requests/second added per success window
+DEFAULT_SUCCESS_WINDOW = 20  # consecutive 200s before growing
+DEFAULT_COOLDOWN_S = 5.0     # min seconds between two multiplicative cuts
+DEFAULT_LOG_INTERVAL_S = 30.0
+
+THROTTLE_STATUSES = (403, 429)
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        min_rate: float = DEFAULT_MIN_RATE,
+        max_rate: float = DEFAULT_MAX_RATE,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+        increase_step: float = DEFAULT_INCREASE_STEP,
+        success_window: int = DEFAULT_SUCCESS_WINDOW,
+        cooldown_s: float = DEFAULT_COOLDOWN_S,
+        log_interval_s: float = DEFAULT_LOG_INTERVAL_S,
+    ) -> None:
+        if not (0 < min_rate <= max_rate):
+            raise ValueError(f"Invalid rate bounds min_rate={min_rate} max_rate={max_rate}")
+
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.success_window = success_window
+        self.cooldown_s = cooldown_s
+        self.log_interval_s = log_interval_s
+
+        self._lock = threading.Lock()
+        self._rate = min(max(float(rate), self.min_rate), self.max_rate)
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_cut = 0.0
+        self._streak = 0
+
+        # counters for the periodic summary
+        self._ok = 0
+        self._throttled = 0
+        self._last_log = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    # ---------------------------
+    # ACQUIRE
+    # ---------------------------
+    def _reserve(self) -> float:
+        """
+        Take one token (possibly going into debt) and return how long the caller
+        must wait before sending its request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            burst = max(1.0, self._rate)
+            self._tokens = min(burst, self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+            self._tokens -= 1.0
+
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+            return max(wait, self._paused_until - now)
+
+    def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    # ---------------------------
+    # FEEDBACK
+    # ---------------------------
+    def record(self, status_code: int) -> None:
+        if status_code in THROTTLE_STATUSES:
+            self.on_throttle(status_code)
+        elif 200 <= status_code < 300:
+            self.on_success()
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._ok += 1
+            self._streak += 1
+            if self._streak >= self.success_window and self._rate < self.max_rate:
+                old = self._rate
+                self._rate = min(self.max_rate, self._rate + self.increase_step)
+                self._streak = 0
+                logging.debug("RATE up %.2f -> %.2f req/s", old, self._rate)
+            self._maybe_log_summary()
+
+    def on_throttle(self, status_code: int, penalty_s: float = 0.0) -> None:
+        """
+        Cut the global rate and pause all callers for penalty_s seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._throttled += 1
+            self._streak = 0
+            self._paused_until = max(self._paused_until, now + penalty_s)
+            self._tokens = min(self._tokens, 0.0)
+
+            if now - self._last_cut >= self.cooldown_s:
+                old = self._rate
+                self._rate = max(self.min_rate, self._rate * self.decrease_factor)
+                self._last_cut = now
+                logging.warning(
+                    "RATE down %.2f -> %.2f req/s (HTTP %s, global pause %.2fs)",
+                    old, self._rate, status_code, penalty_s
+                )
+            self._maybe_log_summary()
+
+    def _maybe_log_summary(self) -> None:
+        # caller holds self._lock
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval_s:
+            return
+        logging.info(
+            "RATE current=%.2f req/s | ok=%s throttled=%s (last %.0fs)",
+            self._rate, self._ok, self._throttled, now - self._last_log
+        )
+        self._ok = 0
+        self._throttled = 0
+        self._last_log = now
+
+
+# ---------------------------
+# PROCESS-WIDE INSTANCE
+# ---------------------------
+_LIMITER: Optional[AdaptiveRateLimiter] = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def configure_rate_limiter(**kwargs) -> AdaptiveRateLimiter:
+    """
+    (Re)create the process-wide limiter. Call once from main() before any request.
+    """
+    global _LIMITER
+    with _LIMITER_LOCK:
+        _LIMITER = AdaptiveRateLimiter(**kwargs)
+        logging.info(
+            "RATE limiter configured: start=%.2f min=%.2f max=%.2f req/s",
+            _LIMITER.rate, _LIMITER.min_rate, _LIMITER.max_rate
+        )
+        return _LIMITER
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    global _LIMITER
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            _LIMITER = AdaptiveRateLimiter()
+        return _LIMITER
+
+
+def add_rate_limit_args(parser) -> None:
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help=f"Starting global request rate, req/s (default: {DEFAULT_RATE})")
+    parser.add_argument("--min-rate", type=float, default=DEFAULT_MIN_RATE,
+                        help=f"Floor for the adaptive rate, req/s (default: {DEFAULT_MIN_RATE})")
+    parser.add_argument("--max-rate", type=float, default=DEFAULT_MAX_RATE,
+                        help=f"Ceiling for the adaptive rate, req/s (default: {DEFAULT_MAX_RATE})")
+
+
+def configure_from_args(args) -> AdaptiveRateLimiter:
+    return configure_rate_limiter(rate=args.rate, min_rate=args.min_rate, max_rate=args.max_rate)
@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+"""
+openpayments_record_index.py
+
+On-disk Record_ID index of the raw General Payments CSVs: duplicates and gaps
+per company, and the keys curation must drop
+(openpayments_general_payments_download.py --record-index,
+curate_to_parquet.py --dedup, or this script for files already on disk).
+
+Overlapping offsets or API reordering between pages can land a row twice or
+not at all; the same Record_ID can also come back under two companies, and
+reruns must not double count. Every Record_ID becomes a uint64 key: its value
+when it is 1-18 ASCII digits (real IDs), otherwise the top-bit-set 63-bit
+blake2b hash of the text, so the two kinds never collide.
+
+Layout under <out_root>/_record_index/YYYY/:
+- _pages/<id>/page_NNNNNN.u64   sorted keys of one downloaded page, written as
+                                the page streams in (kept across --resume)
+- company_<id>.u64              sorted unique keys of the finished company
+- company_<id>.dups.u64         keys seen more than once within the company
+- company_<id>.drop.u64         keys also landed by a company earlier in
+                                company_id order (that company keeps the row)
+- company_<id>.json             rows / unique_ids / duplicate_rows /
+                                missing_ids / gap (= expected_total - unique_ids)
+- <root>/record_index_report_YYYY.csv   one row per indexed company
+
+A rerun of a company overwrites its files, so counts never accumulate.
+
+All key files are raw little-endian uint64 arrays. Memory stays bounded
+whatever the company and year sizes: small sorted runs (pages) are compacted
+into runs of at most RUN_KEYS keys, and runs are merged through aligned key
+ranges of ~DEFAULT_BATCH_KEYS keys, located by binary search in memory-mapped
+runs; only one range is in memory at a time.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from openpayments_compression import Compression
+from openpayments_schema import LATEST_SCHEMA, Schema, schema_for_year
+
+
+INDEX_DIR_NAME = "_record_index"
+RECORD_ID = "Record_ID"
+
+KEY_DTYPE = np.dtype("<u8")
+TAG_DTYPE = np.dtype("<u4")
+HASHED_KEY_BIT = 1 << 63
+NUMERIC_ID_PATTERN = r"[0-9]{1,18}"
+
+RUN_KEYS = 1 << 20            # keys per compacted run (8 MiB)
+DEFAULT_BATCH_KEYS = 1 << 20  # keys per merged key range
+SAMPLES_PER_BATCH = 16        # split-point samples per key range
+FILE_READ_ROWS = 100_000      # Record_IDs converted per step when indexing a file
+
+REPORT_FIELDS = [
+    "year",
+    "company_id",
+    "expected_total",
+    "rows",
+    "unique_ids",
+    "duplicate_rows",
+    "missing_ids",
+    "gap",
+    "cross_company_dropped",
+    "curated_rows",
+    "source",
+]
+
+
+# ---------------------------
+# KEYS
+# ---------------------------
+def hashed_key(value: str) -> int:
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") | HASHED_KEY_BIT
+
+
+def record_id_keys(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Record_ID texts -> (uint64 keys, present mask). Empty / missing IDs are
+    not present (their key is 0 and must be ignored).
+    """
+    s = pd.Series(values, dtype=object).fillna("").astype(str).str.strip()
+    present = (s != "").to_numpy()
+    numeric = s.str.fullmatch(NUMERIC_ID_PATTERN).to_numpy(dtype=bool)
+    keys = np.zeros(len(s), dtype=KEY_DTYPE)
+    if numeric.any():
+        keys[numeric] = s[numeric].astype(np.int64).to_numpy()
+    other = present & ~numeric
+    if other.any():
+        keys[other] = np.array([hashed_key(v) for v in s[other]], dtype=KEY_DTYPE)
+    return keys, present
+
+
+def isin_sorted(values: np.ndarray, sorted_keys: np.ndarray) -> np.ndarray:
+    if not len(sorted_keys):
+        return np.zeros(len(values), dtype=bool)
+    idx = np.searchsorted(sorted_keys, values)
+    idx[idx == len(sorted_keys)] = 0
+    return sorted_keys[idx] == values
+
+
+class RecordIdCollector:
+    """
+    Record_IDs of one page, fed the complete CSV records PageStreamWriter
+    writes (header line first, data records in arbitrary chunks).
+    """
+
+    def __init__(self, schema: Schema = LATEST_SCHEMA) -> None:
+        self.schema = schema
+        self.position = -1
+        self.values: List[str] = []
+
+    def set_header(self, line: bytes) -> None:
+        header = next(csv.reader([line.decode("utf-8", errors="replace")]), [])
+        # the API returns lowercase names
+        header_map = self.schema.map_header(header, case_sensitive=False)
+        self.position = header_map.positions[self.schema.index[RECORD_ID]]
+
+    def feed(self, records: bytes) -> None:
+        pos = self.position
+        text = records.decode("utf-8", errors="replace")
+        for row in csv.reader(io.StringIO(text, newline="")):
+            self.values.append(row[pos] if 0 <= pos < len(row) else "")
+
+    def sorted_keys(self) -> np.ndarray:
+        keys, present = record_id_keys(self.values)
+        keys = keys[present]
+        keys.sort()
+        return keys
+
+
+# ---------------------------
+# KEY FILES
+# ---------------------------
+def write_array(path: Path, arr: np.ndarray) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    arr.tofile(tmp)
+    os.replace(tmp, path)
+
+
+def read_keys(path: Path) -> np.ndarray:
+    return np.fromfile(path, dtype=KEY_DTYPE)
+
+
+def map_array(path: Path, dtype: np.dtype = KEY_DTYPE) -> np.ndarray:
+    """
+    Read-only memory map of a key / tag file (an empty array for an empty file).
+    """
+    if path.stat().st_size < dtype.itemsize:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def remove_work_dir(path: Path) -> None:
+    """
+    Remove a per-company work dir, and its parent (_pages / _runs) once empty.
+    """
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        path.parent.rmdir()
+    except OSError:
+        pass
+
+
+def iter_key_ranges(runs: Sequence[np.ndarray], batch_keys: int = DEFAULT_BATCH_KEYS) -> Iterator[List[Tuple[int, int]]]:
+    """
+    Aligned key ranges over sorted runs: yields one (lo, hi) per run so that
+    run[lo:hi] of every run covers the same key interval, ~batch_keys keys in
+    total. Split points come from a strided sample of each run, weighted by the
+    keys each sample stands for, so uneven runs (one big company next to
+    thousands of small ones) still give even ranges. Equal keys never straddle
+    two ranges.
+    """
+    total = sum(len(r) for r in runs)
+    if not total:
+        return
+    stride = max(1, batch_keys // SAMPLES_PER_BATCH)
+    values, weights = [], []
+    for r in runs:
+        if not len(r):
+            continue
+        sample = np.asarray(r[::stride])
+        w = np.full(len(sample), stride, dtype=np.int64)
+        w[-1] = len(r) - stride * (len(sample) - 1)
+        values.append(sample)
+        weights.append(w)
+    sample = np.concatenate(values)
+    order = np.argsort(sample, kind="stable")
+    cum = np.cumsum(np.concatenate(weights)[order])
+    cuts = np.searchsorted(cum, np.arange(batch_keys, total, batch_keys, dtype=np.int64))
+    bounds = np.unique(sample[order][np.minimum(cuts, len(order) - 1)])
+
+    starts = [0] * len(runs)
+    for b in [*bounds, None]:
+        spans = []
+        for i, r in enumerate(runs):
+            hi = len(r) if b is None else int(np.searchsorted(r, b, side="left"))
+            spans.append((starts[i], hi))
+            starts[i] = hi
+        yield spans
+
+
+def compact_runs(paths: Sequence[Path], work_dir: Path, run_keys: int = RUN_KEYS) -> List[Path]:
+    """
+    Merge many small sorted key files (one per page) into sorted runs of at
+    most ~run_keys keys, so a merge maps a handful of files instead of
+    thousands.
+    """
+    work_dir.mkdir(parents=True, exist_ok=True)
+    out: List[Path] = []
+    group: List[Path] = []
+    size = 0
+
+    def flush() -> None:
+        keys = np.concatenate([read_keys(p) for p in group])
+        keys.sort()
+        path = work_dir / f"run_{len(out):06d}.u64"
+        write_array(path, keys)
+        out.append(path)
+
+    for p in paths:
+        n = p.stat().st_size // KEY_DTYPE.itemsize
+        if group and size + n > run_keys:
+            flush()
+            group, size = [], 0
+        group.append(p)
+        size += n
+    if group:
+        flush()
+    return out
+
+
+# ---------------------------
+# INDEX
+# ---------------------------
+class RecordIndex:
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    @classmethod
+    def for_out_root(cls, out_root: Path) -> "RecordIndex":
+        return cls(Path(out_root) / INDEX_DIR_NAME)
+
+    def year_dir(self, year) -> Path:
+        return self.root / str(year)
+
+    def company_path(self, year, company_id: str, kind: str = "") -> Path:
+        """
+        kind: "" (unique keys), "dups", "drop" or "json".
+        """
+        if kind == "json":
+            return self.year_dir(year) / f"company_{company_id}.json"
+        suffix = f".{kind}.u64" if kind else ".u64"
+        return self.year_dir(year) / f"company_{company_id}{suffix}"
+
+    def pages_dir(self, year, company_id: str) -> Path:
+        return self.year_dir(year) / "_pages" / company_id
+
+    def page_path(self, year, company_id: str, page_index: int) -> Path:
+        return self.pages_dir(year, company_id) / f"page_{page_index:06d}.u64"
+
+    def report_path(self, year) -> Path:
+        return self.root / f"record_index_report_{year}.csv"
+
+    # --- download side ---
+    def collector(self, schema: Schema = LATEST_SCHEMA) -> RecordIdCollector:
+        return RecordIdCollector(schema)
+
+    def save_page(self, year, company_id: str, page_index: int, collector: RecordIdCollector) -> None:
+        path = self.page_path(year, company_id, page_index)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_array(path, collector.sorted_keys())
+
+    def build_company(
+        self,
+        year,
+        company_id: str,
+        page_rows: Dict[int, int],
+        expected_total: int,
+        source: str,
+        source_bytes: int,
+    ) -> Optional[Dict[str, object]]:
+        """
+        Company index from its page key files. page_rows: page_index -> data rows
+        (pages without rows have no file). None if a page's keys are missing
+        (e.g. a page resumed from a run without --record-index).
+        """
+        paths = [self.page_path(year, company_id, i) for i, n in sorted(page_rows.items()) if n]
+        if not all(p.exists() for p in paths):
+            return None
+        rows = sum(page_rows.values())
+        work_dir = self.year_dir(year) / "_runs" / company_id
+        try:
+            runs = compact_runs(paths, work_dir)
+            keys = sum(p.stat().st_size for p in runs) // KEY_DTYPE.itemsize
+            stats = self._merge_company(
+                year, company_id, runs, rows, rows - keys, expected_total, source, source_bytes
+            )
+        finally:
+            remove_work_dir(work_dir)
+        remove_work_dir(self.pages_dir(year, company_id))
+        return stats
+
+    def build_company_from_file(
+        self,
+        year,
+        company_id: str,
+        path: Path,
+        expected_total: int = 0,
+        schema: Optional[Schema] = None,
+    ) -> Dict[str, object]:
+        """
+        Company index from a finished local csv_<id>.csv[.gz|.zst], streamed.
+        """
+        schema = schema or schema_for_year(year)
+        work_dir = self.year_dir(year) / "_runs" / company_id
+        work_dir.mkdir(parents=True, exist_ok=True)
+        rows = missing = 0
+        runs: List[Path] = []
+        pending: List[np.ndarray] = []
+        pending_keys = 0
+
+        def spill() -> None:
+            keys = np.concatenate(pending)
+            keys.sort()
+            run = work_dir / f"run_{len(runs):06d}.u64"
+            write_array(run, keys)
+            runs.append(run)
+
+        try:
+            with Compression.for_path(path).open_reader(path) as raw:
+                text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+                reader = csv.reader(text)
+                header_map = schema.map_header(next(reader, []), case_sensitive=False)
+                pos = header_map.positions[schema.index[RECORD_ID]]
+                while True:
+                    values = [row[pos] if 0 <= pos < len(row) else "" for _, row in zip(range(FILE_READ_ROWS), reader)]
+                    if not values:
+                        break
+                    keys, present = record_id_keys(values)
+                    rows += len(values)
+                    missing += int(len(values) - present.sum())
+                    pending.append(keys[present])
+                    pending_keys += int(present.sum())
+                    if pending_keys >= RUN_KEYS:
+                        spill()
+                        pending, pending_keys = [], 0
+            if pending:
+                spill()
+            return self._merge_company(
+                year, company_id, runs, rows, missing, expected_total, str(path), path.stat().st_size
+            )
+        finally:
+            remove_work_dir(work_dir)
+
+    def _merge_company(
+        self,
+        year,
+        company_id: str,
+        run_paths: List[Path],
+        rows: int,
+        missing: int,
+        expected_total: int,
+        source: str,
+        source_bytes: int,
+    ) -> Dict[str, object]:
+        self.year_dir(year).mkdir(parents=True, exist_ok=True)
+        unique_path = self.company_path(year, company_id)
+        dups_path = self.company_path(year, company_id, "dups")
+        unique_tmp = unique_path.with_name(unique_path.name + ".tmp")
+        dups_tmp = dups_path.with_name(dups_path.name + ".tmp")
+
+        unique = duplicate_rows = 0
+        runs = [map_array(p) for p in run_paths]
+        with unique_tmp.open("wb") as fu, dups_tmp.open("wb") as fd:
+            for spans in iter_key_ranges(runs):
+                chunk = np.concatenate([r[lo:hi] for r, (lo, hi) in zip(runs, spans)])
+                if not len(chunk):
+                    continue
+                keys, counts = np.unique(chunk, return_counts=True)
+                keys.tofile(fu)
+                keys[counts > 1].tofile(fd)
+                unique += len(keys)
+                duplicate_rows += int((counts - 1).sum())
+        del runs
+        os.replace(unique_tmp, unique_path)
+        os.replace(dups_tmp, dups_path)
+
+        stats: Dict[str, object] = {
+            "year": int(year),
+            "company_id": company_id,
+            "expected_total": int(expected_total),
+            "rows": int(rows),
+            "unique_ids": unique,
+            "duplicate_rows": duplicate_rows,
+            "missing_ids": int(missing),
+            "gap": int(expected_total) - unique if expected_total else "",
+            "source": source,
+            "source_bytes": int(source_bytes),
+            "indexed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        json_path = self.company_path(year, company_id, "json")
+        tmp = json_path.with_name(json_path.name + ".tmp")
+        tmp.write_text(json.dumps(stats, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, json_path)
+        return stats
+
+    def company_stats(self, year, company_id: str) -> Optional[Dict[str, object]]:
+        try:
+            return json.loads(self.company_path(year, company_id, "json").read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def companies(self, year) -> List[str]:
+        return sorted(p.name[len("company_"):-len(".json")] for p in self.year_dir(year).glob("company_*.json"))
+
+    # --- whole year ---
+    def reconcile_year(self, year, group_keys: int = RUN_KEYS) -> List[Dict[str, object]]:
+        """
+        Cross-company pass over every indexed company of a year: a key landed by
+        several companies is kept by the first in company_id order and written
+        to the others' drop files. Writes record_index_report_YYYY.csv and
+        returns its rows.
+        """
+        companies = self.companies(year)
+        work_dir = self.year_dir(year) / "_reconcile"
+        shutil.rmtree(work_dir, ignore_errors=True)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        drops: Dict[int, List[np.ndarray]] = {}
+        try:
+            # tagged runs: (keys, company number) sorted by key, ~group_keys keys each
+            run_paths: List[Tuple[Path, Path]] = []
+            group: List[int] = []
+            size = 0
+
+            def flush() -> None:
+                keys = np.concatenate([read_keys(self.company_path(year, companies[t])) for t in group])
+                tags = np.concatenate([
+                    np.full(self.company_path(year, companies[t]).stat().st_size // KEY_DTYPE.itemsize, t, dtype=TAG_DTYPE)
+                    for t in group
+                ])
+                order = np.argsort(keys, kind="stable")
+                k_path = work_dir / f"run_{len(run_paths):06d}.u64"
+                t_path = work_dir / f"run_{len(run_paths):06d}.u32"
+                write_array(k_path, keys[order])
+                write_array(t_path, tags[order])
+                run_paths.append((k_path, t_path))
+
+            for t, cid in enumerate(companies):
+                path = self.company_path(year, cid)
+                if not path.exists():
+                    continue
+                n = path.stat().st_size // KEY_DTYPE.itemsize
+                if group and size + n > group_keys:
+                    flush()
+                    group, size = [], 0
+                group.append(t)
+                size += n
+            if group:
+                flush()
+
+            runs = [map_array(k) for k, _ in run_paths]
+            tags = [map_array(t, TAG_DTYPE) for _, t in run_paths]
+            for spans in iter_key_ranges(runs):
+                keys = np.concatenate([r[lo:hi] for r, (lo, hi) in zip(runs, spans)])
+                if len(keys) < 2:
+                    continue
+                owners = np.concatenate([r[lo:hi] for r, (lo, hi) in zip(tags, spans)])
+                order = np.lexsort((owners, keys))
+                keys, owners = keys[order], owners[order]
+                again = np.flatnonzero(keys[1:] == keys[:-1]) + 1
+                for t in np.unique(owners[again]):
+                    drops.setdefault(int(t), []).append(keys[again][owners[again] == t])
+            del runs, tags
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        rows: List[Dict[str, object]] = []
+        for t, cid in enumerate(companies):
+            drop_path = self.company_path(year, cid, "drop")
+            dropped = np.concatenate(drops[t]) if t in drops else np.empty(0, dtype=KEY_DTYPE)
+            if len(dropped):
+                dropped.sort()
+                # rewrite only on change: curation treats a newer drop file as a stale output
+                if not drop_path.exists() or not np.array_equal(read_keys(drop_path), dropped):
+                    write_array(drop_path, dropped)
+            elif drop_path.exists():
+                drop_path.unlink()
+
+            stats = self.company_stats(year, cid) or {}
+            row = {field: stats.get(field, "") for field in REPORT_FIELDS}
+            row["year"] = int(year)
+            row["company_id"] = cid
+            row["cross_company_dropped"] = len(dropped)
+            row["curated_rows"] = int(stats.get("unique_ids", 0)) - len(dropped)
+            rows.append(row)
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self.report_path(year).open("w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            w.writeheader()
+            w.writerows(rows)
+        return rows
+
+    # --- curation side ---
+    def dedup_filter(self, year, company_id: str) -> Optional["CompanyDedupFilter"]:
+        if self.company_stats(year, company_id) is None:
+            return None
+        dups_path = self.company_path(year, company_id, "dups")
+        drop_path = self.company_path(year, company_id, "drop")
+        return CompanyDedupFilter(
+            read_keys(dups_path) if dups_path.exists() else np.empty(0, dtype=KEY_DTYPE),
+            read_keys(drop_path) if drop_path.exists() else np.empty(0, dtype=KEY_DTYPE),
+        )
+
+
+class CompanyDedupFilter:
+    """
+    Streaming row filter for one company file: rows whose key is in the drop
+    set are removed, and of the keys known to repeat within the company only
+    the first row is kept. Only those two (small) key sets and the repeated
+    keys already seen are held in memory.
+    """
+
+    def __init__(self, dup_keys: np.ndarray, drop_keys: np.ndarray) -> None:
+        self.dup_keys = dup_keys
+        self.drop_keys = drop_keys
+        self.duplicates_dropped = 0
+        self.cross_company_dropped = 0
+        self._seen: set = set()
+
+    def keep(self, keys: np.ndarray, present: np.ndarray) -> np.ndarray:
+        """
+        keys/present: record_id_keys() of a batch, in file order. Returns the keep mask.
+        """
+        keep = np.ones(len(keys), dtype=bool)
+        if len(self.drop_keys):
+            drop = present & isin_sorted(keys, self.drop_keys)
+            keep &= ~drop
+            self.cross_company_dropped += int(drop.sum())
+        if len(self.dup_keys):
+            cand = np.flatnonzero(keep & present & isin_sorted(keys, self.dup_keys))
+            if len(cand):
+                first = np.zeros(len(cand), dtype=bool)
+                _, idx = np.unique(keys[cand], return_index=True)
+                first[idx] = True
+                for j in np.flatnonzero(first):
+                    key = int(keys[cand[j]])
+                    if key in self._seen:
+                        first[j] = False
+                    else:
+                        self._seen.add(key)
+                keep[cand[~first]] = False
+                self.duplicates_dropped += int((~first).sum())
+        return keep
+
+
+# ---------------------------
+# CLI: index files already on disk
+# ---------------------------
+def index_one_file(root: str, year: str, path: str, expected_total: int) -> Dict[str, object]:
+    src = Path(path)
+    company_id = src.name[len("csv_"):src.name.index(".csv")]
+    try:
+        return RecordIndex(Path(root)).build_company_from_file(year, company_id, src, expected_total)
+    except (OSError, csv.Error, ValueError) as e:
+        return {"year": year, "company_id": company_id, "source": path, "error": str(e)}
+
+
+def load_expected_totals(path: Optional[str], year: str) -> Dict[str, int]:
+    if not path:
+        return {}
+    df = pd.read_json(path)
+    col = f"total_{year}"
+    if col not in df.columns:
+        return {}
+    return {str(cid): int(total) for cid, total in zip(df["company_id"], df[col].fillna(0))}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the Record_ID index of downloaded company CSVs.")
+    parser.add_argument("--base-dir", default=".", help="Downloader output root containing YYYY/ folders")
+    parser.add_argument("--years", nargs="+", default=["2023", "2024"])
+    parser.add_argument(
+        "--index-dir",
+        default=None,
+        help=f"Index root (default: <base-dir>/{INDEX_DIR_NAME}, where the downloader and curation look)",
+    )
+    parser.add_argument("--totals-json", default=None, help="openpayments_companies_totals_by_year.json, for gaps")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Company files indexed in parallel")
+    args = parser.parse_args()
+
+    base_dir = Path(args.base_dir).resolve()
+    index = RecordIndex(Path(args.index_dir).resolve() if args.index_dir else base_dir / INDEX_DIR_NAME)
+
+    errors = 0
+    for year in args.years:
+        year_dir = base_dir / year
+        if not year_dir.is_dir():
+            raise SystemExit(f"Year folder not found: {year_dir}")
+        totals = load_expected_totals(args.totals_json, year)
+        files = [p for p in sorted(year_dir.glob("csv_*.csv*")) if p.suffix in (".csv", ".gz", ".zst")]
+        print(f"[INFO] Year {year}: indexing {len(files)} company files")
+
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as ex:
+            futs = []
+            for p in files:
+                cid = p.name[len("csv_"):p.name.index(".csv")]
+                futs.append(ex.submit(index_one_file, str(index.root), year, str(p), totals.get(cid, 0)))
+            for fut in as_completed(futs):
+                s = fut.result()
+                if s.get("error"):
+                    errors += 1
+                    print(f"[ERROR] {s['source']} {s['error']}")
+                elif s["duplicate_rows"] or s["missing_ids"] or s["gap"]:
+                    print(
+                        f"[AUDIT] {year} company={s['company_id']} rows={s['rows']:,} unique={s['unique_ids']:,} "
+                        f"duplicates={s['duplicate_rows']:,} missing_ids={s['missing_ids']:,} gap={s['gap']}"
+                    )
+
+        rows = index.reconcile_year(year)
+        dup = sum(int(r["duplicate_rows"] or 0) for r in rows)
+        cross = sum(int(r["cross_company_dropped"]) for r in rows)
+        print(
+            f"[OK] Year {year}: companies={len(rows)} duplicate_rows={dup:,} cross_company_dropped={cross:,}"
+        )
+        print(f"[DONE] Wrote report: {index.report_path(year)}")
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+openpayments_schema.py
+
+Versioned registry of the General Payments CSV schema, per program year.
+One definition shared by:
+- the downloader's header check (openpayments_general_payments_download.py)
+- the raw audit (audit_raw_csv_schema.py)
+- curation to Parquet (curate_to_parquet.py)
+
+Each column carries:
+- type: the curated (Athena / Glue) type: string, bigint, int, decimal(14,2), date
+- nullable: False for columns every real payment row has; audits count empty
+  values there, curation keeps the Parquet field nullable (unparseable values
+  become null) and reports them
+- dictionary: low-cardinality hint (codes, states, indicators), used for
+  Parquet dictionary encoding
+
+A Schema precomputes its name -> index maps once; map_header() resolves a
+file's header to positions once per file, so per-row checks index into the
+parsed row instead of matching names.
+
+Add a new Schema (new version string) when CMS changes the layout and point
+the affected program years at it in SCHEMA_BY_YEAR.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: str = "string"
+    nullable: bool = True
+    dictionary: bool = False
+
+
+@dataclass(frozen=True)
+class HeaderMap:
+    positions: Tuple[int, ...]           # schema column i -> index in the file header (-1 if absent)
+    required_positions: Tuple[int, ...]  # file indexes of the non-nullable columns present
+    missing: Tuple[str, ...]
+    extra: Tuple[str, ...]
+
+    @property
+    def matches(self) -> bool:
+        return not self.missing and not self.extra
+
+
+def normalize_header(cols: List[str]) -> List[str]:
+    # strip BOM and whitespace
+    normalized = []
+    for i, c in enumerate(cols):
+        c2 = c.strip()
+        if i == 0:
+            c2 = c2.lstrip("\ufeff").lstrip()
+        normalized.append(c2)
+    return normalized
+
+
+class Schema:
+    def __init__(
+        self,
+        version: str,
+        columns: Sequence[Column],
+        min_header_columns: int,
+    ) -> None:
+        self.version = version
+        self.columns: Tuple[Column, ...] = tuple(columns)
+        self.min_header_columns = min_header_columns
+        self.names: Tuple[str, ...] = tuple(c.name for c in self.columns)
+        self.index: Dict[str, int] = {n: i for i, n in enumerate(self.names)}
+        self._folded: Dict[str, int] = {n.casefold(): i for i, n in enumerate(self.names)}
+        self.required: Tuple[str, ...] = tuple(c.name for c in self.columns if not c.nullable)
+        self.dictionary: Tuple[str, ...] = tuple(c.name for c in self.columns if c.dictionary)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def column(self, name: str) -> Column:
+        return self.columns[self.index[name]]
+
+    def map_header(self, header: Sequence[str], case_sensitive: bool = True) -> HeaderMap:
+        """
+        Resolve a raw header row (BOM / whitespace tolerated) to schema positions.
+        case_sensitive=False also accepts e.g. the API's lowercase names.
+        """
+        positions = [-1] * len(self.columns)
+        extra: List[str] = []
+        for file_idx, name in enumerate(normalize_header(list(header))):
+            i = self.index.get(name) if case_sensitive else self._folded.get(name.casefold())
+            if i is None or positions[i] != -1:
+                extra.append(name)
+            else:
+                positions[i] = file_idx
+        return HeaderMap(
+            positions=tuple(positions),
+            required_positions=tuple(
+                positions[i] for i, c in enumerate(self.columns) if not c.nullable and positions[i] != -1
+            ),
+            missing=tuple(sorted(self.names[i] for i, p in enumerate(positions) if p == -1)),
+            extra=tuple(sorted(extra)),
+        )
+
+
+# ---------------------------
+# GENERAL PAYMENTS
+# ---------------------------
+def _columns_v1() -> List[Column]:
+    S, B, I, DEC, D = "string", "bigint", "int", "decimal(14,2)", "date"
+    cols = [
+        Column("Change_Type", S, dictionary=True),
+        Column("Covered_Recipient_Type", S, dictionary=True),
+        Column("Teaching_Hospital_CCN", S),
+        Column("Teaching_Hospital_ID", B),
+        Column("Teaching_Hospital_Name", S),
+        Column("Covered_Recipient_Profile_ID", B),
+        Column("Covered_Recipient_NPI", B),
+        Column("Covered_Recipient_First_Name", S),
+        Column("Covered_Recipient_Middle_Name", S),
+        Column("Covered_Recipient_Last_Name", S),
+        Column("Covered_Recipient_Name_Suffix", S, dictionary=True),
+        Column("Recipient_Primary_Business_Street_Address_Line1", S),
+        Column("Recipient_Primary_Business_Street_Address_Line2", S),
+        Column("Recipient_City", S),
+        Column("Recipient_State", S, dictionary=True),
+        Column("Recipient_Zip_Code", S),
+        Column("Recipient_Country", S, dictionary=True),
+        Column("Recipient_Province", S, dictionary=True),
+        Column("Recipient_Postal_Code", S),
+    ]
+    cols += [Column(f"Covered_Recipient_Primary_Type_{i}", S, dictionary=True) for i in range(1, 7)]
+    cols += [Column(f"Covered_Recipient_Specialty_{i}", S, dictionary=True) for i in range(1, 7)]
+    cols += [Column(f"Covered_Recipient_License_State_code{i}", S, dictionary=True) for i in range(1, 6)]
+    cols += [
+        Column("Submitting_Applicable_Manufacturer_or_Applicable_GPO_Name", S, nullable=False, dictionary=True),
+        Column("Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_ID", B, nullable=False, dictionary=True),
+        Column("Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_Name", S, nullable=False, dictionary=True),
+        Column("Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_State", S, dictionary=True),
+        Column("Applicable_Manufacturer_or_Applicable_GPO_Making_Payment_Country", S, dictionary=True),
+        Column("Total_Amount_of_Payment_USDollars", DEC, nullable=False),
+        Column("Date_of_Payment", D, nullable=False),
+        Column("Number_of_Payments_Included_in_Total_Amount", I),
+        Column("Form_of_Payment_or_Transfer_of_Value", S, dictionary=True),
+        Column("Nature_of_Payment_or_Transfer_of_Value", S, dictionary=True),
+        Column("City_of_Travel", S),
+        Column("State_of_Travel", S, dictionary=True),
+        Column("Country_of_Travel", S, dictionary=True),
+        Column("Physician_Ownership_Indicator", S, dictionary=True),
+        Column("Third_Party_Payment_Recipient_Indicator", S, dictionary=True),
+        Column("Name_of_Third_Party_Entity_Receiving_Payment_or_Transfer_of_Value", S),
+        Column("Charity_Indicator", S, dictionary=True),
+        Column("Third_Party_Equals_Covered_Recipient_Indicator", S, dictionary=True),
+        Column("Contextual_Information", S),
+        Column("Delay_in_Publication_Indicator", S, dictionary=True),
+        Column("Record_ID", B, nullable=False),
+        Column("Dispute_Status_for_Publication", S, dictionary=True),
+        Column("Related_Product_Indicator", S, dictionary=True),
+    ]
+    for i in range(1, 6):
+        cols += [
+            Column(f"Covered_or_Noncovered_Indicator_{i}", S, dictionary=True),
+            Column(f"Indicate_Drug_or_Biological_or_Device_or_Medical_Supply_{i}", S, dictionary=True),
+            Column(f"Product_Category_or_Therapeutic_Area_{i}", S, dictionary=True),
+            Column(f"Name_of_Drug_or_Biological_or_Device_or_Medical_Supply_{i}", S, dictionary=True),
+            Column(f"Associated_Drug_or_Biological_NDC_{i}", S, dictionary=True),
+            Column(f"Associated_Device_or_Medical_Supply_PDI_{i}", S),
+        ]
+    cols += [
+        Column("Program_Year", I, nullable=False, dictionary=True),
+        Column("Payment_Publication_Date", D, dictionary=True),
+    ]
+    return cols
+
+
+GENERAL_PAYMENTS_V1 = Schema(
+    version="general_payments/v1",
+    columns=_columns_v1(),
+    # downloads are rejected below this many header columns (API / bulk layouts both have 91)
+    min_header_columns=80,
+)
+
+SCHEMAS: Dict[str, Schema] = {s.version: s for s in (GENERAL_PAYMENTS_V1,)}
+SCHEMA_BY_YEAR: Dict[int, Schema] = {
+    2023: GENERAL_PAYMENTS_V1,
+    2024: GENERAL_PAYMENTS_V1,
+}
+LATEST_SCHEMA = GENERAL_PAYMENTS_V1
+
+
+def schema_for_year(year) -> Schema:
+    """
+    Schema for a program year (int or "2024"); unknown years get the latest.
+    """
+    try:
+        return SCHEMA_BY_YEAR.get(int(year), LATEST_SCHEMA)
+    except (TypeError, ValueError):
+        return LATEST_SCHEMA
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+openpayments_sinks.py
+
+Where --direct-write puts each company's CSV (openpayments_general_payments_download.py --sink).
+
+- local (default): csv_<id>.csv.part in <out_root>/YYYY/, renamed to csv_<id>.csv
+  when the company completes (supports page-level --resume)
+- s3: streamed straight into s3://<bucket>/raw/year=YYYY/csv_<id>.csv
+  (--s3-prefix). Pages arrive in offset order from the ordered writer and
+  are buffered only up to one multipart part (--s3-part-mb) before being
+  uploaded, so the runner never holds a whole company, let alone a year, on
+  disk. Objects smaller than one part become a single PutObject. A failed
+  company aborts its multipart upload; nothing partial becomes visible.
+
+With --compress the object names get .gz / .zst and the bytes passed in are
+already compressed members (openpayments_compression.py). A sink given a
+RunningDigest (openpayments_digest.py) feeds it every byte in file order.
+
+Every sink exposes the same small interface used by OrderedCompanyWriter:
+    write(data) / append_file(path) -> bytes written
+    header_sample() -> first bytes of the object (header validation)
+    publish() -> final location string
+    abort(discard)
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+
+from openpayments_ordered_writer import append_file, write_all
+
+
+HEADER_SAMPLE_BYTES = 512 * 1024
+DEFAULT_S3_PREFIX = "raw/year={year}/"
+DEFAULT_S3_PART_MB = 8
+S3_MIN_PART_BYTES = 5 * 1024 * 1024
+SPILL_READ_BYTES = 8 * 1024 * 1024
+
+
+# ---------------------------
+# LOCAL
+# ---------------------------
+class LocalFileSink:
+    def __init__(self, tmp_path: Path, final_path: Path, resume_bytes: int = 0, digest=None) -> None:
+        self.tmp_path = tmp_path
+        self.final_path = final_path
+        self.resume_bytes = resume_bytes
+        self.bytes_written = resume_bytes
+        self.digest = digest
+        self._fd: Optional[int] = None
+        self._prefix_digested = resume_bytes == 0
+
+    def _digest_prefix(self) -> None:
+        # --resume: bytes committed by the earlier run go through the digest once
+        if not self._prefix_digested and self.digest is not None:
+            self.digest.update_from_file(self.tmp_path, limit=self.resume_bytes)
+        self._prefix_digested = True
+
+    @property
+    def location(self) -> str:
+        return str(self.final_path)
+
+    def _ensure_open(self) -> int:
+        if self._fd is None:
+            self._digest_prefix()
+            self.tmp_path.parent.mkdir(parents=True, exist_ok=True)
+            if self.resume_bytes:
+                self._fd = os.open(self.tmp_path, os.O_WRONLY)
+                os.ftruncate(self._fd, self.resume_bytes)
+                os.lseek(self._fd, self.resume_bytes, os.SEEK_SET)
+            else:
+                self._fd = os.open(self.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        return self._fd
+
+    def write(self, data) -> int:
+        n = len(data)
+        if n:
+            write_all(self._ensure_open(), data)
+            if self.digest is not None:
+                self.digest.update(data)
+            self.bytes_written += n
+        return n
+
+    def append_file(self, src: Path) -> int:
+        if self.digest is not None:
+            # one read feeds both the digest and the copy
+            n = self.digest.update_from_file(src, self._ensure_open())
+        else:
+            n = append_file(src, self._ensure_open())
+        self.bytes_written += n
+        return n
+
+    def header_sample(self) -> bytes:
+        try:
+            with self.tmp_path.open("rb") as fh:
+                return fh.read(HEADER_SAMPLE_BYTES)
+        except FileNotFoundError:
+            return b""
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def publish(self) -> str:
+        self.close()
+        self._digest_prefix()
+        os.replace(self.tmp_path, self.final_path)
+        return self.location
+
+    def abort(self, discard: bool = False) -> None:
+        """
+        discard=False keeps the committed prefix for --resume.
+        """
+        self.close()
+        if discard:
+            try:
+                self.tmp_path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ---------------------------
+# S3 MULTIPART
+# ---------------------------
+class S3MultipartSink:
+    def __init__(
+        self,
+        s3,
+        bucket: str,
+        key: str,
+        part_bytes: int = DEFAULT_S3_PART_MB * 1024 * 1024,
+        content_type: str = "text/csv",
+        digest=None,
+    ) -> None:
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_bytes = max(part_bytes, S3_MIN_PART_BYTES)
+        self.content_type = content_type
+        self.digest = digest
+        self.resume_bytes = 0
+        self.bytes_written = 0
+
+        self._buf = bytearray()
+        self._head = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    @property
+    def location(self) -> str:
+        return f"s3://{self.bucket}/{self.key}"
+
+    def _upload_part(self, body) -> None:
+        if self._upload_id is None:
+            resp = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key, ContentType=self.content_type)
+            self._upload_id = resp["UploadId"]
+            logging.debug("S3 MPU start %s upload_id=%s", self.location, self._upload_id)
+        part_number = len(self._parts) + 1
+        resp = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(body),
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
+
+    def write(self, data) -> int:
+        n = len(data)
+        if not n:
+            return 0
+        if len(self._head) < HEADER_SAMPLE_BYTES:
+            self._head += bytes(data[:HEADER_SAMPLE_BYTES - len(self._head)])
+        if self.digest is not None:
+            self.digest.update(data)
+        self._buf += data
+        self.bytes_written += n
+        while len(self._buf) >= self.part_bytes:
+            # release the views even if the upload fails, or _buf can never be resized again
+            with memoryview(self._buf) as mv, mv[:self.part_bytes] as part:
+                self._upload_part(part)
+            del self._buf[:self.part_bytes]
+        return n
+
+    def append_file(self, src: Path) -> int:
+        n = 0
+        with src.open("rb") as fh:
+            while True:
+                chunk = fh.read(SPILL_READ_BYTES)
+                if not chunk:
+                    break
+                n += self.write(chunk)
+        return n
+
+    def header_sample(self) -> bytes:
+        return bytes(self._head)
+
+    def close(self) -> None:
+        return
+
+    def publish(self) -> str:
+        if self._upload_id is None:
+            # smaller than one part: a single PUT (S3 verifies the running SHA-256 when there is one)
+            extra = {"ChecksumSHA256": self.digest.sha256_b64} if self.digest is not None else {}
+            self.s3.put_object(
+                Bucket=self.bucket, Key=self.key, Body=bytes(self._buf), ContentType=self.content_type, **extra
+            )
+        else:
+            if self._buf:
+                self._upload_part(self._buf)
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._buf = bytearray()
+        logging.debug("S3 PUBLISHED %s bytes=%s parts=%s", self.location, self.bytes_written, len(self._parts))
+        return self.location
+
+    def abort(self, discard: bool = False) -> None:
+        self._buf = bytearray()
+        if self._upload_id is None:
+            return
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        except Exception as e:
+            logging.warning("S3 MPU abort failed %s upload_id=%s err=%s", self.location, self._upload_id, e)
+        self._upload_id = None
+
+
+# ---------------------------
+# FACTORIES
+# ---------------------------
+class LocalSinkFactory:
+    name = "local"
+    supports_page_resume = True
+
+    def __init__(self, suffix: str = "") -> None:
+        # suffix: compression extension (".gz" / ".zst") appended to csv_<id>.csv
+        self.suffix = suffix
+
+    def location(self, year: int, company_id: str, year_dir: Path) -> str:
+        return str(year_dir / f"csv_{company_id}.csv{self.suffix}")
+
+    def open(
+        self, year: int, company_id: str, year_dir: Path, resume_bytes: int = 0, digest=None
+    ) -> LocalFileSink:
+        final_path = Path(self.location(year, company_id, year_dir))
+        return LocalFileSink(
+            tmp_path=final_path.with_name(final_path.name + ".part"),
+            final_path=final_path,
+            resume_bytes=resume_bytes,
+            digest=digest,
+        )
+
+
+class S3SinkFactory:
+    name = "s3"
+    supports_page_resume = False
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix_template: str = DEFAULT_S3_PREFIX,
+        part_mb: int = DEFAULT_S3_PART_MB,
+        max_pool_connections: int = 10,
+        suffix: str = "",
+        content_type: str = "text/csv",
+        s3=None,
+        endpoint_url: Optional[str] = None,
+    ) -> None:
+        """
+        endpoint_url: S3-compatible endpoint (MinIO, LocalStack); None => AWS.
+        """
+        self.bucket = bucket
+        self.prefix_template = prefix_template
+        self.part_bytes = part_mb * 1024 * 1024
+        self.suffix = suffix
+        self.content_type = content_type
+        self.s3 = s3 or boto3.client(
+            "s3", endpoint_url=endpoint_url, config=Config(max_pool_connections=max_pool_connections)
+        )
+
+    def key(self, year: int, company_id: str) -> str:
+        return f"{self.prefix_template.format(year=year)}csv_{company_id}.csv{self.suffix}"
+
+    def location(self, year: int, company_id: str, year_dir: Path) -> str:
+        return f"s3://{self.bucket}/{self.key(year, company_id)}"
+
+    def open(
+        self, year: int, company_id: str, year_dir: Path, resume_bytes: int = 0, digest=None
+    ) -> S3MultipartSink:
+        return S3MultipartSink(
+            self.s3,
+            self.bucket,
+            self.key(year, company_id),
+            part_bytes=self.part_bytes,
+            content_type=self.content_type,
+            digest=digest,
+        )
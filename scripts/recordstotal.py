@@ -25,6 +25,13 @@ from typing import Any, Dict, List, Optional, Tuple
 import pandas as pd
 import requests
 
+from openpayments_rate_limit import (
+    THROTTLE_STATUSES,
+    add_rate_limit_args,
+    configure_from_args,
+    get_rate_limiter,
+)
+
 
 # ---------------------------
 # CONFIG
@@ -90,6 +97,7 @@ def fetch_all_company_ids(
     limit: int = 100,
     country: str = "UNITED STATES",
     timeout: int = 60,
+    max_throttle_retries: int = 5,
 ) -> List[str]:
     base_params = {
         "keys": "true",
@@ -103,12 +111,21 @@ def fetch_all_company_ids(
 
     all_ids: List[str] = []
     offset = 0
+    limiter = get_rate_limiter()
+    throttled_attempts = 0
 
     while True:
         params = dict(base_params)
         params["offset"] = offset
 
+        limiter.acquire()
         r = session.get(FIRST_API_URL, params=params, timeout=timeout)
+        if r.status_code in THROTTLE_STATUSES and throttled_attempts < max_throttle_retries:
+            throttled_attempts += 1
+            limiter.on_throttle(r.status_code, penalty_s=2.0 * throttled_attempts)
+            continue
+        limiter.record(r.status_code)
+        throttled_attempts = 0
         r.raise_for_status()
         data = r.json()
 
@@ -193,10 +210,19 @@ def fetch_company_totals_by_year(
     Returns (company_id, totals_dict, error_message)
     """
     url = f"{COMPANY_API_BASE}/{company_id}"
+    limiter = get_rate_limiter()
 
     for attempt in range(1, max_retries + 1):
+        throttled = False
         try:
+            limiter.acquire()
             r = session.get(url, timeout=timeout)
+            if r.status_code in THROTTLE_STATUSES:
+                # the limiter pauses every worker, so no extra per-thread sleep below
+                throttled = True
+                limiter.on_throttle(r.status_code, penalty_s=backoff_base ** attempt)
+            else:
+                limiter.record(r.status_code)
             r.raise_for_status()
             payload = r.json()
             totals = extract_totals_by_year(payload, years)
@@ -205,7 +231,8 @@ def fetch_company_totals_by_year(
             msg = f"{type(e).__name__}: {e}"
             if attempt >= max_retries:
                 return company_id, {f"total_{y}": 0 for y in years}, msg
-            time.sleep(backoff_base ** attempt)
+            if not throttled:
+                time.sleep(backoff_base ** attempt)
 
     return company_id, {f"total_{y}": 0 for y in years}, "Unknown error"
 
@@ -222,9 +249,11 @@ def main() -> None:
     parser.add_argument("--max-year", type=int, default=2024, help="Max year column (default: 2024)")
     parser.add_argument("--out", default="openpayments_companies_totals_by_year.json", help="Output JSON path")
     parser.add_argument("--verbose", action="store_true", help="Verbose logs")
+    add_rate_limit_args(parser)
     args = parser.parse_args()
 
     setup_logging(args.verbose)
+    configure_from_args(args)
 
     years = list(range(args.min_year, args.max_year + 1))
     session = requests_session()
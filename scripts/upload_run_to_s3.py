@@ -1,10 +1,25 @@
 import argparse
 import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Dict, Iterable, Optional, Tuple
 
 import boto3
-from botocore.exceptions import ClientError
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from openpayments_checkpoint import MANIFEST_NAME, CheckpointManifest, JsonlAppender
+
+
+MB = 1024 * 1024
+PROGRESS_EVERY_S = 10.0
+LEDGER_NAME = "upload_ledger.jsonl"
+SHA256_METADATA_KEY = "sha256"  # x-amz-meta-sha256: hex digest of the whole local file
 
 
 def sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
@@ -15,6 +30,83 @@ def sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
     return h.hexdigest()
 
 
+class UploadLedger:
+    """
+    Append-only JSONL of completed uploads, one record per line, last record per
+    (bucket, key) wins:
+        {"bucket", "key", "sha256", "size", "etag", "ts"}
+    Lets re-runs skip files that are byte-identical to what was already uploaded
+    without asking S3.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._entries: Dict[Tuple[str, str], dict] = {}
+        self._log = JsonlAppender(path)
+
+    def load(self) -> "UploadLedger":
+        if not self.path.exists():
+            return self
+        with self.path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                    self._entries[(rec["bucket"], rec["key"])] = rec
+                except Exception:
+                    continue  # torn last line
+        return self
+
+    def get(self, bucket: str, key: str) -> Optional[dict]:
+        return self._entries.get((bucket, key))
+
+    def record(self, bucket: str, key: str, sha256: str, size: int, etag: str) -> None:
+        rec = {
+            "bucket": bucket,
+            "key": key,
+            "sha256": sha256,
+            "size": size,
+            "etag": etag,
+            "ts": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._entries[(bucket, key)] = rec
+        self._log.append(rec)
+
+    def close(self) -> None:
+        self._log.close()
+
+
+def load_download_checksums(base_dir: Path) -> Dict[Tuple[str, str], dict]:
+    """
+    (year folder, file name) -> finished company record carrying the SHA-256
+    the downloader computed while writing the file (download_manifest.jsonl).
+    """
+    manifest_path = base_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    known: Dict[Tuple[str, str], dict] = {}
+    for (year, _company_id), rec in CheckpointManifest(manifest_path).load().company_records().items():
+        if rec.get("ok") and rec.get("sha256") and rec.get("path"):
+            known[(str(year), Path(rec["path"]).name)] = rec
+    return known
+
+
+def trusted_sha256(rec: Optional[dict], path: Path) -> Optional[str]:
+    """
+    Downloader's checksum if the file is still the one it finished: same size,
+    not modified after the record was written.
+    """
+    if rec is None:
+        return None
+    st = path.stat()
+    try:
+        recorded_at = datetime.fromisoformat(rec["ts"]).timestamp()
+    except (KeyError, ValueError):
+        return None
+    if st.st_size != int(rec.get("bytes", -1)) or st.st_mtime > recorded_at + 1:
+        return None
+    return rec["sha256"]
+
+
 def iter_files(root: Path) -> Iterable[Path]:
     for p in root.rglob("*"):
         if p.is_file():
@@ -32,22 +124,107 @@ def upload_file(
     bucket: str,
     local_path: Path,
     key: str,
+    transfer_config: Optional[TransferConfig] = None,
+    sha256_hex: Optional[str] = None,
 ) -> None:
     extra_args = {}
 
+    if sha256_hex:
+        # S3 verifies SHA-256 checksums (x-amz-checksum-sha256) on arrival; the
+        # whole-file digest is kept as metadata for skip-if-unchanged checks
+        extra_args["ChecksumAlgorithm"] = "SHA256"
+        extra_args["Metadata"] = {SHA256_METADATA_KEY: sha256_hex}
+
     if local_path.suffix.lower() == ".csv":
         extra_args["ContentType"] = "text/csv"
     elif local_path.suffix.lower() == ".json":
         extra_args["ContentType"] = "application/json"
+    elif local_path.suffix.lower() == ".gz":
+        extra_args["ContentType"] = "application/gzip"
+    elif local_path.suffix.lower() == ".zst":
+        extra_args["ContentType"] = "application/zstd"
 
     s3_client.upload_file(
         Filename=str(local_path),
         Bucket=bucket,
         Key=key,
         ExtraArgs=extra_args if extra_args else None,
+        Config=transfer_config,
     )
 
 
+def head_object(s3_client, bucket: str, key: str) -> Optional[dict]:
+    try:
+        return s3_client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def unchanged_in_s3(
+    s3_client,
+    ledger: UploadLedger,
+    bucket: str,
+    key: str,
+    sha256_hex: str,
+    size: int,
+) -> str:
+    """
+    "" if the file must be uploaded, else how it was found unchanged:
+    - "ledger": same sha256/size recorded for this key by an earlier run (no S3 request)
+    - "s3": the object's x-amz-meta-sha256 matches (one HEAD; result is added to the ledger)
+    """
+    rec = ledger.get(bucket, key)
+    if rec is not None and rec.get("sha256") == sha256_hex and int(rec.get("size", -1)) == size:
+        return "ledger"
+
+    head = head_object(s3_client, bucket, key)
+    if head is None or head.get("ContentLength") != size:
+        return ""
+    if head.get("Metadata", {}).get(SHA256_METADATA_KEY) != sha256_hex:
+        return ""
+    ledger.record(bucket, key, sha256_hex, size, head.get("ETag", ""))
+    return "s3"
+
+
+def move_file(
+    s3_client,
+    bucket: str,
+    local_path: Path,
+    key: str,
+    transfer_config: TransferConfig,
+    ledger: UploadLedger,
+    force: bool = False,
+    known_sha256: Optional[str] = None,
+) -> Tuple[Path, int, str, Optional[Exception]]:
+    """
+    Hash (unless the downloader already did), upload unless unchanged, and
+    delete the local file only once S3 holds the same bytes.
+    Returns (local_path, bytes, status, error) with status "uploaded" or
+    "skipped_<ledger|s3>".
+    """
+    nbytes = local_path.stat().st_size
+    try:
+        digest = known_sha256 or sha256_file(local_path)
+        how = "" if force else unchanged_in_s3(s3_client, ledger, bucket, key, digest, nbytes)
+        if how:
+            status = f"skipped_{how}"
+        else:
+            upload_file(s3_client, bucket, local_path, key, transfer_config, sha256_hex=digest)
+            head = head_object(s3_client, bucket, key) or {}
+            ledger.record(bucket, key, digest, nbytes, head.get("ETag", ""))
+            status = "uploaded"
+    except (ClientError, BotoCoreError, S3UploadFailedError, OSError) as e:
+        return (local_path, nbytes, "failed", e)
+    local_path.unlink()  # 🔥 delete only after successful upload
+    return (local_path, nbytes, status, None)
+
+
+def fmt_rate(nbytes: int, seconds: float) -> str:
+    return f"{nbytes / MB:,.1f} MiB in {seconds:,.1f}s ({nbytes / MB / max(seconds, 1e-6):,.1f} MiB/s)"
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Upload Open Payments run outputs to S3 and delete local files.")
     parser.add_argument("--bucket", required=True)
@@ -55,14 +232,46 @@ def main() -> int:
     parser.add_argument("--years", nargs="+", default=["2023", "2024"])
     parser.add_argument("--totals-json", default="openpayments_companies_totals_by_year.json")
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--ledger",
+        default=LEDGER_NAME,
+        help=f"Upload ledger (JSONL) relative to --base-dir, used to skip unchanged files (default: {LEDGER_NAME})",
+    )
+    parser.add_argument("--force", action="store_true", help="Upload every file even if unchanged")
+    parser.add_argument("--workers", type=int, default=8, help="Files uploaded concurrently (default: 8)")
+    parser.add_argument(
+        "--per-file-concurrency",
+        type=int,
+        default=4,
+        help="Concurrent multipart part uploads per file (default: 4)",
+    )
+    parser.add_argument("--multipart-chunk-mb", type=int, default=16, help="Multipart part size in MiB (default: 16)")
+    parser.add_argument(
+        "--multipart-threshold-mb",
+        type=int,
+        default=16,
+        help="Files larger than this use multipart upload (default: 16)",
+    )
 
     args = parser.parse_args()
 
     bucket = args.bucket
     base_dir = Path(args.base_dir).resolve()
     totals_path = base_dir / args.totals_json
+    ledger = UploadLedger(base_dir / args.ledger).load()
+    download_checksums = load_download_checksums(base_dir)
+    workers = max(1, args.workers)
+    per_file = max(1, args.per_file_concurrency)
 
-    s3 = boto3.client("s3")
+    # one client (thread-safe) shared by every file worker and its part threads;
+    # pool sized so no worker waits for a connection
+    s3 = boto3.client("s3", config=Config(max_pool_connections=workers * per_file + workers))
+    transfer_config = TransferConfig(
+        multipart_threshold=args.multipart_threshold_mb * MB,
+        multipart_chunksize=args.multipart_chunk_mb * MB,
+        max_concurrency=per_file,
+        use_threads=per_file > 1,
+    )
 
     print("Skipping HeadBucket check; proceeding with uploads using PutObject permissions.")
 
@@ -87,21 +296,66 @@ def main() -> int:
     print(f"Bucket:   {bucket}")
     print(f"Files to move: {len(uploads)}")
 
-    for local_path, key in uploads:
-        if args.dry_run:
+    if args.dry_run:
+        for local_path, key in uploads:
             print(f"[DRY RUN] {local_path} -> s3://{bucket}/{key}")
-            continue
+        print("Upload & cleanup complete.")
+        return 0
+
+    # largest first, so the long uploads do not start last
+    uploads.sort(key=lambda u: u[0].stat().st_size, reverse=True)
+    known = {
+        local_path: trusted_sha256(download_checksums.get((local_path.parent.name, local_path.name)), local_path)
+        for local_path, _key in uploads
+    }
+    print(f"[INFO] Checksums from {MANIFEST_NAME}: {sum(1 for v in known.values() if v)}/{len(uploads)} files")
+    total_bytes = sum(p.stat().st_size for p, _ in uploads)
+    print(
+        f"Workers: {workers} files x {per_file} parts | chunk={args.multipart_chunk_mb} MiB "
+        f"| total={total_bytes / MB:,.1f} MiB"
+    )
+
+    started = time.monotonic()
+    last_report = started
+    done_files = 0
+    done_bytes = 0
+    failed = 0
+    skipped = 0
+
+    # files without a downloader checksum are hashed in the same workers
+    # (hashlib releases the GIL), streaming 1 MiB at a time
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as ex:
+        futs = [
+            ex.submit(move_file, s3, bucket, local_path, key, transfer_config, ledger, args.force, known[local_path])
+            for local_path, key in uploads
+        ]
+        for fut in as_completed(futs):
+            local_path, nbytes, status, err = fut.result()
+            done_files += 1
+            if err is not None:
+                failed += 1
+                print(f"[ERROR] Failed upload, file NOT deleted: {local_path}")
+                print(err)
+                continue
 
-        try:
-            upload_file(s3, bucket, local_path, key)
-            local_path.unlink()  # 🔥 delete only after successful upload
+            if status.startswith("skipped_"):
+                skipped += 1
+                print(f"[SKIP] Unchanged in S3 ({status[len('skipped_'):]}), deleted: {local_path}")
+                continue
+
+            done_bytes += nbytes
             print(f"[OK] Uploaded & deleted: {local_path}")
 
-        except ClientError as e:
-            print(f"[ERROR] Failed upload, file NOT deleted: {local_path}")
-            print(e)
-            continue
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_EVERY_S:
+                last_report = now
+                print(f"[INFO] {done_files}/{len(uploads)} files | {fmt_rate(done_bytes, now - started)}")
 
+    ledger.close()
+    print(
+        f"[INFO] Uploaded {done_files - failed - skipped}/{len(uploads)} files, skipped unchanged {skipped}, "
+        f"failed {failed} | {fmt_rate(done_bytes, time.monotonic() - started)}"
+    )
     print("Upload & cleanup complete.")
     return 0
 
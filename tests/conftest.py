@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the pipeline modules are flat scripts, imported the way the scripts import each other
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
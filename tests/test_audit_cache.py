@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("boto3")
+
+from audit_raw_csv_schema import audit_signature, error_row, load_audit_cache, save_audit_cache
+from openpayments_schema import schema_for_year
+
+SCHEMA = schema_for_year(2023)
+
+
+def row(key, etag, error=""):
+    r = error_row("2023", key, SCHEMA, error)
+    r.etag = etag
+    return r
+
+
+def test_signature_tracks_settings():
+    base = audit_signature(["2023"], mode="head", head_kb=512)
+    assert base == audit_signature(["2023"], head_kb=512, mode="head")
+    assert base != audit_signature(["2023"], mode="head", head_kb=1024)
+    assert base != audit_signature(["2023", "2024"], mode="head", head_kb=512)
+
+
+def test_cache_round_trip_skips_failures(tmp_path):
+    path = str(tmp_path / "audit_cache.json")
+    sig = audit_signature(["2023"], mode="head")
+    rows = [row("a.csv", '"e1"'), row("b.csv", ""), row("c.csv", '"e3"', "ERROR timeout")]
+    save_audit_cache(path, sig, rows, issues={"a.csv": [{"kind": "x"}]})
+
+    cache = load_audit_cache(path, sig)
+    assert set(cache) == {"a.csv"}
+    assert cache["a.csv"]["etag"] == '"e1"'
+    assert cache["a.csv"]["row"]["s3_key"] == "a.csv"
+    assert cache["a.csv"]["issues"] == [{"kind": "x"}]
+
+
+def test_cache_invalidated_by_signature_or_corruption(tmp_path, capsys):
+    path = tmp_path / "audit_cache.json"
+    assert load_audit_cache(str(path), "sig") == {}
+    save_audit_cache(str(path), "old", [row("a.csv", '"e1"')])
+    assert load_audit_cache(str(path), "new") == {}
+    assert "settings changed" in capsys.readouterr().out
+    path.write_text("{not json", encoding="utf-8")
+    assert load_audit_cache(str(path), "old") == {}
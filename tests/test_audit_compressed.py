@@ -0,0 +1,96 @@
+import gzip
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+pytest.importorskip("pandas")
+
+import audit_raw_csv_schema as audit
+from openpayments_schema import schema_for_year
+
+BUCKET = "raw-bucket"
+YEAR = "2023"
+
+
+def csv_bytes(rows: int = 200) -> bytes:
+    names = schema_for_year(YEAR).names
+    lines = [",".join(names)] + [",".join(["x"] * len(names)) for _ in range(rows)]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def put(s3, key: str, body: bytes) -> dict:
+    s3.put_object(Bucket=BUCKET, Key=key, Body=body)
+    return {"Key": key, "Size": len(body)}
+
+
+def compressed_objects(s3):
+    plain = csv_bytes()
+    objs = {"gz": put(s3, "raw/year=2023/csv_A.csv.gz", gzip.compress(plain))}
+    try:
+        import zstandard
+    except ImportError:
+        return plain, objs
+    objs["zst"] = put(s3, "raw/year=2023/csv_B.csv.zst", zstandard.ZstdCompressor().compress(plain))
+    return plain, objs
+
+
+def test_head_audit_of_compressed_objects(s3):
+    _, objs = compressed_objects(s3)
+    for obj in objs.values():
+        row = audit.audit_one_file(
+            s3, BUCKET, obj["Key"], YEAR, schema_for_year(YEAR), head_bytes=1 << 20, sample_rows=50,
+            size_bytes=obj["Size"], range_samples=3, range_bytes=64,
+        )
+        assert row.header_match == "YES", obj["Key"]
+        assert row.sample_parse_error == ""
+        assert row.sample_lines_checked == 50
+        assert row.sample_bad_line_count == 0
+        assert row.range_samples_checked == 0  # ranged reads need plain CSV
+
+
+def test_head_audit_of_gzip_cut_by_head_bytes(s3):
+    body = gzip.compress(csv_bytes(5000), compresslevel=1)
+    obj = put(s3, "raw/year=2023/csv_C.csv.gz", body)
+    row = audit.audit_one_file(
+        s3, BUCKET, obj["Key"], YEAR, schema_for_year(YEAR), head_bytes=4096, sample_rows=100000,
+        size_bytes=obj["Size"], first_range=1024,
+    )
+    assert row.sample_parse_error == ""
+    assert row.sample_bad_line_count == 0
+    assert 0 < row.sample_lines_checked < 5000
+
+
+def test_full_scan_and_profile_of_compressed_objects(s3, monkeypatch):
+    plain, objs = compressed_objects(s3)
+    monkeypatch.setattr(audit, "_worker_s3", s3)
+    for obj in objs.values():
+        row, issues = audit.full_scan_one_file(BUCKET, YEAR, obj, max_issues=10, max_record_bytes=1 << 20)
+        assert row.scan_error == ""
+        assert row.records == 200
+        assert row.header_match == "YES"
+        assert issues == []
+
+        _, _, profiles, error = audit.profile_one_file(BUCKET, YEAR, obj, chunk_rows=64)
+        assert error == ""
+        assert max(p.rows for p in profiles.values()) == 200
+
+
+def test_print_keys_lists_and_truncates(capsys):
+    audit.print_keys("Skipped 0 objects", [])
+    assert capsys.readouterr().out == ""
+    keys = [f"k{i}" for i in range(audit.LISTED_KEYS_MAX + 2)]
+    audit.print_keys("Skipped", keys)
+    out = capsys.readouterr().out
+    assert "k0" in out and "... and 2 more" in out
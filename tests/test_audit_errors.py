@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from botocore.exceptions import EndpointConnectionError
+
+import audit_raw_csv_schema as audit
+from openpayments_schema import schema_for_year
+
+YEAR = "2023"
+NAMES = schema_for_year(YEAR).names
+
+
+class StubS3:
+    """
+    Serves ranged GETs of one body; ranges starting at or after fail_from raise.
+    """
+
+    def __init__(self, body: bytes, fail_from: int = 0) -> None:
+        self.body = body
+        self.fail_from = fail_from
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = (int(x) for x in Range[len("bytes="):].split("-"))
+        if start >= self.fail_from:
+            raise EndpointConnectionError(endpoint_url="https://s3.example")
+        end = min(end, len(self.body) - 1)
+        return {
+            "Body": io.BytesIO(self.body[start:end + 1]),
+            "ContentRange": f"bytes {start}-{end}/{len(self.body)}",
+        }
+
+
+def body(rows: int = 2000) -> bytes:
+    lines = [",".join(NAMES)] + [",".join(["x"] * len(NAMES)) for _ in range(rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def targets(*keys, size=None):
+    return [(YEAR, {"Key": k, "Size": size, "ETag": '"e"'}) for k in keys]
+
+
+def test_connection_error_becomes_an_error_row():
+    rows = audit.audit_objects(StubS3(body(), fail_from=0), "b", targets("a.csv", "b.csv"), 1 << 20, 10, workers=2)
+    assert [r.s3_key for r in rows] == ["a.csv", "b.csv"]
+    assert all(r.sample_parse_error.startswith("ERROR") for r in rows)
+    assert all(r.etag == "e" for r in rows)
+
+
+def test_failed_range_sample_keeps_the_head_results():
+    data = body()
+    s3 = StubS3(data, fail_from=8 * 1024)
+    rows = audit.audit_objects(
+        s3, "b", targets("a.csv", size=len(data)), head_bytes=1 << 20, sample_rows=5, workers=1,
+        first_range=4096, range_samples=3, range_bytes=1024,
+    )
+    (row,) = rows
+    assert row.header_match == "YES"
+    assert row.sample_lines_checked == 5
+    assert row.sample_parse_error.startswith("ERROR: range sample failed")
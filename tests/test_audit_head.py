@@ -0,0 +1,53 @@
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from audit_raw_csv_schema import S3HeadStream, total_size_from_content_range
+
+BUCKET = "raw-bucket"
+BODY = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        client.put_object(Bucket=BUCKET, Key="k.csv", Body=BODY)
+        yield client
+
+
+def test_total_size_from_content_range():
+    assert total_size_from_content_range("bytes 0-1048575/73400320") == 73400320
+    assert total_size_from_content_range("bytes 0-9/*") is None
+    assert total_size_from_content_range("") is None
+
+
+def test_head_stream_doubles_ranges_and_stops_at_max(s3):
+    stream = S3HeadStream(s3, BUCKET, "k.csv", max_bytes=7000, first_range=1000)
+    assert stream.requests == 0  # nothing fetched until read
+    data = stream.read()
+    assert data == BODY[:7000]
+    # 1000 + 2000 + 4000 bytes
+    assert stream.requests == 3
+    assert stream.size_bytes == len(BODY)
+    assert stream.bytes_read == 7000 and stream.capped
+    stream.close()
+
+
+def test_head_stream_whole_small_object(s3):
+    stream = S3HeadStream(s3, BUCKET, "k.csv", max_bytes=1 << 20, first_range=4096)
+    assert stream.read() == BODY
+    assert stream.requests == 2  # 4096 + 6144 (clamped to the object size after the first response)
+    assert not stream.capped
+    stream.close()
+
+
+def test_head_stream_close_mid_range(s3):
+    stream = S3HeadStream(s3, BUCKET, "k.csv", max_bytes=1 << 20, first_range=8192, size_bytes=len(BODY))
+    assert stream.read(10) == BODY[:10]
+    stream.close()
+    assert stream.closed and stream.requests == 1
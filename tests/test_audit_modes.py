@@ -0,0 +1,56 @@
+import sys
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import audit_raw_csv_schema as audit
+from openpayments_schema import schema_for_year
+
+BUCKET = "raw-bucket"
+YEAR = "2023"
+KEY = "raw/year=2023/csv_A.csv"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        names = schema_for_year(YEAR).names
+        client.put_object(Bucket=BUCKET, Key=KEY, Body=(",".join(names) + "\n").encode())
+        yield client
+
+
+def run(monkeypatch, *extra):
+    monkeypatch.setattr(sys, "argv", ["audit_raw_csv_schema.py", "--bucket", BUCKET, "--years", YEAR, *extra])
+    assert audit.main() == 0
+
+
+def test_sampling_run_leaves_the_full_scan_cache_usable(s3, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    caches = []
+
+    def full_scan_objects(bucket, targets, workers, cache, max_issues, max_record_bytes):
+        # stands in for the process pool (moto does not reach other processes)
+        caches.append(dict(cache))
+        row = audit.FullScanRow(
+            year=YEAR, s3_key=KEY, size_bytes=1, header_col_count=0, expected_col_count=0, header_match="YES",
+            missing_columns="", extra_columns="", records=0, column_mismatch_records=0, unbalanced_quote_records=0,
+            encoding_error_records=0, first_issue_offset=-1, scan_error="", scan_seconds=0.0, etag='"e1"',
+        )
+        return [row], {}
+
+    monkeypatch.setattr(audit, "full_scan_objects", full_scan_objects)
+    run(monkeypatch, "--full-scan")
+    run(monkeypatch)
+    run(monkeypatch, "--full-scan")
+
+    assert caches[0] == {}
+    assert set(caches[1]) == {KEY}
+    assert (tmp_path / audit.DEFAULT_AUDIT_CACHE).exists()
+    assert (tmp_path / audit.DEFAULT_FULL_SCAN_CACHE).exists()
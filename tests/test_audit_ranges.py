@@ -0,0 +1,18 @@
+import pytest
+
+pytest.importorskip("boto3")
+
+from audit_raw_csv_schema import sample_offsets
+
+
+def test_sample_offsets_evenly_spaced():
+    assert sample_offsets(1000, 3, 0, 100) == [250, 500, 750]
+
+
+def test_sample_offsets_skip_head_tail_and_overlap():
+    # 250 is inside the head, 750 + 300 runs past the end
+    assert sample_offsets(1000, 3, 300, 300) == [500]
+    # ranges never overlap the previous one
+    assert sample_offsets(1000, 9, 0, 250) == [100, 400, 700]
+    assert sample_offsets(100, 4, 0, 500) == []
+    assert sample_offsets(1000, 0, 0, 10) == []
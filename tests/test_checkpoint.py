@@ -0,0 +1,127 @@
+import json
+
+from openpayments_checkpoint import CheckpointManifest
+
+
+def manifest(tmp_path):
+    return CheckpointManifest(tmp_path / "download_manifest.jsonl")
+
+
+def test_round_trip_last_record_wins(tmp_path):
+    m = manifest(tmp_path)
+    m.record_page(2023, "A1", 0, 0, 1, 10, 100)
+    m.record_page(2023, "A1", 0, 0, 1, 12, 120)
+    m.record_company(2023, "A1", 12, True, "ok", 12, 120, "/x/csv_A1.csv", checksums={"sha256": "ab"})
+    m.close()
+
+    loaded = manifest(tmp_path).load()
+    assert loaded._state[(2023, "A1")].pages == {0: (1, 12, 120)}
+    rec = loaded.company_record(2023, "A1")
+    assert rec["ok"] and rec["sha256"] == "ab"
+    assert set(loaded.company_records()) == {(2023, "A1")}
+
+
+def test_reset_forgets_pages(tmp_path):
+    m = manifest(tmp_path)
+    m.record_page(2023, "A1", 0, 0, 1, 10, 100)
+    m.record_reset(2023, "A1")
+    m.close()
+    assert manifest(tmp_path).load()._state[(2023, "A1")].pages == {}
+
+
+def test_torn_last_line_is_ignored_and_next_append_survives(tmp_path):
+    m = manifest(tmp_path)
+    m.record_page(2023, "A1", 0, 0, 1, 10, 100)
+    m.close()
+    with m.path.open("a", encoding="utf-8") as fh:
+        fh.write('{"type":"page","year":2023,"company_id":"A1","pa')  # crash mid-append
+
+    resumed = manifest(tmp_path).load()
+    assert resumed._state[(2023, "A1")].pages == {0: (1, 10, 100)}
+    resumed.record_page(2023, "A1", 1, 10, 0, 10, 90)
+    resumed.close()
+
+    lines = m.path.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["page"] == 1
+    assert manifest(tmp_path).load()._state[(2023, "A1")].pages == {0: (1, 10, 100), 1: (0, 10, 90)}
+
+
+def test_completed_page_checks_part_size(tmp_path):
+    m = manifest(tmp_path)
+    part = tmp_path / "part_000000.csv"
+    part.write_bytes(b"x" * 100)
+    m.record_page(2023, "A1", 0, 0, 1, 10, 100)
+    m.record_page(2023, "A1", 1, 10, 0, 0, 0)
+    m.close()
+    m = manifest(tmp_path).load()
+    assert m.completed_page(2023, "A1", 0, part) == (1, 10, 100)
+    assert m.completed_page(2023, "A1", 1, tmp_path / "missing") == (0, 0, 0)  # empty page: no file
+    part.write_bytes(b"x" * 99)
+    assert m.completed_page(2023, "A1", 0, part) is None
+    assert m.completed_page(2023, "A1", 2, part) is None
+
+
+def test_committed_prefix_after_truncation(tmp_path):
+    m = manifest(tmp_path)
+    tmp = tmp_path / "csv_A1.csv.part"
+    for i, nbytes in enumerate([100, 50, 50, 80]):
+        m.record_page(2023, "A1", i, i * 10, int(i == 0), 10, nbytes)
+    m.close()
+    m = manifest(tmp_path).load()
+
+    tmp.write_bytes(b"x" * 280)
+    assert list(m.committed_prefix(2023, "A1", tmp)) == [0, 1, 2, 3]
+    # crash mid page 2: only whole pages in order count
+    tmp.write_bytes(b"x" * 170)
+    assert list(m.committed_prefix(2023, "A1", tmp)) == [0, 1]
+    tmp.write_bytes(b"")
+    assert m.committed_prefix(2023, "A1", tmp) == {}
+    tmp.unlink()
+    assert m.committed_prefix(2023, "A1", tmp) == {}
+
+
+def test_committed_prefix_stops_at_a_missing_page(tmp_path):
+    m = manifest(tmp_path)
+    tmp = tmp_path / "csv_A1.csv.part"
+    tmp.write_bytes(b"x" * 1000)
+    m.record_page(2023, "A1", 0, 0, 1, 10, 100)
+    m.record_page(2023, "A1", 2, 20, 0, 10, 100)
+    m.close()
+    m = manifest(tmp_path).load()
+    assert list(m.committed_prefix(2023, "A1", tmp)) == [0]
+
+
+def test_is_company_done(tmp_path):
+    m = manifest(tmp_path)
+    final = tmp_path / "csv_A1.csv"
+    final.write_bytes(b"x" * 10)
+    m.record_company(2023, "A1", 1, True, "ok", 1, 10, str(final))
+    m.record_company(2023, "B2", 1, True, "ok", 1, 10, "s3://b/raw/csv_B2.csv")
+    m.record_company(2023, "C3", 1, False, "failed", 0, 0, None)
+    assert m.is_company_done(2023, "A1", str(final))
+    assert m.is_company_done(2023, "B2", "s3://b/raw/csv_B2.csv")
+    assert not m.is_company_done(2023, "B2", "s3://other/raw/csv_B2.csv")
+    assert not m.is_company_done(2023, "C3", str(tmp_path / "csv_C3.csv"))
+    final.write_bytes(b"x" * 9)
+    assert not m.is_company_done(2023, "A1", str(final))
+
+
+def test_jsonl_appender_torn_tail_and_threads(tmp_path):
+    import threading
+
+    from openpayments_checkpoint import JsonlAppender
+
+    path = tmp_path / "sub" / "log.jsonl"
+    path.parent.mkdir()
+    path.write_text('{"n": -1}\n{"n": ', encoding="utf-8")
+    log = JsonlAppender(path)
+    threads = [threading.Thread(target=lambda i=i: [log.append({"n": i * 100 + j}) for j in range(50)]) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    log.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[:2] == ['{"n": -1}', '{"n": ']
+    assert sorted(json.loads(line)["n"] for line in lines[2:]) == sorted(i * 100 + j for i in range(4) for j in range(50))
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+from openpayments_column_profile import (
+    PROFILE_FIELDS,
+    ColumnProfile,
+    HyperLogLog,
+    merge_profiles,
+    profile_chunk,
+)
+
+
+def hashes(values):
+    return pd.util.hash_pandas_object(pd.Series(values, dtype=object), index=False).to_numpy()
+
+
+def test_hll_estimate_within_error():
+    hll = HyperLogLog()
+    hll.add_hashes(hashes([f"v{i}" for i in range(100_000)]))
+    assert abs(hll.estimate() - 100_000) / 100_000 < 0.03
+
+
+def test_hll_small_range_and_duplicates():
+    hll = HyperLogLog()
+    assert hll.estimate() == 0
+    hll.add_hashes(np.array([], dtype=np.uint64))
+    assert hll.estimate() == 0
+    hll.add_hashes(hashes([f"v{i % 50}" for i in range(5000)]))
+    assert hll.estimate() == 50
+
+
+def test_hll_merge_equals_union():
+    a, b, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    left = [f"v{i}" for i in range(0, 30_000)]
+    right = [f"v{i}" for i in range(20_000, 50_000)]
+    a.add_hashes(hashes(left))
+    b.add_hashes(hashes(right))
+    union.add_hashes(hashes(left + right))
+    a.merge(b)
+    assert np.array_equal(a.registers, union.registers)
+    assert a.estimate() == union.estimate()
+
+
+def test_column_profile_stats():
+    prof = ColumnProfile("Total_Amount_of_Payment_USDollars")
+    prof.update(pd.Series(["10.5", " 3 ", "", None, "abc"]))
+    row = prof.to_row()
+    assert list(row) == PROFILE_FIELDS
+    assert row["rows"] == 5
+    assert row["null_rate"] == "0.400000"
+    assert row["distinct_estimate"] == 3
+    assert row["min_value"] == "10.5" and row["max_value"] == "abc"
+    assert row["max_length"] == 4
+    assert row["numeric_fail_rate"] == "0.333333"
+    assert row["numeric_min"] == 3.0 and row["numeric_max"] == 10.5
+    assert row["date_fail_rate"] == "" and row["date_min"] == ""
+
+
+def test_date_column_profile():
+    prof = ColumnProfile("Date_of_Payment")
+    prof.update(pd.Series(["01/15/2023", "12/31/2022", "2023-01-01"]))
+    row = prof.to_row()
+    assert row["date_fail_rate"] == "0.333333"
+    assert row["date_min"] == "2022-12-31"
+    assert row["date_max"] == "2023-01-15"
+
+
+def test_all_null_column():
+    prof = ColumnProfile("Note")
+    prof.update(pd.Series(["", "  ", None]))
+    row = prof.to_row()
+    assert row["null_rate"] == "1.000000"
+    assert row["distinct_estimate"] == 0
+    assert row["numeric_fail_rate"] == "" and row["numeric_min"] == ""
+
+
+def test_merged_chunks_match_single_pass():
+    df = pd.DataFrame({
+        "Record_ID": [str(i) for i in range(1000)],
+        "Date_of_Payment": [f"{1 + i % 12:02d}/01/2023" for i in range(1000)],
+    })
+    whole = {}
+    profile_chunk(whole, df)
+
+    first, second = {}, {}
+    profile_chunk(first, df.iloc[:400])
+    profile_chunk(second, df.iloc[400:])
+    merged = {}
+    merge_profiles(merged, first)
+    merge_profiles(merged, second)
+
+    assert merged.keys() == whole.keys()
+    for name in whole:
+        assert merged[name].to_row() == whole[name].to_row()
+    # merge_profiles copies, so the inputs are left untouched
+    assert first["Record_ID"].rows == 400
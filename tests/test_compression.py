@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+from openpayments_compression import Compression
+
+PAGES = [b"a,b\r\n1,2\r\n", b"3,4\r\n" * 1000, b"5,6\r\n"]
+
+
+def codecs():
+    out = [Compression("gzip")]
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return out
+    return out + [Compression("zstd")]
+
+
+def compress_pages(comp, pages):
+    out = []
+    for page in pages:
+        c = comp.compressor()
+        # fed in pieces, as pages stream in
+        out.append(b"".join(c.compress(page[i:i + 7]) for i in range(0, len(page), 7)) + c.flush())
+    return b"".join(out)
+
+
+def test_plain_passthrough(tmp_path):
+    comp = Compression()
+    assert not comp.enabled and comp.suffix == "" and comp.compressor() is None
+    assert comp.decompress_head(b"abc") == b"abc"
+    path = tmp_path / "csv_1.csv"
+    path.write_bytes(b"x")
+    with comp.open_reader(path) as f:
+        assert f.read() == b"x"
+
+
+@pytest.mark.parametrize("comp", codecs(), ids=lambda c: c.codec)
+def test_concatenated_pages_read_back(tmp_path, comp):
+    data = compress_pages(comp, PAGES)
+    path = tmp_path / f"csv_1.csv{comp.suffix}"
+    path.write_bytes(data)
+    assert Compression.for_path(path) == Compression(comp.codec)
+    with comp.open_reader(path) as f:
+        assert f.read() == b"".join(PAGES)
+    with comp.stream_reader(io.BytesIO(data)) as f:
+        assert f.read() == b"".join(PAGES)
+
+
+@pytest.mark.parametrize("comp", codecs(), ids=lambda c: c.codec)
+def test_decompress_head_of_truncated_sample(comp):
+    data = compress_pages(comp, PAGES)
+    head = comp.decompress_head(data[:40], max_bytes=8)
+    assert b"".join(PAGES).startswith(head)
+    assert len(head) <= 8
+
+
+def test_for_path_and_content_types():
+    assert Compression.for_path("x/csv_1.csv.gz").content_type == "application/gzip"
+    assert Compression.for_path("x/csv_1.csv.zst").suffix == ".zst"
+    assert Compression.for_path("x/csv_1.csv") == Compression()
@@ -0,0 +1,95 @@
+import io
+
+import pytest
+
+from openpayments_csv_scan import CsvRecordScanner
+from openpayments_page_writer import PageStreamWriter
+
+
+def scan(chunks):
+    s = CsvRecordScanner()
+    done = sum(s.feed(c) for c in chunks)
+    return s, done
+
+
+def split_every(data: bytes, n: int):
+    return [data[i:i + n] for i in range(0, len(data), n)]
+
+
+def test_plain_records():
+    s, done = scan([b"a,b\nc,d\n", b"e,f"])
+    assert done == 2
+    assert s.records == 2
+    assert s.last_boundary == 8
+    assert not s.in_quotes
+
+
+def test_newline_inside_quotes_is_not_a_record():
+    s, done = scan([b'1,"x\ny",2\n3,4\n'])
+    assert done == 2
+    assert s.last_boundary == 14
+
+
+def test_quoted_field_split_across_chunks():
+    data = b'1,"a\n""b""\nc",2\n3,"d"\n'
+    for n in range(1, len(data) + 1):
+        s, done = scan(split_every(data, n))
+        assert done == 2, n
+        assert s.last_boundary == len(data)
+        assert not s.in_quotes
+
+
+def test_open_quote_at_end_of_chunk():
+    s = CsvRecordScanner()
+    assert s.feed(b'1,"abc\n') == 0
+    assert s.in_quotes
+    assert s.feed(b'def",2\n') == 1
+    assert not s.in_quotes
+
+
+@pytest.mark.parametrize("data", [b"a\n\nb\n", b"a\r\n\r\nb\r\n", b"\na\nb\n", b"a\nb\n\n\n"])
+def test_blank_records_are_not_counted(data):
+    for n in range(1, len(data) + 1):
+        s, done = scan(split_every(data, n))
+        assert done == 2, n
+        assert s.blank_records == data.count(b"\n") - 2
+
+
+def test_blank_line_inside_quotes_is_data():
+    s, done = scan([b'1,"x\n\ny"\n'])
+    assert done == 1
+    assert s.blank_records == 0
+
+
+def write_page(chunks):
+    out = io.BytesIO()
+    w = PageStreamWriter(out, write_header=True)
+    for c in chunks:
+        w.feed(c)
+    lines = w.close()
+    return out.getvalue(), lines
+
+
+def test_page_writer_drops_blank_lines():
+    page = b'h1,h2\r\n1,"a\r\n\r\nb"\r\n\r\n2,x\r\n\r\n'
+    expected = b'\xef\xbb\xbfh1,h2\r\n1,"a\r\n\r\nb"\r\n2,x\r\n'
+    for n in range(1, len(page) + 1):
+        out, lines = write_page(split_every(page, n))
+        assert out == expected, n
+        assert lines == (1, 2)
+
+
+def test_page_writer_drops_trailing_cr_and_partial_quoted_record():
+    out, lines = write_page([b"h\n1\n\r"])
+    assert out.endswith(b"h\n1\n")
+    assert lines == (1, 1)
+
+    out, lines = write_page([b'h\n1\n2,"open'])
+    assert out.endswith(b"h\n1\n")
+    assert lines == (1, 1)
+
+
+def test_page_writer_terminates_last_record():
+    out, lines = write_page([b"h\n1\n2"])
+    assert out.endswith(b"h\n1\n2\n")
+    assert lines == (1, 2)
@@ -0,0 +1,67 @@
+from openpayments_csv_validate import (
+    COLUMN_MISMATCH,
+    ENCODING_ERROR,
+    UNBALANCED_QUOTE,
+    CsvStreamValidator,
+    count_fields,
+    resync_offset,
+)
+
+
+def validate(data: bytes, chunk: int = 7, **kwargs) -> CsvStreamValidator:
+    v = CsvStreamValidator(**kwargs)
+    for i in range(0, len(data), chunk):
+        v.feed(data[i:i + chunk])
+    v.finish()
+    return v
+
+
+def test_count_fields():
+    assert count_fields(b"a,b,c\n") == 3
+    assert count_fields(b'a,"b,c",d\n') == 3
+    assert count_fields(b'"a ""x,y""",b\n') == 2
+
+
+def test_clean_file():
+    v = validate(b'a,b\n1,"x\ny"\n2,3\n')
+    assert v.header == ["a", "b"]
+    assert v.records == 2
+    assert v.issue_count == 0
+
+
+def test_last_record_closing_quote_across_lines_at_eof():
+    # the quote opened on an earlier line closes on the last, unterminated one
+    v = validate(b'a,b\n1,"x\ny"')
+    assert v.records == 1
+    assert v.unbalanced_quotes == 0
+    assert v.issue_count == 0
+
+
+def test_open_quote_at_eof():
+    v = validate(b'a,b\n1,"x\ny')
+    assert v.unbalanced_quotes == 1
+    assert v.issues[0]["kind"] == UNBALANCED_QUOTE
+
+    v = validate(b'a,b\n1,"xy')
+    assert v.unbalanced_quotes == 1
+
+
+def test_column_mismatch_and_encoding():
+    v = validate(b"a,b\n1\n2,\xff\n")
+    assert v.column_mismatches == 1
+    assert v.encoding_errors == 1
+    kinds = [i["kind"] for i in v.issues]
+    assert kinds == [COLUMN_MISMATCH, ENCODING_ERROR]
+    assert v.issues[1]["offset"] == 8
+
+
+def test_runaway_quote_resyncs():
+    data = b'a,b\n1,"oops\n' + b"2,3\n" * 50
+    v = validate(data, max_record_bytes=32)
+    assert v.unbalanced_quotes == 1
+    assert v.records > 40
+
+
+def test_resync_offset():
+    data = b'tail of "x\ny",z\n1,2\n3,4\n5,6\n'
+    assert resync_offset(data, 2) == data.index(b"1,2")
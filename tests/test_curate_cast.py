@@ -0,0 +1,53 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from curate_to_parquet import cast_column, curate_batch
+
+
+def cast(values, typ):
+    arr, failed = cast_column(pa.array(values, pa.string()), typ)
+    return arr.to_pylist(), failed
+
+
+def test_int_leading_plus_and_blanks():
+    assert cast(["+5", "-7", " 12 ", "", "+", "+-5", "1.0"], pa.int64()) == (
+        [5, -7, 12, None, None, None, None],
+        3,
+    )
+
+
+def test_int32_overflow_becomes_null():
+    values, failed = cast(["2147483647", "2147483648", "-2147483649", "99999999999", "+2023"], pa.int32())
+    assert values == [2147483647, None, None, None, 2023]
+    assert failed == 3
+
+
+def test_int64_digit_bound():
+    assert cast(["9" * 18, "9" * 19], pa.int64()) == ([int("9" * 18), None], 1)
+
+
+def test_decimal_leading_plus():
+    values, failed = cast(["+5.10", "-0.5", "12.345", "abc"], pa.decimal128(14, 2))
+    assert [str(v) if v is not None else None for v in values] == ["5.10", "-0.50", None, None]
+    assert failed == 2
+
+
+def test_date():
+    values, failed = cast(["01/31/2023", "2023-01-31"], pa.date32())
+    assert str(values[0]) == "2023-01-31"
+    assert values[1] is None
+    assert failed == 1
+
+
+def test_curate_batch_counts_failures_per_column():
+    target = pa.schema([pa.field("n", pa.int32()), pa.field("amt", pa.decimal128(14, 2)), pa.field("gone", pa.string())])
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array(["+1", "99999999999"]), pa.array(["+5.10", "x"])], names=["n", "amt"]
+    )
+    failures, required_nulls = {}, {}
+    out = curate_batch(batch, target, (0, 1, -1), frozenset({0}), failures, required_nulls)
+    assert out.column(0).to_pylist() == [1, None]
+    assert failures == {"n": 1, "amt": 1}
+    assert required_nulls == {"n": 1}
+    assert out.column(2).null_count == 2
@@ -0,0 +1,64 @@
+import csv
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from curate_to_parquet import curate_file
+from openpayments_schema import schema_for_year
+
+YEAR = "2023"
+
+
+def write_csv(path, header, rows):
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+
+def sample_row(names):
+    row = []
+    for name in names:
+        if name == "Program_Year":
+            row.append("+2023")
+        elif name == "Total_Amount_of_Payment_USDollars":
+            row.append("+5.10")
+        elif name == "Record_ID":
+            row.append("1001")
+        else:
+            row.append("")
+    return row
+
+
+def test_lowercase_header_is_mapped(tmp_path):
+    names = schema_for_year(YEAR).names
+    src = tmp_path / "csv_A.csv"
+    write_csv(src, ["﻿" + names[0].lower()] + [n.lower() for n in names[1:]], [sample_row(names)])
+    dest = tmp_path / "out" / "company_A.parquet"
+
+    result = curate_file(YEAR, src, dest, row_group_rows=1000, parquet_compression="snappy")
+
+    assert result["error"] == ""
+    assert result["missing_columns"] == ""
+    table = pq.read_table(dest)
+    assert table.num_rows == 1
+    assert table.column("Program_Year").to_pylist() == [2023]
+    assert str(table.column("Total_Amount_of_Payment_USDollars")[0]) == "5.10"
+
+
+def test_missing_required_column_fails_the_file(tmp_path):
+    schema = schema_for_year(YEAR)
+    dropped = sorted(schema.required)[0]
+    names = [n for n in schema.names if n != dropped]
+    src = tmp_path / "csv_B.csv"
+    write_csv(src, names, [sample_row(names)])
+    dest = tmp_path / "out" / "company_B.parquet"
+
+    result = curate_file(YEAR, src, dest, row_group_rows=1000, parquet_compression="snappy")
+
+    assert result["error"].startswith("ERROR: missing_required_columns(")
+    assert dropped in result["error"]
+    assert not dest.exists()
+    assert not dest.with_name(dest.name + ".tmp").exists()
@@ -0,0 +1,77 @@
+import datetime
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+import curate_to_parquet as cp
+from openpayments_schema import schema_for_year
+
+YEAR = "2023"
+STATE = "Recipient_State"
+NATURE = "Nature_of_Payment_or_Transfer_of_Value"
+
+
+def company_file(path, rows):
+    target = cp.arrow_schema(schema_for_year(YEAR))
+    cols = {name: [None] * len(rows) for name in target.names}
+    cols[STATE] = [r[0] for r in rows]
+    cols[NATURE] = [r[1] for r in rows]
+    cols["Date_of_Payment"] = [datetime.date(2023, 1, r[2]) for r in rows]
+    cols[cp.YEAR_COLUMN] = [2023] * len(rows)
+    pq.write_table(pa.table(cols, schema=target), str(path))
+    return path
+
+
+def spec(file_rows=1000):
+    return {
+        "partition_by": [STATE, NATURE],
+        "sort_by": ["Date_of_Payment"],
+        "file_rows": file_rows,
+        "row_group_rows": 100,
+        "compression": "snappy",
+    }
+
+
+def test_max_open_partition_files_follows_rlimit(monkeypatch):
+    resource = pytest.importorskip("resource")
+    monkeypatch.setattr(resource, "getrlimit", lambda _: (1024, 4096))
+    assert cp.max_open_partition_files() == 1024 - cp.OPEN_FILES_HEADROOM
+    monkeypatch.setattr(resource, "getrlimit", lambda _: (100, 4096))
+    assert cp.max_open_partition_files() == cp.MIN_OPEN_FILES
+    monkeypatch.setattr(resource, "getrlimit", lambda _: (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+    assert cp.max_open_partition_files() == cp.MAX_PARTITIONS
+
+
+def test_partition_year_encodes_folders_and_sorts(tmp_path, monkeypatch):
+    rows = [
+        ("CA", "Food and Beverage", 3),
+        ("CA", "Food and Beverage", 1),
+        ("NY", "Travel/Lodging", 2),
+        (None, "Food and Beverage", 4),
+    ]
+    files = [company_file(tmp_path / "company_A.parquet", rows)]
+    table_dir = tmp_path / "general_payments"
+    # fewer open files than partitions: pyarrow closes and reopens, nothing fails
+    monkeypatch.setattr(cp, "max_open_partition_files", lambda: 1)
+
+    n_files, n_rows = cp.partition_year(YEAR, files, table_dir, spec(), workers=1)
+
+    assert n_rows == 4
+    parts = cp.list_partitions(table_dir, [STATE, NATURE])
+    by_values = {tuple(p["values"]): p for p in parts}
+    assert set(by_values) == {
+        ("2023", "CA", "Food and Beverage"),
+        ("2023", "NY", "Travel/Lodging"),
+        ("2023", cp.HIVE_NULL, "Food and Beverage"),
+    }
+    ca = by_values[("2023", "CA", "Food and Beverage")]
+    assert ca["path"] == "program_year=2023/recipient_state=CA/nature_of_payment_or_transfer_of_value=Food%20and%20Beverage"
+    assert by_values[("2023", "NY", "Travel/Lodging")]["path"].endswith("=Travel%2FLodging")
+    assert sum(p["files"] for p in parts) == n_files
+
+    ca_file = next((table_dir / ca["path"]).glob("*.parquet"))
+    dates = pq.read_table(ca_file).column("Date_of_Payment").to_pylist()
+    assert dates == sorted(dates)
+    assert STATE not in pq.read_schema(ca_file).names
@@ -0,0 +1,110 @@
+import base64
+import hashlib
+import io
+import zlib
+
+import pytest
+
+from openpayments_digest import OrderedPageDigest, RunningDigest
+from openpayments_page_writer import PageStreamWriter
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_running_digest_update_and_file(tmp_path):
+    src = tmp_path / "a.bin"
+    src.write_bytes(b"0123456789" * 1000)
+    d = RunningDigest()
+    d.update(b"head")
+    assert d.update_from_file(src, limit=25) == 25
+    assert d.sha256_hex == sha(b"head" + src.read_bytes()[:25])
+    assert d.bytes == 29
+    assert base64.b64decode(d.sha256_b64) == hashlib.sha256(b"head" + src.read_bytes()[:25]).digest()
+    assert d.to_record() == {"sha256": d.sha256_hex}
+
+
+def test_running_digest_copies_through_fd(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.write_bytes(b"x" * 3_000_000)
+    d = RunningDigest()
+    with dst.open("wb") as out:
+        assert d.update_from_file(src, out.fileno()) == 3_000_000
+    assert dst.read_bytes() == src.read_bytes()
+    assert d.sha256_hex == sha(src.read_bytes())
+
+
+def test_running_digest_crc32c():
+    pytest.importorskip("awscrt")
+    from awscrt import checksums
+
+    d = RunningDigest(crc32c=True)
+    d.update(b"abc")
+    d.update(b"def")
+    assert d.crc32c_b64 == base64.b64encode(checksums.crc32c(b"abcdef").to_bytes(4, "big")).decode()
+    assert set(d.to_record()) == {"sha256", "crc32c"}
+
+
+def test_state_restore():
+    d = RunningDigest()
+    d.update(b"keep")
+    state = d.state()
+    d.update(b"drop")
+    d.restore(state)
+    d.update(b"!")
+    assert d.sha256_hex == sha(b"keep!")
+    assert d.bytes == 5
+
+
+def write_part(tmp_path, i: int, data: bytes):
+    p = tmp_path / f"part_{i}"
+    p.write_bytes(data)
+    return p
+
+
+def test_ordered_page_digest_out_of_order(tmp_path):
+    pages = [b"h\n1\n", b"2\n", b"3\n", b"4\n"]
+    od = OrderedPageDigest(RunningDigest())
+    for i in (2, 1, 3):
+        assert od.open_page(i) is None  # page 0 still missing
+        od.page_landed(i, write_part(tmp_path, i, pages[i]))
+    assert od.pages == 0
+
+    tap = od.open_page(0)
+    assert tap is not None
+    tap(pages[0])
+    od.page_landed(0, write_part(tmp_path, 0, pages[0]))
+    assert od.pages == 4
+    assert od.digest.sha256_hex == sha(b"".join(pages))
+
+
+def test_ordered_page_digest_live_pages_and_empty_page(tmp_path):
+    od = OrderedPageDigest(RunningDigest())
+    tap = od.open_page(0)
+    tap(b"h\n1\n")
+    od.page_landed(0, tmp_path / "unused")
+
+    # an empty page is tapped (header-less, but bytes may have been written) then dropped
+    tap = od.open_page(1)
+    assert od.open_page(1) is None  # only one live tap at a time
+    tap(b"partial")
+    od.page_landed(1, None)
+
+    od.page_landed(3, write_part(tmp_path, 3, b"4\n"))
+    tap = od.open_page(2)
+    tap(b"3\n")
+    od.page_landed(2, tmp_path / "unused")
+
+    assert od.pages == 4
+    assert od.digest.sha256_hex == sha(b"h\n1\n3\n4\n")
+
+
+def test_page_writer_tap_sees_compressed_bytes():
+    out = io.BytesIO()
+    seen = []
+    w = PageStreamWriter(out, write_header=True, compressor=zlib.compressobj(6, zlib.DEFLATED, 31), tap=seen.append)
+    w.feed(b"h\n1\n2\n")
+    w.close()
+    assert b"".join(seen) == out.getvalue()
+    assert zlib.decompress(out.getvalue(), 31).endswith(b"h\n1\n2\n")
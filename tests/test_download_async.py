@@ -0,0 +1,89 @@
+import asyncio
+import io
+import threading
+import zlib
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+import openpayments_download_async as dl
+from openpayments_compression import Compression
+
+
+class FakeContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_chunked(self, n):
+        for c in self.chunks:
+            yield c
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self.content = FakeContent(chunks)
+
+
+class ThreadRecordingBuffer(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def write(self, data):
+        self.threads.add(threading.get_ident())
+        return super().write(data)
+
+
+def stream(chunks, compression):
+    fh = ThreadRecordingBuffer()
+
+    async def run():
+        writer = await dl.stream_page_bytes(FakeResponse(chunks), fh, True, compression)
+        return writer, threading.get_ident()
+
+    writer, loop_thread = asyncio.run(run())
+    return fh, writer, loop_thread
+
+
+def test_plain_pages_are_written_on_the_loop():
+    fh, writer, loop_thread = stream([b"h\n1\n", b"2\n3"], Compression())
+    assert fh.getvalue() == b"\xef\xbb\xbfh\n1\n2\n3\n"
+    assert (writer.header_lines, writer.data_lines) == (1, 3)
+    assert fh.threads == {loop_thread}
+
+
+def test_compressed_pages_are_written_off_the_loop():
+    chunks = [b"h\n", b"1\n" * 50000, b"2\n" * 50000]
+    fh, writer, loop_thread = stream(chunks, Compression("gzip"))
+    assert zlib.decompress(fh.getvalue(), 31) == b"\xef\xbb\xbf" + b"".join(chunks)
+    assert writer.data_lines == 100000
+    assert loop_thread not in fh.threads
+
+
+def test_open_page_error_fails_the_company_not_the_run(tmp_path, monkeypatch):
+    from openpayments_ordered_writer import OrderedCompanyWriter, ReorderBudget
+    from openpayments_schema import schema_for_year
+
+    names = schema_for_year(2023).names
+    real_open_page = OrderedCompanyWriter.open_page
+
+    def open_page(self, spill_path):
+        if spill_path.parent.name == "BAD":
+            raise OSError("disk gone")
+        return real_open_page(self, spill_path)
+
+    async def fake_fetch_page_async(session, url, company_id, offset, fh, is_first_page, compression, *_args):
+        fh.write((",".join(names) + "\n" + ",".join(["1"] * len(names)) + "\n").encode())
+        return (True, "ok", 1, 1)
+
+    monkeypatch.setattr(dl, "fetch_page_async", fake_fetch_page_async)
+    monkeypatch.setattr(OrderedCompanyWriter, "open_page", open_page)
+    tasks = [(2023, cid, 1, "https://example/api", tmp_path) for cid in ("BAD", "GOOD")]
+
+    rows = dl.run_async_downloads(tasks, max_inflight=2, desc="test", reorder_budget=ReorderBudget(4))
+    by_id = {r[0]: r for r in rows}
+    assert by_id["GOOD"][3] is True
+    assert by_id["BAD"][3] is False
+    assert "executor_error:disk gone" in by_id["BAD"][4]
+    assert (tmp_path / "csv_GOOD.csv").exists()
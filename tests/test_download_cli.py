@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from openpayments_general_payments_download import parse_dataset_overrides, parse_slice
+
+
+def test_parse_dataset_overrides():
+    assert parse_dataset_overrides(None) == {}
+    assert parse_dataset_overrides(["2025=abcd-1234", " 2026 = ef=gh "]) == {2025: "abcd-1234", 2026: "ef=gh"}
+    for bad in ("2025", "year=abcd", "2025= "):
+        with pytest.raises(ValueError):
+            parse_dataset_overrides([bad])
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (None, None),
+        ("", None),
+        ("0:10", slice(0, 10)),
+        ("90:-1", slice(90, None)),
+        (":50", slice(None, 50)),
+        ("10:", slice(10, None)),
+        (" 10 ", slice(0, 10)),
+    ],
+)
+def test_parse_slice(text, expected):
+    assert parse_slice(text) == expected
+
+
+def test_parse_slice_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_slice("ten")
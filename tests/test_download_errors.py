@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+
+import openpayments_general_payments_download as gp
+from openpayments_ordered_writer import OrderedCompanyWriter, ReorderBudget
+from openpayments_schema import schema_for_year
+
+SCHEMA = schema_for_year(2023)
+
+
+def fake_fetch_page(session, url, company_id, offset, fh, is_first_page, compression, record_ids=None, tap=None):
+    fh.write((",".join(SCHEMA.names) + "\n" + ",".join(["1"] * len(SCHEMA)) + "\n").encode())
+    return (True, "ok", 1, 1)
+
+
+def run_with_timeout(fn, *args, **kwargs):
+    # a daemon thread, so a hung run fails the test instead of blocking pytest
+    out = []
+    t = threading.Thread(target=lambda: out.append(fn(*args, **kwargs)), daemon=True)
+    t.start()
+    t.join(timeout=30)
+    assert out, "run did not finish"
+    return out[0]
+
+
+def test_open_page_error_fails_the_company_not_the_run(tmp_path, monkeypatch):
+    real_open_page = OrderedCompanyWriter.open_page
+
+    def open_page(self, spill_path):
+        if spill_path.parent.name == "BAD":
+            raise OSError("disk gone")
+        return real_open_page(self, spill_path)
+
+    monkeypatch.setattr(gp, "fetch_page", fake_fetch_page)
+    monkeypatch.setattr(OrderedCompanyWriter, "open_page", open_page)
+    tasks = [(2023, cid, 1, "https://example/api", tmp_path) for cid in ("BAD", "GOOD")]
+
+    rows = run_with_timeout(
+        gp.run_threaded_downloads, tasks, workers=2, desc="test", reorder_budget=ReorderBudget(4)
+    )
+    by_id = {r[0]: r for r in rows}
+    assert by_id["GOOD"][3] is True
+    assert by_id["BAD"][3] is False
+    assert "executor_error:disk gone" in by_id["BAD"][4]
+    assert (tmp_path / "csv_GOOD.csv").exists()
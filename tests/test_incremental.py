@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("requests")
+
+from openpayments_checkpoint import CheckpointManifest
+from openpayments_general_payments_download import plan_incremental
+
+
+def task(company_id, total):
+    return (2023, company_id, total, "https://example/api", Path("2023"))
+
+
+def test_plan_incremental_reasons(tmp_path):
+    path = tmp_path / "download_manifest.jsonl"
+    m = CheckpointManifest(path)
+    m.record_company(2023, "SAME", 10, True, "ok", 10, 100, "/x/csv_SAME.csv")
+    m.record_company(2023, "FAILED", 10, False, "timeout", 3, 30, None)
+    m.record_company(2023, "CHANGED", 10, True, "ok", 10, 100, "/x/csv_CHANGED.csv")
+    m.record_company(2023, "SHORT", 10, True, "ok", 8, 80, "/x/csv_SHORT.csv")
+    m.close()
+
+    tasks = [task("SAME", 10), task("FAILED", 10), task("CHANGED", 12), task("SHORT", 10), task("NEW", 5)]
+    pending, skipped = plan_incremental(CheckpointManifest(path).load(), tasks)
+
+    assert [t[1] for t in pending] == ["FAILED", "CHANGED", "SHORT", "NEW"]
+    assert skipped == [("SAME", 2023, 10, True, "skipped_incremental_unchanged")]
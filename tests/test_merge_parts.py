@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+pytest.importorskip("requests")
+
+import openpayments_ordered_writer as ow
+from openpayments_general_payments_download import merge_parts
+from openpayments_schema import schema_for_year
+
+SCHEMA = schema_for_year(2023)
+HEADER = (",".join(SCHEMA.names) + "\n").encode()
+
+
+def parts(tmp_path, bodies):
+    out = []
+    for i, body in enumerate(bodies):
+        p = tmp_path / f"part_{i:06d}.csv"
+        p.write_bytes(body)
+        out.append(p)
+    return out
+
+
+def copy(tmp_path, src):
+    dst = tmp_path / "dst"
+    fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        n = ow.append_file(src, fd)
+    finally:
+        os.close(fd)
+    return n, dst.read_bytes()
+
+
+def test_append_file_kernel_copy(tmp_path):
+    src = tmp_path / "src"
+    src.write_bytes(os.urandom(3 * 1024 * 1024 + 7))
+    assert copy(tmp_path, src) == (src.stat().st_size, src.read_bytes())
+
+
+def test_append_file_falls_back_to_read_write(tmp_path, monkeypatch):
+    def unsupported(*args):
+        raise OSError("unsupported")
+
+    monkeypatch.setattr(ow.os, "copy_file_range", unsupported, raising=False)
+    monkeypatch.setattr(ow.os, "sendfile", unsupported, raising=False)
+    monkeypatch.setattr(ow, "MERGE_BUFFER_BYTES", 1000)
+    src = tmp_path / "src"
+    src.write_bytes(os.urandom(10_500))
+    assert copy(tmp_path, src) == (10_500, src.read_bytes())
+
+
+def test_merge_parts_concatenates_in_order(tmp_path):
+    ps = parts(tmp_path, [HEADER + b"1\n", b"", b"2\n", b"3\n"])
+    final = tmp_path / "out" / "csv_A1.csv"
+    assert merge_parts(ps, final, 3, schema=SCHEMA) == (True, "merged_ok")
+    assert final.read_bytes() == HEADER + b"1\n2\n3\n"
+    assert not final.with_suffix(".csv.part").exists()
+
+
+def test_merge_parts_renames_a_single_part(tmp_path):
+    (p,) = parts(tmp_path, [HEADER + b"1\n"])
+    ino = p.stat().st_ino
+    final = tmp_path / "csv_A1.csv"
+    assert merge_parts([p], final, 1, schema=SCHEMA) == (True, "merged_ok")
+    assert final.stat().st_ino == ino and not p.exists()
+
+
+def test_merge_parts_failures(tmp_path):
+    final = tmp_path / "csv_A1.csv"
+    assert merge_parts([tmp_path / "missing"], final, 1, schema=SCHEMA) == (False, "merged_empty")
+    ps = parts(tmp_path, [HEADER])
+    assert merge_parts(ps, final, 0, schema=SCHEMA) == (False, "no_results_header_only_after_merge")
+    ps = parts(tmp_path, [b"a,b\n1,2\n", b"3,4\n"])
+    ok, msg = merge_parts(ps, final, 2, schema=SCHEMA)
+    assert not ok and msg.startswith("validation_failed:")
+    assert not final.exists()
@@ -0,0 +1,115 @@
+import io
+
+import pytest
+
+from openpayments_ordered_writer import OrderedCompanyWriter, ReorderBudget
+from openpayments_sinks import LocalFileSink
+
+
+class MemorySink:
+    location = "memory"
+
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = self.aborted = False
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+    def append_file(self, src):
+        data = src.read_bytes()
+        self.data += data
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+    def abort(self, discard=False):
+        self.aborted = True
+
+
+def download(writer, tmp_path, i, body):
+    target, fh = writer.open_page(tmp_path / f"part_{i}")
+    fh.write(body)
+    if fh is not target:
+        fh.close()
+    return target
+
+
+def test_reorder_budget_is_non_blocking():
+    b = ReorderBudget(2)
+    assert b.try_acquire() and b.try_acquire()
+    assert not b.try_acquire()
+    b.release()
+    assert b.try_acquire()
+    assert not ReorderBudget(-1).try_acquire()
+
+
+def test_pages_are_written_in_order(tmp_path):
+    budget = ReorderBudget(4)
+    sink = MemorySink()
+    w = OrderedCompanyWriter(sink, budget)
+    targets = {i: download(w, tmp_path, i, f"p{i}\n".encode()) for i in (2, 0, 1)}
+
+    assert w.commit(2, targets[2], 0, 1) == []
+    assert w.commit(0, targets[0], 1, 1) == [(0, 1, 1, 3)]
+    assert w.commit(1, targets[1], 0, 1) == [(1, 0, 1, 3), (2, 0, 1, 3)]
+    assert bytes(sink.data) == b"p0\np1\np2\n"
+    assert w.finish() == (True, "")
+    assert sink.closed
+    assert budget._free == 4  # every slot came back
+
+
+def test_pages_spill_to_disk_when_the_budget_is_spent(tmp_path):
+    budget = ReorderBudget(1)
+    sink = MemorySink()
+    w = OrderedCompanyWriter(sink, budget)
+    t1 = download(w, tmp_path, 1, b"p1\n")
+    t2 = download(w, tmp_path, 2, b"p2\n")
+    assert isinstance(t1, io.BytesIO)
+    assert t2 == tmp_path / "part_2" and t2.exists()
+
+    w.commit(2, t2, 0, 1)
+    w.commit(1, t1, 0, 1)
+    w.commit(0, download(w, tmp_path, 0, b"p0\n"), 1, 1)
+    assert bytes(sink.data) == b"p0\np1\np2\n"
+    assert not t2.exists()
+    assert w.committed_bytes == 9
+
+
+def test_gap_at_finish_and_abort_free_the_budget(tmp_path):
+    budget = ReorderBudget(2)
+    sink = MemorySink()
+    w = OrderedCompanyWriter(sink, budget)
+    w.commit(1, download(w, tmp_path, 1, b"p1\n"), 0, 1)
+    assert w.finish() == (False, "reorder_gap_at_page:0")
+    assert budget._free == 2
+
+    w = OrderedCompanyWriter(MemorySink(), budget)
+    w.commit(3, download(w, tmp_path, 3, b"p3\n"), 0, 1)
+    w.abort()
+    assert w.sink.aborted and budget._free == 2
+    # late pages after abort are discarded, not written
+    assert w.commit(0, download(w, tmp_path, 0, b"p0\n"), 1, 1) == []
+    assert budget._free == 2
+
+
+def test_resumed_prefix_on_a_local_sink(tmp_path):
+    final = tmp_path / "csv_A1.csv"
+    tmp = tmp_path / "csv_A1.csv.part"
+    tmp.write_bytes(b"h\np0\np1\ntorn")
+    resumed = {0: (1, 1, 5), 1: (0, 1, 3)}
+    sink = LocalFileSink(tmp, final, resume_bytes=8)
+    w = OrderedCompanyWriter(sink, ReorderBudget(1), resumed=resumed)
+    assert w.next_index == 2 and w.committed_bytes == 8
+
+    w.commit(2, download(w, tmp_path, 2, b"p2\n"), 0, 1)
+    assert w.finish() == (True, "")
+    sink.publish()
+    assert final.read_bytes() == b"h\np0\np1\np2\n"
+
+
+def test_finish_without_bytes_is_empty(tmp_path):
+    w = OrderedCompanyWriter(MemorySink(), ReorderBudget(1))
+    assert w.finish() == (False, "merged_empty")
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("requests")
+
+from openpayments_general_payments_download import PAGE_LIMIT, CompanyJob, PageScheduler
+
+
+def job(company_id, expected_total):
+    return CompanyJob(year=2023, company_id=company_id, expected_total=expected_total, url="", year_dir=Path("."))
+
+
+def drain(scheduler):
+    out = []
+    while True:
+        page, finished = scheduler.get_nowait()
+        if page is None:
+            return out, finished
+        out.append(page)
+
+
+def test_largest_company_first_pages_in_order():
+    s = PageScheduler()
+    small, big = job("S", 1), job("B", 2 * PAGE_LIMIT + 1)
+    s.add_company(small)
+    s.add_company(big)
+    pages, finished = drain(s)
+    assert [(p.job.company_id, p.page_index) for p in pages] == [("B", 0), ("B", 1), ("B", 2), ("S", 0)]
+    assert pages[2].offset == 2 * PAGE_LIMIT
+    assert not finished
+    assert small.known_pages == 1 and big.known_pages == 3
+
+
+def test_company_completes_after_its_last_page():
+    s = PageScheduler()
+    j = job("A", PAGE_LIMIT + 5)
+    s.add_company(j)
+    p0, p1 = drain(s)[0]
+    assert not s.page_done(p1, (True, "ok", 0, 5))
+    assert s.page_done(p0, (True, "ok", 1, PAGE_LIMIT))
+    assert s.get_nowait() == (None, True)
+    assert s.get() is None
+
+
+def test_full_last_page_schedules_the_next_offset():
+    s = PageScheduler()
+    j = job("A", 0)  # stale total: still one page
+    s.add_company(j)
+    (p0,), _ = drain(s)
+    assert not s.page_done(p0, (True, "ok", 1, PAGE_LIMIT))
+    (p1,), _ = drain(s)
+    assert p1.page_index == 1 and j.scheduled_pages == 2
+    assert s.page_done(p1, (True, "empty_page_no_data_rows", 0, 0))
+
+
+def test_failed_page_marks_the_company_and_stops_extension():
+    s = PageScheduler()
+    j = job("A", PAGE_LIMIT)
+    s.add_company(j)
+    (p0,), _ = drain(s)
+    assert s.page_done(p0, (False, "HTTP 500", 0, PAGE_LIMIT))
+    assert j.failed
+    assert s.pending_pages() == 0
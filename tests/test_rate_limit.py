@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import openpayments_rate_limit as rl
+from openpayments_rate_limit import AdaptiveRateLimiter
+
+
+def test_rate_is_clamped_and_bounds_checked():
+    assert AdaptiveRateLimiter(rate=100, min_rate=1, max_rate=20).rate == 20
+    assert AdaptiveRateLimiter(rate=0.1, min_rate=1, max_rate=20).rate == 1
+    with pytest.raises(ValueError):
+        AdaptiveRateLimiter(min_rate=5, max_rate=1)
+
+
+def test_additive_increase_after_success_window():
+    lim = AdaptiveRateLimiter(rate=2, max_rate=3, increase_step=0.5, success_window=3)
+    for _ in range(3):
+        lim.record(200)
+    assert lim.rate == 2.5
+    for _ in range(6):
+        lim.record(200)
+    assert lim.rate == 3  # capped at max_rate
+    lim.record(500)  # neither success nor throttle
+    assert lim.rate == 3
+
+
+def test_multiplicative_decrease_once_per_cooldown():
+    lim = AdaptiveRateLimiter(rate=8, min_rate=1, decrease_factor=0.5, cooldown_s=60)
+    lim.record(429)
+    lim.record(403)  # same burst: no second cut
+    assert lim.rate == 4
+
+    lim = AdaptiveRateLimiter(rate=8, min_rate=3, decrease_factor=0.5, cooldown_s=0)
+    lim.record(429)
+    lim.record(429)
+    assert lim.rate == 3  # floored at min_rate
+
+
+def test_throttle_pauses_every_caller():
+    lim = AdaptiveRateLimiter(rate=50)
+    lim.on_throttle(429, penalty_s=2.0)
+    assert lim._reserve() == pytest.approx(2.0, abs=0.1)
+    assert lim._reserve() == pytest.approx(2.0, abs=0.1)
+
+
+def test_token_bucket_spacing():
+    lim = AdaptiveRateLimiter(rate=10, max_rate=10)
+    waits = [lim._reserve() for _ in range(12)]
+    assert waits[0] == 0
+    # the burst (10 tokens at most) is used up, then 1 / rate per request
+    assert waits[-1] == pytest.approx(waits[-2] + 0.1, abs=0.02)
+
+
+def test_acquire_async_waits(monkeypatch):
+    slept = []
+
+    async def fake_sleep(s):
+        slept.append(s)
+
+    monkeypatch.setattr(rl.asyncio, "sleep", fake_sleep)
+    lim = AdaptiveRateLimiter(rate=1, min_rate=1, max_rate=1)
+    asyncio.run(lim.acquire_async())
+    asyncio.run(lim.acquire_async())
+    assert len(slept) == 1 and slept[0] == pytest.approx(1.0, abs=0.05)
+
+
+def test_process_wide_instance():
+    lim = rl.configure_rate_limiter(rate=7)
+    assert rl.get_rate_limiter() is lim
+    assert lim.rate == 7
@@ -0,0 +1,169 @@
+import csv
+import gzip
+
+import numpy as np
+
+import openpayments_record_index as ri
+from openpayments_record_index import (
+    HASHED_KEY_BIT,
+    KEY_DTYPE,
+    CompanyDedupFilter,
+    RecordIndex,
+    compact_runs,
+    iter_key_ranges,
+    read_keys,
+    record_id_keys,
+    write_array,
+)
+
+
+HEADER = b"change_type,record_id,note\r\n"
+
+
+def keys(*values):
+    return np.array(values, dtype=KEY_DTYPE)
+
+
+def save_page(index, year, cid, page, records):
+    col = index.collector()
+    col.set_header(HEADER)
+    col.feed(records)
+    index.save_page(year, cid, page, col)
+    return len(col.values)
+
+
+def build(index, year, cid, pages, expected_total=0):
+    page_rows = {i: save_page(index, year, cid, i, recs) for i, recs in enumerate(pages)}
+    return index.build_company(year, cid, page_rows, expected_total, "api", 0)
+
+
+def test_record_id_keys_numeric_hashed_and_missing():
+    k, present = record_id_keys(["123", " 42 ", "", None, "ABC-1", "1234567890123456789"])
+    assert present.tolist() == [True, True, False, False, True, True]
+    assert k[0] == 123 and k[1] == 42 and k[2] == 0
+    # non-numeric and 19+ digit IDs are hashed into the top-bit half
+    assert int(k[4]) & HASHED_KEY_BIT and int(k[5]) & HASHED_KEY_BIT
+    assert k[4] == record_id_keys(["ABC-1"])[0][0]
+
+
+def test_collector_handles_quoted_newlines_and_short_rows():
+    col = ri.RecordIdCollector()
+    col.set_header(b"Change_Type,Record_ID\r\n")
+    col.feed(b'NEW,30\r\n"multi\r\nline",10\r\nNEW\r\n')
+    assert col.values == ["30", "10", ""]
+    assert col.sorted_keys().tolist() == [10, 30]
+
+
+def test_iter_key_ranges_cover_runs_without_splitting_equal_keys():
+    rng = np.random.default_rng(1)
+    runs = [np.sort(rng.integers(0, 500, n).astype(KEY_DTYPE)) for n in (3000, 10, 0, 700)]
+    seen = []
+    last_hi = None
+    for spans in iter_key_ranges(runs, batch_keys=256):
+        chunk = np.concatenate([r[lo:hi] for r, (lo, hi) in zip(runs, spans)])
+        if last_hi is not None and len(chunk):
+            assert chunk.min() > last_hi
+        if len(chunk):
+            last_hi = chunk.max()
+        seen.append(chunk)
+    assert len(seen) > 1
+    assert np.array_equal(np.sort(np.concatenate(seen)), np.sort(np.concatenate(runs)))
+    assert list(iter_key_ranges([np.empty(0, dtype=KEY_DTYPE)])) == []
+
+
+def test_compact_runs_groups_small_files(tmp_path):
+    paths = []
+    for i, arr in enumerate([keys(5, 9), keys(1), keys(7, 8, 20), keys(2)]):
+        p = tmp_path / f"page_{i}.u64"
+        write_array(p, arr)
+        paths.append(p)
+    runs = compact_runs(paths, tmp_path / "runs", run_keys=3)
+    assert [read_keys(p).tolist() for p in runs] == [[1, 5, 9], [7, 8, 20], [2]]
+
+
+def test_build_company_counts_duplicates_and_gap(tmp_path):
+    index = RecordIndex.for_out_root(tmp_path)
+    assert index.root == tmp_path / "_record_index"
+    stats = build(index, 2023, "100", [b"NEW,3\r\nNEW,1\r\n", b"NEW,3\r\nNEW,\r\nNEW,2\r\n"], expected_total=5)
+    assert stats["rows"] == 5
+    assert stats["unique_ids"] == 3
+    assert stats["duplicate_rows"] == 1
+    assert stats["missing_ids"] == 1
+    assert stats["gap"] == 2
+    assert read_keys(index.company_path(2023, "100")).tolist() == [1, 2, 3]
+    assert read_keys(index.company_path(2023, "100", "dups")).tolist() == [3]
+    assert index.company_stats(2023, "100")["unique_ids"] == 3
+    assert not index.pages_dir(2023, "100").exists()
+
+
+def test_build_company_needs_every_page(tmp_path):
+    index = RecordIndex(tmp_path)
+    save_page(index, 2023, "100", 0, b"NEW,1\r\n")
+    assert index.build_company(2023, "100", {0: 1, 1: 1}, 0, "api", 0) is None
+    # pages without rows have no key file
+    assert index.build_company(2023, "100", {0: 1, 1: 0}, 0, "api", 0)["unique_ids"] == 1
+
+
+def test_build_company_from_file_matches_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(ri, "FILE_READ_ROWS", 2)
+    monkeypatch.setattr(ri, "RUN_KEYS", 3)
+    src = tmp_path / "csv_100.csv.gz"
+    with gzip.open(src, "wt", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["Change_Type", "Record_ID"])
+        w.writerows([["NEW", i] for i in (4, 2, 4, 9, "", 2, 7)])
+    index = RecordIndex(tmp_path / "idx")
+    stats = index.build_company_from_file(2023, "100", src, expected_total=6)
+    assert (stats["rows"], stats["unique_ids"], stats["duplicate_rows"], stats["missing_ids"]) == (7, 4, 2, 1)
+    assert stats["gap"] == 2
+    assert read_keys(index.company_path(2023, "100", "dups")).tolist() == [2, 4]
+    assert not (index.year_dir(2023) / "_runs").exists()
+
+
+def test_reconcile_drops_keys_shared_across_companies(tmp_path):
+    index = RecordIndex(tmp_path)
+    build(index, 2023, "300", [b"NEW,5\r\nNEW,6\r\nNEW,9\r\n"])
+    build(index, 2023, "100", [b"NEW,1\r\nNEW,5\r\n"])
+    build(index, 2023, "200", [b"NEW,5\r\nNEW,6\r\nNEW,6\r\nNEW,7\r\n"])
+
+    rows = index.reconcile_year(2023, group_keys=2)
+    by_id = {r["company_id"]: r for r in rows}
+    assert [r["company_id"] for r in rows] == ["100", "200", "300"]
+    # the first company in company_id order keeps a shared key
+    assert not index.company_path(2023, "100", "drop").exists()
+    assert read_keys(index.company_path(2023, "200", "drop")).tolist() == [5]
+    assert read_keys(index.company_path(2023, "300", "drop")).tolist() == [5, 6]
+    assert [by_id[c]["cross_company_dropped"] for c in ("100", "200", "300")] == [0, 1, 2]
+    assert [by_id[c]["curated_rows"] for c in ("100", "200", "300")] == [2, 2, 1]
+    assert by_id["200"]["duplicate_rows"] == 1
+    with index.report_path(2023).open(newline="") as f:
+        assert len(list(csv.DictReader(f))) == 3
+
+    # a rerun without the overlap removes the stale drop file
+    build(index, 2023, "300", [b"NEW,9\r\n"])
+    index.reconcile_year(2023)
+    assert not index.company_path(2023, "300", "drop").exists()
+
+
+def test_dedup_filter_keeps_first_row_across_batches(tmp_path):
+    index = RecordIndex(tmp_path)
+    assert index.dedup_filter(2023, "100") is None
+
+    filt = CompanyDedupFilter(dup_keys=keys(3, 8), drop_keys=keys(5))
+    k, present = record_id_keys(["3", "5", "3", "", "1"])
+    assert filt.keep(k, present).tolist() == [True, False, False, True, True]
+    k, present = record_id_keys(["8", "3", "8"])
+    assert filt.keep(k, present).tolist() == [True, False, False]
+    assert filt.duplicates_dropped == 3
+    assert filt.cross_company_dropped == 1
+
+
+def test_dedup_filter_from_index(tmp_path):
+    index = RecordIndex(tmp_path)
+    build(index, 2023, "100", [b"NEW,1\r\nNEW,5\r\n"])
+    build(index, 2023, "200", [b"NEW,5\r\nNEW,6\r\nNEW,6\r\n"])
+    index.reconcile_year(2023)
+
+    filt = index.dedup_filter(2023, "200")
+    k, present = record_id_keys(["5", "6", "6"])
+    assert filt.keep(k, present).tolist() == [False, True, False]
@@ -0,0 +1,51 @@
+from openpayments_schema import (
+    GENERAL_PAYMENTS_V1,
+    LATEST_SCHEMA,
+    SCHEMAS,
+    normalize_header,
+    schema_for_year,
+)
+
+
+def test_normalize_header_strips_bom_and_whitespace():
+    assert normalize_header(["\ufeff Change_Type ", " Record_ID"]) == ["Change_Type", "Record_ID"]
+    assert normalize_header([" \ufeffChange_Type"]) == ["Change_Type"]
+    # only a leading BOM is stripped
+    assert normalize_header(["a", "\ufeffb"]) == ["a", "\ufeffb"]
+
+
+def test_map_header_full_and_reordered():
+    schema = GENERAL_PAYMENTS_V1
+    names = list(reversed(schema.names))
+    hm = schema.map_header(names)
+    assert hm.matches
+    assert hm.positions[schema.index["Record_ID"]] == names.index("Record_ID")
+    assert names.index("Record_ID") in hm.required_positions
+
+
+def test_map_header_case_folding():
+    schema = GENERAL_PAYMENTS_V1
+    lower = [n.lower() for n in schema.names]
+    assert schema.map_header(lower, case_sensitive=False).matches
+    strict = schema.map_header(lower)
+    assert set(strict.missing) == set(schema.names)
+    assert len(strict.extra) == len(schema)
+
+
+def test_map_header_missing_extra_and_duplicates():
+    schema = GENERAL_PAYMENTS_V1
+    hm = schema.map_header(["Record_ID", "Change_Type", "Record_ID", "Bogus"])
+    assert not hm.matches
+    assert hm.positions[schema.index["Record_ID"]] == 0
+    assert hm.extra == ("Bogus", "Record_ID")
+    assert "Covered_Recipient_NPI" in hm.missing and "Record_ID" not in hm.missing
+    assert hm.required_positions == (0,)
+    assert "Record_ID" in schema.required
+
+
+def test_schema_for_year():
+    assert schema_for_year(2023) is GENERAL_PAYMENTS_V1
+    assert schema_for_year("2024") is GENERAL_PAYMENTS_V1
+    assert schema_for_year(2031) is LATEST_SCHEMA
+    assert schema_for_year("latest") is LATEST_SCHEMA
+    assert SCHEMAS[LATEST_SCHEMA.version] is LATEST_SCHEMA
@@ -0,0 +1,112 @@
+import hashlib
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from openpayments_digest import RunningDigest
+from openpayments_sinks import S3_MIN_PART_BYTES, LocalSinkFactory, S3SinkFactory
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def factory(s3, part_mb=5):
+    return S3SinkFactory(BUCKET, part_mb=part_mb, s3=s3)
+
+
+def uploads(s3):
+    return s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", [])
+
+
+def test_small_object_is_a_single_put(s3, tmp_path):
+    digest = RunningDigest()
+    sink = factory(s3).open(2023, "A1", tmp_path, digest=digest)
+    sink.write(b"h1,h2\n")
+    sink.write(b"1,2\n")
+    assert sink.header_sample() == b"h1,h2\n1,2\n"
+    assert sink.publish() == f"s3://{BUCKET}/raw/year=2023/csv_A1.csv"
+    assert uploads(s3) == []
+    body = s3.get_object(Bucket=BUCKET, Key="raw/year=2023/csv_A1.csv")["Body"].read()
+    assert body == b"h1,h2\n1,2\n"
+    assert digest.sha256_hex == hashlib.sha256(body).hexdigest()
+
+
+def test_large_object_is_a_multipart_upload(s3, tmp_path):
+    spill = tmp_path / "spill.csv"
+    spill.write_bytes(b"s" * (3 * 1024 * 1024))
+    data = [b"h\n", b"a" * (4 * 1024 * 1024), b"b" * (4 * 1024 * 1024)]
+    sink = factory(s3).open(2023, "B2", tmp_path)
+    for chunk in data:
+        sink.write(chunk)
+    assert sink.append_file(spill) == spill.stat().st_size
+    assert len(uploads(s3)) == 1
+    sink.publish()
+    assert uploads(s3) == []
+    body = s3.get_object(Bucket=BUCKET, Key="raw/year=2023/csv_B2.csv")["Body"].read()
+    assert body == b"".join(data) + spill.read_bytes()
+    assert len(sink._parts) == 3
+
+
+def test_abort_discards_the_multipart_upload(s3, tmp_path):
+    sink = factory(s3).open(2023, "C3", tmp_path)
+    sink.write(b"x" * (S3_MIN_PART_BYTES + 1))
+    assert len(uploads(s3)) == 1
+    sink.abort()
+    assert uploads(s3) == []
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount", 0) == 0
+
+
+def test_failed_part_upload_releases_the_buffer(s3, tmp_path, monkeypatch):
+    sink = factory(s3).open(2023, "D4", tmp_path)
+    real_upload_part = s3.upload_part
+    calls = []
+
+    def flaky_upload_part(**kwargs):
+        calls.append(kwargs["PartNumber"])
+        if len(calls) == 2:
+            raise RuntimeError("upload failed")
+        return real_upload_part(**kwargs)
+
+    monkeypatch.setattr(s3, "upload_part", flaky_upload_part)
+    sink.write(b"a" * S3_MIN_PART_BYTES)
+    with pytest.raises(RuntimeError):
+        sink.write(b"b" * S3_MIN_PART_BYTES)
+
+    # the failed part's bytes are still buffered, and the buffer can be resized again
+    assert len(sink._buf) == S3_MIN_PART_BYTES
+    sink.write(b"c")
+    assert calls == [1, 2, 2]  # the failed part number is uploaded again
+    assert sink._buf == bytearray(b"c")
+    sink.abort()
+    assert uploads(s3) == []
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount", 0) == 0
+
+
+def test_endpoint_url_reaches_the_client():
+    f = S3SinkFactory(BUCKET, endpoint_url="http://127.0.0.1:9000")
+    assert f.s3.meta.endpoint_url == "http://127.0.0.1:9000"
+
+
+def test_local_sink_publish_and_digest(tmp_path):
+    digest = RunningDigest()
+    sink = LocalSinkFactory(suffix=".gz").open(2023, "E5", tmp_path, digest=digest)
+    sink.write(b"h\n1\n")
+    spill = tmp_path / "spill"
+    spill.write_bytes(b"2\n")
+    assert sink.append_file(spill) == 2
+    location = sink.publish()
+    assert location == str(tmp_path / "csv_E5.csv.gz")
+    assert (tmp_path / "csv_E5.csv.gz").read_bytes() == b"h\n1\n2\n"
+    assert digest.sha256_hex == hashlib.sha256(b"h\n1\n2\n").hexdigest()
@@ -0,0 +1,112 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from boto3.s3.transfer import TransferConfig
+
+import upload_run_to_s3 as up
+from upload_run_to_s3 import UploadLedger, move_file, sha256_file, trusted_sha256, unchanged_in_s3
+
+BUCKET = "upload-bucket"
+
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def test_ledger_last_record_wins(tmp_path):
+    ledger = UploadLedger(tmp_path / up.LEDGER_NAME)
+    ledger.record(BUCKET, "k", "aa", 1, '"e1"')
+    ledger.record(BUCKET, "k", "bb", 2, '"e2"')
+    ledger.close()
+    rec = UploadLedger(tmp_path / up.LEDGER_NAME).load().get(BUCKET, "k")
+    assert (rec["sha256"], rec["size"]) == ("bb", 2)
+
+
+def test_ledger_appends_after_torn_tail(tmp_path):
+    path = tmp_path / up.LEDGER_NAME
+    good = json.dumps({"bucket": BUCKET, "key": "a", "sha256": "aa", "size": 1, "etag": ""})
+    path.write_text(good + '\n{"bucket": "upl', encoding="utf-8")
+    ledger = UploadLedger(path).load()
+    ledger.record(BUCKET, "b", "bb", 2, "")
+    ledger.close()
+    loaded = UploadLedger(path).load()
+    assert loaded.get(BUCKET, "a")["sha256"] == "aa"
+    assert loaded.get(BUCKET, "b")["sha256"] == "bb"
+
+
+def test_trusted_sha256(tmp_path):
+    path = tmp_path / "csv_1.csv"
+    path.write_bytes(b"abc")
+    now = datetime.now()
+    rec = {"sha256": "ab", "bytes": 3, "ts": now.isoformat(timespec="seconds")}
+    assert trusted_sha256(rec, path) == "ab"
+    assert trusted_sha256(None, path) is None
+    assert trusted_sha256({**rec, "bytes": 4}, path) is None
+    assert trusted_sha256({"sha256": "ab", "bytes": 3}, path) is None
+    # modified after the downloader finished it
+    stale = (now - timedelta(minutes=5)).isoformat(timespec="seconds")
+    assert trusted_sha256({**rec, "ts": stale}, path) is None
+
+
+def test_unchanged_in_s3_ledger_then_metadata(s3, tmp_path):
+    src = tmp_path / "csv_1.csv"
+    src.write_bytes(b"a,b\n1,2\n")
+    digest, size = sha256_file(src), src.stat().st_size
+    ledger = UploadLedger(tmp_path / up.LEDGER_NAME)
+
+    assert unchanged_in_s3(s3, ledger, BUCKET, "raw/csv_1.csv", digest, size) == ""
+    up.upload_file(s3, BUCKET, src, "raw/csv_1.csv", sha256_hex=digest)
+    assert unchanged_in_s3(s3, ledger, BUCKET, "raw/csv_1.csv", digest, size) == "s3"
+    # the HEAD result was recorded, so the next check needs no request
+    assert unchanged_in_s3(None, ledger, BUCKET, "raw/csv_1.csv", digest, size) == "ledger"
+    assert unchanged_in_s3(s3, ledger, BUCKET, "raw/csv_1.csv", "0" * 64, size) == ""
+    ledger.close()
+
+
+def test_move_file_deletes_only_after_upload(s3, tmp_path):
+    ledger = UploadLedger(tmp_path / up.LEDGER_NAME)
+    config = TransferConfig()
+    first = tmp_path / "a.csv"
+    first.write_bytes(b"x\n")
+    _, nbytes, status, err = move_file(s3, BUCKET, first, "raw/a.csv", config, ledger)
+    assert (nbytes, status, err) == (2, "uploaded", None)
+    assert not first.exists()
+    assert s3.get_object(Bucket=BUCKET, Key="raw/a.csv")["Body"].read() == b"x\n"
+
+    first.write_bytes(b"x\n")
+    assert move_file(s3, BUCKET, first, "raw/a.csv", config, ledger)[2] == "skipped_ledger"
+
+    second = tmp_path / "b.csv"
+    second.write_bytes(b"y\n")
+    _, _, status, err = move_file(s3, "no-such-bucket", second, "raw/b.csv", config, ledger)
+    assert status == "failed" and err is not None
+    assert second.exists()
+    ledger.close()
+
+
+def test_move_file_reports_connection_errors(tmp_path):
+    from botocore.exceptions import EndpointConnectionError
+
+    class DownS3:
+        def head_object(self, **kwargs):
+            raise EndpointConnectionError(endpoint_url="https://s3.example")
+
+        upload_file = head_object
+
+    src = tmp_path / "a.csv"
+    src.write_bytes(b"x\n")
+    ledger = UploadLedger(tmp_path / up.LEDGER_NAME)
+    for force in (False, True):
+        _, _, status, err = move_file(DownS3(), BUCKET, src, "raw/a.csv", TransferConfig(), ledger, force=force)
+        assert status == "failed" and isinstance(err, EndpointConnectionError)
+    assert src.exists()